@@ -0,0 +1,77 @@
+from features.daemon import AdvisorDaemon
+from kickbase_api.config import client
+from kickbase_api.tracing import tracer
+from dotenv import load_dotenv
+import os, pandas as pd
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Long running version of daily_predictions.py for many accounts, see features/daemon.py
+# The accounts are read from accounts_path, a JSON list like
+#   [{"name": "me", "user_env": "KICK_USER", "pass_env": "KICK_PASS", "league_name": "My League", "email": "me@example.com"},
+#    {"name": "friend", "user_env": "FRIEND_USER", "pass_env": "FRIEND_PASS", "all_leagues": true, "rate_limit": 2}]
+# with the credentials in the env variables it names. Accounts can be added and removed while the daemon runs.
+
+# ----------------- SYSTEM PARAMETERS -----------------
+# Should be left unchanged unless you know what you're doing
+
+last_mv_values = 365    # in days, max 365
+last_pfm_values = 50    # in matchdays, max idk
+incremental_ingestion = True    # only fetch new market values, full reload on schema changes or gaps
+max_in_flight = 32      # max amount of concurrent requests of the async ingestion
+bypass_cache = False    # ignore cached API responses and fetch everything fresh
+incremental_training = True # add trees fitted on recent rows to the stored model, full refit once a week
+model_engine = "random_forest"  # "random_forest" or "hist_gradient_boosting", see MODEL_ENGINES in modeling.py
+max_workers = 4         # max amount of accounts served at the same time
+tick_seconds = 30       # seconds between checks for new accounts, due reports and market value updates
+trace_report = os.getenv("KICKBASE_TRACE")  # path of a JSON report with the time, memory and API calls per stage, None = off
+
+# which features to use for training and prediction
+features = [
+    "p", "mv", "days_to_next",
+    "mv_change_1d", "mv_trend_1d",
+    "mv_change_3d", "mv_vol_3d",
+    "mv_trend_7d", "market_divergence"
+]
+
+# what columns to learn and predict on, the market value change over the next 1, 3 and 7 days
+target = ["mv_target_clipped", "mv_target_3d_clipped", "mv_target_7d_clipped"]
+
+# Set dot as thousands separator for better readability
+pd.options.display.float_format = lambda x: '{:,.0f}'.format(x).replace(',', '.')
+
+# ----------------- USER SETTINGS -----------------
+# Adjust these settings to your preferences
+
+competition_ids = [1]                   # competitions to always keep a model of, the ones of all leagues are added
+accounts_path = os.getenv("KICKBASE_ACCOUNTS", "accounts.json")  # accounts to serve, see above
+
+# ---------------------------------------------------
+
+# Apply the cache setting, can also be set via the KICKBASE_CACHE_BYPASS env variable
+client.cache.bypass = client.cache.bypass or bypass_cache
+
+if trace_report:
+    tracer.start(http_stats=client.stats)
+
+daemon = AdvisorDaemon(
+    accounts_path,
+    {
+        "competition_ids": competition_ids,
+        "features": features,
+        "target": target,
+        "last_mv_values": last_mv_values,
+        "last_pfm_values": last_pfm_values,
+        "incremental_ingestion": incremental_ingestion,
+        "incremental_training": incremental_training,
+        "model_engine": model_engine,
+        "max_in_flight": max_in_flight,
+    },
+    max_workers=max_workers,
+    tick_seconds=tick_seconds,
+)
+daemon.run()
+
+if trace_report:
+    tracer.write_report(trace_report)
@@ -0,0 +1,47 @@
+from features.predictions.backtesting import backtest, summarize_backtest
+from features.predictions.preprocessing import preprocess_player_data
+from features.predictions.data_handler import update_player_features, load_player_features_from_db
+from IPython.display import display
+import pandas as pd
+
+# Walk-forward backtest of the predictions on the stored player data, run daily_predictions.py first to fill
+# the database. Every fold trains a model on the days before the fold date and trades on its recommendations.
+
+# ----------------- PARAMETERS -----------------
+
+n_folds = 10            # amount of fold dates
+step_days = 7           # days between the fold dates, counted back from the last day
+min_train_days = 60     # days of history a fold needs at least
+market_size = 30        # random players on the market per day, None for all players
+model_engine = "random_forest"  # see MODEL_ENGINES in modeling.py
+max_workers = None      # processes running folds, None for one per CPU
+
+# same features and target as in daily_predictions.py
+features = [
+    "p", "mv", "days_to_next",
+    "mv_change_1d", "mv_trend_1d",
+    "mv_change_3d", "mv_vol_3d",
+    "mv_trend_7d", "market_divergence"
+]
+target = "mv_target_clipped"
+
+pd.options.display.float_format = lambda x: '{:,.2f}'.format(x)
+pd.set_option("display.max_columns", None)
+pd.set_option("display.width", 1000)
+
+# ----------------------------------------------
+
+if __name__ == "__main__":
+    update_player_features()
+    proc_player_df, _ = preprocess_player_data(load_player_features_from_db())
+
+    results_df = backtest(
+        proc_player_df, features, target, engine=model_engine, n_folds=n_folds, step_days=step_days,
+        min_train_days=min_train_days, market_size=market_size, max_workers=max_workers,
+    )
+    print("\n=== Backtest Folds ===")
+    display(results_df)
+
+    if len(results_df):
+        print("\n=== Backtest Summary ===")
+        display(pd.Series(summarize_backtest(results_df)))
@@ -0,0 +1,72 @@
+from benchmarks.synthetic import make_player_data
+from features.predictions.preprocessing import preprocess_player_data, split_data, get_recent_train_data
+from features.predictions.modeling import MODEL_PARAMS, UPDATE_TREES, UPDATE_WINDOW_DAYS, train_model, update_model, evaluate_model
+from features.predictions.model_registry import FULL_REFIT_DAYS, METRIC_NAMES
+import pandas as pd
+import argparse
+import time
+
+# Benchmark of incremental forest updates against a full refit every day, over a simulated season
+# Every simulated day the data is cut at that day, both strategies are trained and evaluated on the same split.
+# Run from the repository root: python -m benchmarks.bench_incremental_training
+
+FEATURES = [
+    "p", "mv", "days_to_next",
+    "mv_change_1d", "mv_trend_1d",
+    "mv_change_3d", "mv_vol_3d",
+    "mv_trend_7d", "market_divergence",
+]
+TARGET = "mv_target_clipped"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=500)
+    parser.add_argument("--history", type=int, default=365, help="days of history before the simulated season")
+    parser.add_argument("--days", type=int, default=21, help="simulated days")
+    parser.add_argument("--trees", type=int, default=MODEL_PARAMS["n_estimators"])
+    args = parser.parse_args()
+
+    params = dict(MODEL_PARAMS, n_estimators=args.trees)
+    raw_df = make_player_data(n_players=args.players, n_days=args.history + args.days, n_upcoming=0)
+    last_date = raw_df["date"].max()
+
+    results = []
+    incremental_model = None
+
+    for day in range(args.days):
+        date = last_date - pd.Timedelta(days=args.days - 1 - day)
+        df, _ = preprocess_player_data(raw_df[raw_df["date"] <= date])
+        X_train, X_test, y_train, y_test = split_data(df, FEATURES, TARGET)
+
+        start = time.perf_counter()
+        full_model = train_model(X_train, y_train, params)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if day % FULL_REFIT_DAYS == 0:
+            incremental_model = train_model(X_train, y_train, params)
+            mode = "full"
+        else:
+            X_recent, y_recent = get_recent_train_data(df, FEATURES, TARGET, UPDATE_WINDOW_DAYS)
+            incremental_model = update_model(incremental_model, X_recent, y_recent, UPDATE_TREES, params["n_estimators"])
+            mode = "incremental"
+        incremental_time = time.perf_counter() - start
+
+        for strategy, model, seconds in (("full", full_model, full_time), ("incremental", incremental_model, incremental_time)):
+            metrics = dict(zip(METRIC_NAMES, evaluate_model(model, X_test, y_test)))
+            results.append({"day": day, "strategy": strategy, "mode": mode if strategy == "incremental" else "full", "fit_s": seconds, **metrics})
+
+        print(f"day {day:3d}  {mode:11s}  full refit {full_time:7.2f} s  incremental {incremental_time:7.2f} s")
+
+    results_df = pd.DataFrame(results)
+    pd.set_option("display.width", 200)
+
+    print("\nMean per strategy over all simulated days")
+    print(results_df.groupby("strategy")[["fit_s"] + METRIC_NAMES].mean().round(3))
+
+    print("\nIncremental updates only (days without the periodic full refit)")
+    updates = results_df[results_df["day"] % FULL_REFIT_DAYS != 0]
+    print(updates.groupby("strategy")[["fit_s"] + METRIC_NAMES].mean().round(3))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from benchmarks.synthetic import make_player_data
+from benchmarks.bench_incremental_training import FEATURES, TARGET
+from features.predictions.preprocessing import preprocess_player_data, split_data
+from features.predictions.modeling import MODEL_ENGINES, train_model, evaluate_model, measure, measure_model_costs
+from features.predictions.model_registry import METRIC_NAMES
+import pandas as pd
+import argparse
+import tempfile
+import joblib
+import os
+
+# Benchmark of the model engines: evaluation metrics next to fit time, predict latency, size and peak memory
+# Run from the repository root: python -m benchmarks.bench_model_engines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=600)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--engines", nargs="+", default=list(MODEL_ENGINES), choices=list(MODEL_ENGINES))
+    args = parser.parse_args()
+
+    df, _ = preprocess_player_data(make_player_data(n_players=args.players, n_days=args.days, n_upcoming=0))
+    X_train, X_test, y_train, y_test = split_data(df, FEATURES, TARGET)
+    print(f"{len(X_train):,} training rows, {len(X_test):,} test rows")
+
+    results = {}
+    for engine in args.engines:
+        model, fit_seconds, fit_memory = measure(train_model, X_train, y_train, engine=engine)
+        metrics = dict(zip(METRIC_NAMES, evaluate_model(model, X_test, y_test)))
+        costs = measure_model_costs(model, X_test, fit_seconds, fit_memory)
+
+        # Loading the stored model, what every run pays when the model comes from the registry
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "model.joblib")
+            joblib.dump(model, path)
+            _, costs["load_s"], _ = measure(joblib.load, path)
+
+        results[engine] = {**metrics, **costs}
+        print(f"{engine}: fit {fit_seconds:.1f} s")
+
+    pd.set_option("display.width", 200)
+    pd.set_option("display.max_columns", None)
+    print()
+    print(pd.DataFrame(results).T.round(3))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+from benchmarks.stand_in_api import LEAGUE_NAME, add_server_arguments, server_from_arguments
+from benchmarks.bench_incremental_training import FEATURES
+from datetime import date, datetime, timedelta
+import subprocess
+import argparse
+import tempfile
+import json
+import time
+import os
+
+# End-to-end benchmark of the daily_predictions pipeline against the local API stand-in
+# The stage graph of daily_predictions.py (features/pipeline.py) is run with run_stage_graph like in production,
+# every stage (session, ingestion, budgets, market, squad, training, ..., mail rendering) is timed with its peak
+# memory and the total is the wall time of the run. The results are appended to a JSON lines file and compared
+# with the last run of the same configuration, so regressions show up.
+# Run from the repository root: python -m benchmarks.bench_pipeline --players 540 --latency-ms 20
+
+RESULTS_PATH = os.path.join("benchmarks", "results", "pipeline.jsonl")
+REGRESSION_THRESHOLD = 0.25     # relative slowdown of a stage reported as regression
+REGRESSION_MIN_SECONDS = 0.05   # stages faster than this are not compared
+
+TARGET = ["mv_target_clipped", "mv_target_3d_clipped", "mv_target_7d_clipped"]
+
+def run_pipeline(args):
+    """Run the stage graph of daily_predictions once in the current directory, returns {stage: measurements}"""
+
+    # Imported here, the API modules read KICKBASE_BASE_URL on import
+    from kickbase_api.user import login
+    from kickbase_api.league import get_leagues_infos, select_league
+    from kickbase_api.config import client
+    from kickbase_api.tracing import tracer
+    from features.notifier import build_league_mail
+    from features.pipeline import build_stages
+    from features.stage_graph import run_stage_graph, critical_path
+
+    client.stats.reset()
+    tracer.start(http_stats=client.stats)
+
+    def session_stage():
+        token = login("stand-in@example.com", "password")
+        league_infos = get_leagues_infos(token)
+        leagues = league_infos if args.leagues > 1 else [select_league(league_infos, LEAGUE_NAME)]
+        return token, leagues
+
+    start = time.perf_counter()
+    with tracer.stage("session"):
+        token, leagues = session_stage()
+    session_seconds = time.perf_counter() - start
+
+    # The stages of daily_predictions.py, the mail is rendered instead of sent
+    stages = build_stages(token, leagues, {
+        "features": FEATURES,
+        "target": TARGET,
+        "competition_ids": [1],
+        "last_mv_values": args.days,
+        "last_pfm_values": 50,
+        "incremental_ingestion": True,
+        "use_async_ingestion": True,
+        "max_in_flight": args.max_in_flight,
+        "incremental_training": True,
+        "model_engine": args.engine,
+        "start_budget": 50_000_000,
+        "league_start_date": (date.today() - timedelta(days=args.days)).isoformat(),
+        "league_settings": {},
+        "email": "stand-in@example.com",
+        "force_reload": args.reload,
+    }, send_mail=build_league_mail)
+    _, timings = run_stage_graph(stages)
+    path = critical_path(stages, timings)
+    tracer.stop()
+
+    peak_mb = {stage["name"]: stage["peak_mb"] for stage in tracer.stages}
+    failed = {name: timing["error"] for name, timing in timings.items() if timing["status"] != "done"}
+    if failed:
+        raise RuntimeError(f"Stages failed or skipped: {failed}")
+
+    requests = client.stats.snapshot()
+    return {
+        "stages": {
+            "session": {"seconds": session_seconds, "peak_mb": peak_mb.get("session")},
+            **{name: {"seconds": timing["seconds"], "peak_mb": peak_mb.get(name)} for name, timing in timings.items()},
+        },
+        "critical_path": path,
+        "total_seconds": session_seconds + (timings[path[-1]]["end"] if path else 0.0),
+        "requests": sum(entry["requests"] for entry in requests.values()),
+        "retries": sum(entry["retries"] for entry in requests.values()),
+    }
+
+def get_commit():
+    """Current git commit of the repository, None outside of a git checkout"""
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_previous(path, config):
+    """Last recorded result with the same configuration, None if there is none"""
+
+    if not os.path.exists(path):
+        return None
+
+    previous = None
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["config"] == config:
+                previous = record
+
+    return previous
+
+def compare(record, previous):
+    """Print the stages of every run next to the previous record, returns the regressed (run, stage) pairs"""
+
+    regressions = []
+    for i, run in enumerate(record["runs"]):
+        previous_run = previous["runs"][i] if previous and i < len(previous["runs"]) else None
+        print(f"\nRun {i + 1}: {run['total_seconds']:.2f} s, {run['requests']} requests, {run['retries']} retries")
+        print(f"  critical path: {' -> '.join(run['critical_path'])}")
+
+        for name, entry in run["stages"].items():
+            line = f"  {name:<34}{entry['seconds']:9.3f} s"
+            if entry["peak_mb"] is not None:
+                line += f"{entry['peak_mb']:9.1f} MB"
+
+            before = previous_run["stages"].get(name) if previous_run else None
+            if before:
+                change = entry["seconds"] / before["seconds"] - 1 if before["seconds"] else 0.0
+                line += f"   {change:+7.1%} vs {previous['commit']}"
+                if change > REGRESSION_THRESHOLD and entry["seconds"] > REGRESSION_MIN_SECONDS:
+                    line += "  REGRESSION"
+                    regressions.append((i + 1, name))
+            print(line)
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_server_arguments(parser)
+    parser.add_argument("--runs", type=int, default=2, help="pipeline runs on the same data, the later ones are warm")
+    parser.add_argument("--reload", action="store_true", help="fetch new market values on every run")
+    parser.add_argument("--engine", default="random_forest", help="model engine, see MODEL_ENGINES in modeling.py")
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    parser.add_argument("--workdir", help="directory of the database, cache and models, a new temporary one by default")
+    args = parser.parse_args()
+
+    config = {
+        name: getattr(args, name) for name in (
+            "players", "days", "leagues", "fixtures", "latency_ms", "jitter_ms", "error_rate", "rate_limit", "seed",
+            "runs", "reload", "engine", "max_in_flight",
+        )
+    }
+    results_path = os.path.abspath(args.results)
+    commit = get_commit()
+    cwd = os.getcwd()
+
+    with server_from_arguments(args) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["KICKBASE_BASE_URL"] = server.base_url
+        os.makedirs(args.workdir or tmp_dir, exist_ok=True)
+        os.chdir(args.workdir or tmp_dir)
+
+        try:
+            runs = [run_pipeline(args) for _ in range(args.runs)]
+        finally:
+            os.chdir(cwd)
+        server_stats = dict(server.stats)
+
+    record = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "config": config,
+        "runs": runs,
+        "server": server_stats,
+    }
+
+    previous = load_previous(results_path, config)
+    regressions = compare(record, previous)
+    print(f"\nServer: {server_stats}")
+    if regressions:
+        print(f"Regressions (> {REGRESSION_THRESHOLD:.0%} slower): {regressions}")
+
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with open(results_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    main()
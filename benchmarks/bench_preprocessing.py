@@ -0,0 +1,106 @@
+from benchmarks.synthetic import make_player_data
+from features.predictions.feature_engine import FEATURE_COLUMNS, HORIZONS, compute_features, target_column
+import pandas as pd
+import numpy as np
+import argparse
+import time
+
+# Micro-benchmark of the feature engine against the previous pandas groupby implementation
+# Run from the repository root: python -m benchmarks.bench_preprocessing
+
+def legacy_compute_features(df):
+    """Steps 1-4 of the previous preprocess_player_data, one pandas groupby per feature"""
+
+    # 1. Sort and filter
+    df = df.sort_values(["player_id", "date"])
+    df = df[
+        (df["team_id"] == df["t1"]) |
+        (df["team_id"] == df["t2"]) |
+        (df["t1"].isna() & df["t2"].isna())
+    ].copy()
+
+    df["date"] = pd.to_datetime(df["date"])
+    df["md"] = pd.to_datetime(df["md"])
+
+    # 2. Date and matchday calculations
+    df["next_day"] = df.groupby("player_id")["date"].shift(-1)
+    df["next_md"] = df.groupby("player_id")["md"].transform(
+        lambda x: x.shift(-1).where(x.shift(-1) != x).bfill()
+    )
+    df["days_to_next"] = (df["next_md"] - df["date"]).dt.days
+
+    # 3. Next day market value
+    df["mv_next_day"] = df.groupby("player_id")["mv"].shift(-1)
+    df["mv_target"] = df["mv_next_day"] - df["mv"]
+    df = df[df["mv"] != 0.0]
+
+    # 4. Feature engineering
+    df["mv_change_1d"] = df["mv"] - df.groupby("player_id")["mv"].shift(1)
+    df["mv_trend_1d"] = df.groupby("player_id")["mv"].pct_change(fill_method=None)
+    df["mv_trend_1d"] = df["mv_trend_1d"].replace([np.inf, -np.inf], 0).fillna(0)
+
+    df["mv_change_3d"] = df["mv"] - df.groupby("player_id")["mv"].shift(3)
+    df["mv_vol_3d"] = df.groupby("player_id")["mv"].rolling(3).std().reset_index(0,drop=True)
+
+    df["mv_trend_7d"] = df.groupby("player_id")["mv"].pct_change(periods=7, fill_method=None)
+    df["mv_trend_7d"] = df["mv_trend_7d"].replace([np.inf, -np.inf], 0).fillna(0)
+
+    # Rolled over the whole frame, so the first rows of a player mix in the previous player
+    df["market_divergence"] = (df["mv"] / df.groupby("md")["mv"].transform("mean")).rolling(3).mean()
+
+    return df
+
+def check_equal(new_df, old_df):
+    """Check the feature engine against the legacy implementation, market_divergence against a per-player rolling
+    and the targets of the longer horizons against a per-player shift"""
+
+    pd.testing.assert_index_equal(new_df.index, old_df.index)
+
+    horizon_columns = [target_column(horizon) for horizon in HORIZONS[1:]]
+    for column in FEATURE_COLUMNS:
+        if column == "market_divergence" or column in horizon_columns:
+            continue
+        # pandas rolls the std online and drifts by fractions of a cent, e.g. on constant windows
+        atol = 0.01 if column == "mv_vol_3d" else 0.0
+        pd.testing.assert_series_equal(new_df[column], old_df[column], check_dtype=False, rtol=1e-9, atol=atol)
+
+    ratio = old_df["mv"] / old_df.groupby("md")["mv"].transform("mean")
+    expected = ratio.groupby(old_df["player_id"]).rolling(3).mean().reset_index(0, drop=True)
+    pd.testing.assert_series_equal(new_df["market_divergence"], expected, check_dtype=False, check_names=False, rtol=1e-9)
+
+    # Synthetic players with mv 0 are dropped completely, so no rows are missing between the shifted ones
+    for horizon, column in zip(HORIZONS[1:], horizon_columns):
+        expected = old_df.groupby("player_id")["mv"].shift(-horizon) - old_df["mv"]
+        pd.testing.assert_series_equal(new_df[column], expected, check_dtype=False, check_names=False, rtol=1e-9)
+
+def best_of(func, df, repeats):
+    """Best wall time of repeated calls in seconds and the last result"""
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(df)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=1600, help="amount of players (about three competitions)")
+    parser.add_argument("--days", type=int, default=365, help="market value days per player")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_player_data(n_players=args.players, n_days=args.days)
+    print(f"{len(df):,} rows, {args.players:,} players, {args.days} days")
+
+    legacy_time, old_df = best_of(legacy_compute_features, df, args.repeats)
+    engine_time, new_df = best_of(compute_features, df, args.repeats)
+    check_equal(new_df, old_df)
+
+    print(f"legacy groupby:  {legacy_time:8.3f} s")
+    print(f"feature engine:  {engine_time:8.3f} s")
+    print(f"speedup:         {legacy_time / engine_time:8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+from benchmarks.stand_in_api import LEAGUE_NAME, add_server_arguments, server_from_arguments
+from benchmarks.bench_incremental_training import FEATURES
+from benchmarks.bench_pipeline import TARGET, get_commit
+from urllib.parse import quote
+from datetime import datetime
+import concurrent.futures
+import http.client
+import numpy as np
+import threading
+import argparse
+import tempfile
+import random
+import json
+import time
+import os
+
+# Latency benchmark of the prediction service (features/service.py) under concurrent load
+# The service is loaded from the local API stand-in and served on a free port, then every endpoint is hit by
+# --clients concurrent clients with keep-alive connections. Reports p50, p99 and max latency and the
+# throughput per endpoint. The first /market and /squad request of a league is the one fetching the live data,
+# it is reported separately (cold), with --live-ttl 0 every request fetches it.
+# Run from the repository root: python -m benchmarks.bench_service --clients 16 --latency-ms 20
+
+RESULTS_PATH = os.path.join("benchmarks", "results", "service.jsonl")
+
+def percentiles(latencies):
+    """p50, p99 and max of latencies in ms"""
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+    }
+
+def get(connection, path):
+    """Send a GET over a keep-alive connection, returns (status, seconds)"""
+
+    start = time.perf_counter()
+    connection.request("GET", path)
+    response = connection.getresponse()
+    response.read()
+    return response.status, time.perf_counter() - start
+
+def load(port, paths, clients, requests_per_client, seed):
+    """Send requests_per_client requests of random paths from each of clients threads, returns the measurements"""
+
+    barrier = threading.Barrier(clients)
+
+    def client(i):
+        rng = random.Random(seed + i)
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        latencies, errors = [], 0
+        barrier.wait()
+        try:
+            for _ in range(requests_per_client):
+                status, seconds = get(connection, rng.choice(paths))
+                latencies.append(seconds)
+                errors += status != 200
+        finally:
+            connection.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(client, range(clients)))
+    seconds = time.perf_counter() - start
+
+    latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+    return {
+        **percentiles(latencies),
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "requests_per_s": len(latencies) / seconds,
+    }
+
+def run_service(args):
+    """Load the service from the stand-in in the current directory and measure its endpoints"""
+
+    # Imported here, the API modules read KICKBASE_BASE_URL on import
+    from features.service import PredictionService, ServiceHTTPServer, service_handler
+    from features.daemon import ACCOUNT_DEFAULTS, Session
+    from kickbase_api.config import client
+
+    service = PredictionService(
+        Session({**ACCOUNT_DEFAULTS, "name": "bench"}),
+        {
+            "competition_ids": [1],
+            "features": FEATURES,
+            "target": TARGET,
+            "last_mv_values": args.days,
+            "last_pfm_values": 50,
+            "incremental_ingestion": True,
+            "incremental_training": True,
+            "model_engine": args.engine,
+            "max_in_flight": 32,
+        },
+        live_ttl=args.live_ttl,
+    )
+
+    start = time.perf_counter()
+    service.refresh()
+    load_seconds = time.perf_counter() - start
+
+    httpd = ServiceHTTPServer(("127.0.0.1", 0), service_handler(service))
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    league = quote(LEAGUE_NAME)
+    player_ids = sorted(service.snapshot.players)
+    endpoints = {
+        "predict": [f"/predict?player_id={player_id}" for player_id in player_ids],
+        "market": [f"/market?league={league}"],
+        "squad": [f"/squad?league={league}"],
+    }
+    endpoints["mixed"] = endpoints["predict"] + endpoints["market"] * 10 + endpoints["squad"] * 10
+
+    try:
+        # The first market and squad request of the league fetches the live data
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        cold = {name: get(connection, endpoints[name][0])[1] * 1000 for name in ("market", "squad")}
+        connection.close()
+
+        client.stats.reset()
+        results = {
+            name: load(port, paths, args.clients, args.requests, args.seed) for name, paths in endpoints.items()
+        }
+        api_requests = sum(entry["requests"] for entry in client.stats.snapshot().values())
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    return {"load_seconds": load_seconds, "cold_ms": cold, "endpoints": results, "api_requests": api_requests}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_server_arguments(parser)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=250, help="requests per client and endpoint")
+    parser.add_argument("--live-ttl", type=float, default=60, help="seconds the market and squad are reused")
+    parser.add_argument("--engine", default="random_forest", help="model engine, see MODEL_ENGINES in modeling.py")
+    parser.add_argument("--results", default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    config = {
+        name: getattr(args, name) for name in (
+            "players", "days", "latency_ms", "jitter_ms", "error_rate", "seed", "clients", "requests", "live_ttl", "engine",
+        )
+    }
+    results_path = os.path.abspath(args.results)
+    cwd = os.getcwd()
+
+    with server_from_arguments(args) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ["KICKBASE_BASE_URL"] = server.base_url
+        os.environ.setdefault("KICK_USER", "stand-in@example.com")
+        os.environ.setdefault("KICK_PASS", "password")
+        os.chdir(tmp_dir)
+
+        try:
+            result = run_service(args)
+        finally:
+            os.chdir(cwd)
+
+    print(f"\nSnapshot loaded in {result['load_seconds']:.1f} s, cold market {result['cold_ms']['market']:.1f} ms, "
+          f"cold squad {result['cold_ms']['squad']:.1f} ms")
+    print(f"{'endpoint':<10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'req/s':>9}{'errors':>8}")
+    for name, entry in result["endpoints"].items():
+        print(f"{name:<10}{entry['p50_ms']:9.2f}{entry['p99_ms']:9.2f}{entry['max_ms']:9.2f}"
+              f"{entry['requests_per_s']:9.0f}{entry['errors']:8d}")
+    print(f"API requests during the load: {result['api_requests']}")
+
+    record = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": get_commit(),
+        "config": config,
+        **result,
+    }
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    with open(results_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from collections import Counter
+import numpy as np
+import itertools
+import threading
+import argparse
+import hashlib
+import random
+import gzip
+import json
+import time
+import re
+
+# Local stand-in of the Kickbase v4 API for offline benchmarks and tests of the pipeline
+# Serves the endpoints the kickbase_api package uses from synthetic data scaled to N players x D days, or from
+# recorded fixtures, with configurable latency, error rate and 429 throttling. Point the pipeline to it with
+# KICKBASE_BASE_URL=http://127.0.0.1:<port>/v4
+# Run from the repository root: python -m benchmarks.stand_in_api --players 540 --latency-ms 20 --rate-limit 50
+
+LEAGUE_ID = "1"
+LEAGUE_NAME = "Stand-in League"
+USERNAME = "stand-in"
+SEASON_ID = "34"
+
+class SyntheticData:
+    """Synthetic API payloads of one league over competitions of n_players players with n_days market values
+
+    Every payload is derived from the seed and the ids, so the same request always gets the same response.
+    """
+
+    def __init__(self, n_players=540, n_days=365, n_teams=18, n_managers=10, competition_ids=(1,), n_leagues=1, seed=0):
+        self.n_days = n_days
+        self.seed = seed
+        self.logins = itertools.count(1)
+        self.today = date.today()
+
+        # Teams and players per competition, ids are unique over all competitions
+        self.teams = {}         # competition id -> team ids
+        self.players = {}       # player id -> (competition id, team id)
+        per_team = max(1, n_players // n_teams)
+        for c, competition_id in enumerate(competition_ids):
+            team_ids = [str(100 * (c + 1) + t) for t in range(n_teams)]
+            self.teams[competition_id] = team_ids
+            for t, team_id in enumerate(team_ids):
+                for k in range(per_team):
+                    self.players[str(10000 * (c + 1) + 100 * t + k)] = (competition_id, team_id)
+
+        # Weekly matchdays over the market value history plus two upcoming ones
+        first = datetime.combine(self.today - timedelta(days=n_days), datetime.min.time()) + timedelta(hours=15, minutes=30)
+        self.matchdays = [first + timedelta(days=7 * i) for i in range(n_days // 7 + 3)]
+
+        self.managers = [(f"manager_{i}" if i else USERNAME, str(i + 1)) for i in range(n_managers)]
+
+        # Leagues of the account, spread over the competitions
+        self.league_competitions = {
+            str(int(LEAGUE_ID) + i): competition_ids[i % len(competition_ids)] for i in range(n_leagues)
+        }
+
+    def league_name(self, league_id):
+        return LEAGUE_NAME if league_id == LEAGUE_ID else f"{LEAGUE_NAME} {league_id}"
+
+    def league_players(self, league_id, salt, n):
+        """n players of the competition of a league, e.g. the ones on its market"""
+
+        competition_id = self.league_competitions.get(league_id, next(iter(self.teams)))
+        player_ids = sorted(player_id for player_id, (c, _) in self.players.items() if c == competition_id)
+        rng = self.rng(salt, league_id)
+        return [str(i) for i in rng.choice(player_ids, min(n, len(player_ids)), replace=False)]
+
+    def rng(self, *ids):
+        return np.random.default_rng([self.seed, *(int(i) for i in ids)])
+
+    def market_values(self, player_id):
+        """Daily market values of a player, a random walk over n_days days ending today"""
+
+        rng = self.rng(player_id)
+        start = round(rng.lognormal(14, 1), -4)
+        steps = rng.normal(0, 0.02, self.n_days)
+        return (start * np.exp(np.cumsum(steps))).round(-3)
+
+    def team_name(self, team_id):
+        return f"Team {team_id}"
+
+    # ----------------- endpoints -----------------
+
+    def login(self, match, query):
+        # A new token per login, like the real API, so per-token rate limits can be told apart
+        return {"tkn": f"stand-in-token-{next(self.logins)}"}
+
+    def settings(self, match, query):
+        return {"u": {"unm": USERNAME}}
+
+    def leagues(self, match, query):
+        return {"it": [
+            {"i": league_id, "n": self.league_name(league_id), "cpi": str(competition_id)}
+            for league_id, competition_id in self.league_competitions.items()
+        ]}
+
+    def activities(self, match, query):
+        rng = self.rng(1)
+        player_ids = sorted(self.players)
+        names = [name for name, _ in self.managers]
+        start = self.today - timedelta(days=self.n_days)
+
+        feed = []
+        for i in range(20 * len(names)):
+            dt = (start + timedelta(days=int(rng.integers(self.n_days)))).isoformat() + "T20:00:00Z"
+            buyer, seller = rng.choice(len(names) + 1, 2, replace=False)
+            feed.append({"t": 15, "dt": dt, "data": {
+                "byr": names[buyer] if buyer < len(names) else None,
+                "slr": names[seller] if seller < len(names) else None,
+                "pi": str(rng.choice(player_ids)), "pn": "Player", "tid": "1",
+                "trp": int(rng.integers(5, 200)) * 10000,
+            }})
+        for day in range(0, self.n_days, 7):
+            feed.append({"t": 22, "dt": (start + timedelta(days=day)).isoformat() + "T08:00:00Z", "data": {"bn": 25000}})
+        for achievement_id in (1, 2, 3, 1):
+            feed.append({"t": 26, "dt": start.isoformat() + "T09:00:00Z", "data": {"t": achievement_id}})
+
+        # Newest first with stable ids, paged with start and max like the real feed
+        feed.sort(key=lambda entry: entry["dt"])
+        for i, entry in enumerate(feed):
+            entry["i"] = str(1000 + i)
+        feed.reverse()
+
+        first = int(query.get("start", 0))
+        return {"af": feed[first:first + int(query.get("max", 25))]}
+
+    def market(self, match, query):
+        rng = self.rng(2, match.group(1))
+        return {"it": [
+            {"i": player_id, "prob": int(rng.integers(1, 6)), "exs": int(rng.integers(600, 2 * 86400))}
+            for player_id in self.league_players(match.group(1), 4, 30)
+        ]}
+
+    def squad(self, match, query):
+        return {"it": [
+            {"i": player_id, "prob": 1, "mv": float(self.market_values(player_id)[-1])}
+            for player_id in self.league_players(match.group(1), 5, 15)
+        ]}
+
+    def ranking(self, match, query):
+        rng = self.rng(3)
+        return {"us": [{"n": name, "i": manager_id, "sp": int(rng.integers(500, 2000))} for name, manager_id in self.managers]}
+
+    def budget(self, match, query):
+        return {"b": 1_000_000}
+
+    def me(self, match, query):
+        return {"b": 1_000_000, "tv": 60_000_000}
+
+    def dashboard(self, match, query):
+        return {"tv": int(self.rng(4, match[1]).integers(40, 120)) * 1_000_000}
+
+    def manager_performance(self, match, query):
+        return {"it": [{"sid": SEASON_ID, "tp": int(self.rng(5, match[1]).integers(500, 2000))}]}
+
+    def achievement(self, match, query):
+        return {"ac": int(match[1]), "er": 50000}
+
+    def table(self, match, query):
+        return {"it": [{"tid": team_id, "tn": self.team_name(team_id)} for team_id in self.teams.get(int(match[1]), [])]}
+
+    def matchdays_payload(self, match, query):
+        return {"it": [
+            {"day": i + 1, "it": [{"day": i + 1, "dt": md.strftime("%Y-%m-%dT%H:%M:%SZ")}]}
+            for i, md in enumerate(self.matchdays)
+        ]}
+
+    def team_profile(self, match, query):
+        team_id = match[2]
+        return {"tid": team_id, "tn": self.team_name(team_id), "it": [
+            {"i": player_id, "n": f"Player {player_id}", "pos": int(player_id) % 4 + 1}
+            for player_id, (_, player_team) in self.players.items() if player_team == team_id
+        ]}
+
+    def player(self, match, query):
+        player_id = match[2]
+        if player_id not in self.players:
+            return None
+        team_id = self.players[player_id][1]
+        return {
+            "i": player_id, "tid": team_id, "tn": self.team_name(team_id),
+            "fn": "First", "ln": f"Player {player_id}", "pos": int(player_id) % 4 + 1,
+        }
+
+    def search(self, match, query):
+        return {"it": [{"pi": next(iter(self.players))}]}
+
+    def market_value(self, match, query):
+        player_id, timeframe = match[2], int(match[3])
+        if player_id not in self.players:
+            return None
+        values = self.market_values(player_id)[-timeframe:]
+        today = (self.today - date(1970, 1, 1)).days
+        return {"it": [{"dt": today - len(values) + 1 + i, "mv": float(mv)} for i, mv in enumerate(values)]}
+
+    def performance(self, match, query):
+        player_id = match[2]
+        if player_id not in self.players:
+            return None
+        competition_id, team_id = self.players[player_id]
+        team_ids = self.teams[competition_id]
+        rng = self.rng(6, player_id)
+
+        history = []
+        for i, md in enumerate(self.matchdays):
+            opponent = team_ids[(team_ids.index(team_id) + i + 1) % len(team_ids)]
+            entry = {"day": i + 1, "md": md.strftime("%Y-%m-%dT%H:%M:%SZ"), "t1": team_id, "t2": opponent}
+            if md.date() <= self.today:
+                minutes = int(rng.choice([0, 15, 45, 90]))
+                entry.update({
+                    "p": int(rng.integers(-50, 250)) if minutes else 0, "mp": f"{minutes}'",
+                    "t1g": int(rng.integers(0, 4)), "t2g": int(rng.integers(0, 4)),
+                    "k": [int(rng.integers(1, 6))] if rng.random() < 0.3 else None,
+                })
+            history.append(entry)
+
+        return {"it": [{"ti": "2025/2026", "ph": history}]}
+
+    def routes(self):
+        """(method, path pattern, handler) of all endpoints, paths without the /v4 prefix"""
+
+        return [
+            ("POST", r"/user/login", self.login),
+            ("GET", r"/user/settings", self.settings),
+            ("GET", r"/leagues/selection", self.leagues),
+            ("GET", r"/leagues/(\d+)/activitiesFeed", self.activities),
+            ("GET", r"/leagues/(\d+)/market", self.market),
+            ("GET", r"/leagues/(\d+)/squad", self.squad),
+            ("GET", r"/leagues/(\d+)/ranking", self.ranking),
+            ("GET", r"/leagues/(\d+)/me/budget", self.budget),
+            ("GET", r"/leagues/(\d+)/me", self.me),
+            ("GET", r"/leagues/\d+/managers/(\d+)/dashboard", self.dashboard),
+            ("GET", r"/leagues/\d+/managers/(\d+)/performance", self.manager_performance),
+            ("GET", r"/leagues/\d+/user/achievements/(\d+)", self.achievement),
+            ("GET", r"/competitions/(\d+)/table", self.table),
+            ("GET", r"/competitions/(\d+)/matchdays", self.matchdays_payload),
+            ("GET", r"/competitions/(\d+)/teams/(\d+)/teamprofile", self.team_profile),
+            ("GET", r"/competitions/(\d+)/players/search", self.search),
+            ("GET", r"/competitions/(\d+)/players/(\d+)", self.player),
+            ("GET", r"/competitions/(\d+)/players/(\d+)/marketvalue/(\d+)", self.market_value),
+            ("GET", r"/competitions/(\d+)/players/(\d+)/performance", self.performance),
+        ]
+
+def load_fixtures(path):
+    """Recorded responses as {"<METHOD> <path?query>": body}, .gz files are decompressed
+
+    A traffic archive of kickbase_api/traffic.py is served with the first successful response per request.
+    """
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        fixtures = json.load(f)
+
+    if "responses" in fixtures and "version" in fixtures:
+        return {
+            key: next(entry["body"] for entry in entries if entry["status"] < 400)
+            for key, entries in fixtures["responses"].items()
+            if any(entry["status"] < 400 for entry in entries)
+        }
+
+    return fixtures
+
+class RateLimiter:
+    """Allow rate requests per window of window seconds, like an API limit per second or minute"""
+
+    def __init__(self, rate, window=1.0):
+        self.rate = rate
+        self.window = window
+        self.window_start = time.monotonic()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Count a request, returns 0 or the seconds until the next window if the limit is reached"""
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start = now - (now - self.window_start) % self.window
+                self.count = 0
+            if self.count < self.rate:
+                self.count += 1
+                return 0.0
+            return self.window - (now - self.window_start)
+
+class StandInHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer with a listen backlog for many concurrent connections"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+class StandInServer:
+    """Threaded HTTP server answering the Kickbase API requests from synthetic data or recorded fixtures
+
+    latency and jitter are in seconds per request, error_rate the share of requests answered with a 500,
+    rate_limit the requests per second before 429 with a Retry-After until the next second are returned.
+    """
+
+    def __init__(self, data=None, fixtures=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit=None, seed=0):
+        self.data = data if data is not None or fixtures is not None else SyntheticData(seed=seed)
+        self.fixtures = fixtures or {}
+        self.routes = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in (self.data.routes() if self.data else [])]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.stats = Counter()
+        self.stats_lock = threading.Lock()
+
+        self.httpd = StandInHTTPServer((host, port), self.handler_class())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v4"
+
+    def count(self, name):
+        with self.stats_lock:
+            self.stats[name] += 1
+
+    def resolve(self, method, target):
+        """Body of a request, from the fixtures first, None if the endpoint is unknown"""
+
+        key = f"{method} {target[len('/v4'):] if target.startswith('/v4') else target}"
+        if key in self.fixtures:
+            return self.fixtures[key]
+
+        parts = urlsplit(key.split(" ", 1)[1])
+        query = dict(pair.split("=", 1) for pair in parts.query.split("&") if "=" in pair)
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(parts.path)
+            if route_method == method and match:
+                return handler(match, query)
+
+        return None
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def handle_request(self, method):
+                if method == "POST":
+                    self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                server.count("requests")
+
+                with server.random_lock:
+                    delay = server.latency + server.random.uniform(0, server.jitter)
+                    failed = server.random.random() < server.error_rate
+                if delay:
+                    time.sleep(delay)
+
+                if server.limiter is not None:
+                    wait = server.limiter.take()
+                    if wait:
+                        server.count("throttled")
+                        return self.send(429, headers={"Retry-After": f"{wait:.3f}"})
+                if failed:
+                    server.count("errors")
+                    return self.send(500)
+
+                try:
+                    payload = server.resolve(method, self.path)
+                except Exception as e:
+                    print(f"Warning: Stand-in failed on {method} {self.path}: {e!r}")
+                    server.count("failed")
+                    return self.send(500)
+                if payload is None:
+                    server.count("not_found")
+                    return self.send(404)
+
+                body = json.dumps(payload).encode()
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    server.count("not_modified")
+                    return self.send(304, headers={"ETag": etag})
+
+                self.send(200, body, {"Content-Type": "application/json", "ETag": etag})
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread, returns the base URL"""
+
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def add_server_arguments(parser):
+    """Command line options of the stand-in, shared with the benchmarks that start one"""
+
+    parser.add_argument("--players", type=int, default=540, help="players per competition")
+    parser.add_argument("--days", type=int, default=365, help="market value days per player")
+    parser.add_argument("--leagues", type=int, default=1, help="leagues of the account")
+    parser.add_argument("--fixtures", help="recorded responses (.json or .json.gz) served before the synthetic ones")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random extra delay per request, up to")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--rate-limit", type=float, help="requests per second before 429 responses")
+    parser.add_argument("--seed", type=int, default=0)
+
+def server_from_arguments(args, port=0):
+    """Build a StandInServer from the options of add_server_arguments"""
+
+    return StandInServer(
+        data=SyntheticData(n_players=args.players, n_days=args.days, n_leagues=args.leagues, seed=args.seed),
+        fixtures=load_fixtures(args.fixtures) if args.fixtures else None,
+        port=port,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_server_arguments(parser)
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    server = server_from_arguments(args, args.port)
+    print(f"Serving the Kickbase API stand-in, KICKBASE_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(dict(server.stats))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import pandas as pd
+import numpy as np
+
+# Synthetic player data in the shape of storage.load_player_data, for the benchmarks
+
+def make_player_data(n_players=1600, n_days=365, n_upcoming=3, players_per_team=30, seed=0):
+    """Generate a wide player_data_1d frame: daily market values joined with weekly performances"""
+
+    rng = np.random.default_rng(seed)
+    n_teams = max(n_players // players_per_team, 2)
+    end = pd.Timestamp.now().normalize() - pd.Timedelta(days=1)
+    dates = pd.date_range(end=end, periods=n_days, freq="D")
+    matchdays = pd.date_range(start=dates[0], end=end + pd.Timedelta(days=7 * n_upcoming), freq="7D")
+
+    player_ids = np.arange(n_players) + 1000
+    team_ids = rng.integers(1, n_teams + 1, n_players)
+
+    # Market value random walk per player, some players are worth nothing (mv 0)
+    start_mv = rng.lognormal(14, 1, n_players).round(-4)
+    steps = rng.normal(0, 0.02, (n_players, n_days))
+    mv = (start_mv[:, None] * np.exp(np.cumsum(steps, axis=1))).round(-3)
+    mv[rng.random(n_players) < 0.05] = 0.0
+
+    mv_df = pd.DataFrame({
+        "player_id": np.repeat(player_ids, n_days),
+        "date": np.tile(dates.values, n_players),
+        "mv": mv.ravel(),
+    })
+
+    # One performance row per matchday, the own team is t1 or t2
+    n_md = len(matchdays)
+    own = np.repeat(team_ids, n_md)
+    other = (own + rng.integers(1, n_teams, len(own)) - 1) % n_teams + 1
+    home = rng.random(len(own)) < 0.5
+    played = np.repeat(matchdays <= end, n_players).reshape(n_md, n_players).T.ravel()
+
+    p_df = pd.DataFrame({
+        "player_id": np.repeat(player_ids, n_md),
+        "date": np.tile(matchdays.values, n_players),
+        "p": np.where(played, rng.integers(-50, 300, len(own)), np.nan),
+        "mp": np.where(played, rng.integers(0, 91, len(own)), 0),
+        "ppm": np.where(played, rng.normal(3, 1, len(own)).round(2), np.nan),
+        "t1": np.where(home, own, other).astype(str),
+        "t2": np.where(home, other, own).astype(str),
+        "t1g": np.where(played, rng.integers(0, 4, len(own)), np.nan),
+        "t2g": np.where(played, rng.integers(0, 4, len(own)), np.nan),
+        "won": np.where(played, rng.integers(0, 3, len(own)), np.nan),
+        "k": None,
+    })
+    p_df["md"] = p_df["date"].dt.strftime("%Y-%m-%d")
+
+    # Latest performance up to each day, plus the upcoming matchdays, like storage.load_player_data
+    mv_df = mv_df.sort_values("date", kind="stable")
+    p_df = p_df.sort_values("date", kind="stable")
+    df = pd.merge_asof(mv_df, p_df, on="date", by="player_id", direction="backward")
+    df = pd.concat([df, p_df[p_df["date"] > end]], ignore_index=True)
+
+    players = pd.DataFrame({
+        "player_id": player_ids,
+        "team_id": team_ids.astype(str),
+        "team_name": pd.Series(team_ids).map(lambda t: f"Team {t}").values,
+        "first_name": None,
+        "last_name": [f"Player {i}" for i in player_ids],
+        "position": rng.integers(1, 5, n_players),
+        "competition_id": 1,
+    })
+    df = df.merge(players, on="player_id", how="inner")
+    df["player_id"] = df["player_id"].astype(str)
+
+    columns = [
+        "player_id", "team_id", "team_name", "first_name", "last_name", "position",
+        "mv", "date", "md", "p", "mp", "ppm", "t1", "t2", "t1g", "t2g", "won", "k",
+        "competition_id",
+    ]
+    return df[columns].sort_values(["player_id", "date"], ignore_index=True)
@@ -1,19 +1,12 @@
-from features.predictions.predictions import live_data_predictions, join_current_market, join_current_squad
-from features.predictions.preprocessing import preprocess_player_data, split_data
-from features.predictions.modeling import train_model, evaluate_model
-from kickbase_api.league import get_league_id
+from features.stage_graph import run_stage_graph, critical_path
+from features.pipeline import build_stages
+from kickbase_api.league import get_leagues_infos, select_league
 from kickbase_api.user import login
-from features.notifier import send_mail
-from features.predictions.data_handler import (
-    create_player_data_table,
-    check_if_data_reload_needed,
-    save_player_data_to_db,
-    load_player_data_from_db,
-)
-from features.budgets import calc_manager_budgets
+from kickbase_api.config import client, get_cache_stats, get_request_stats
+from kickbase_api.tracing import tracer
 from IPython.display import display
 from dotenv import load_dotenv
-import os, pandas as pd
+import os, sys, pandas as pd
 
 # Load environment variables from .env file
 load_dotenv() 
@@ -21,7 +14,6 @@ load_dotenv()
 # ----------------- Notes & TODOs -----------------
 
 # TODO Fix the UTC timezone problems in the github actions scheduling
-# TODO Add prediction of 3, 7 days, to give more context
 # TODO Based upon the overpay of the other users, calculate a max price to pay for a player
 # TODO Add features like starting 11 probability, injuries, ...
 # TODO Improve budget calculation, weird bug that for me the budgets is 513929 off, idk why, checked everything
@@ -31,6 +23,14 @@ load_dotenv()
 
 last_mv_values = 365    # in days, max 365
 last_pfm_values = 50    # in matchdays, max idk
+incremental_ingestion = True    # only fetch new market values, full reload on schema changes or gaps
+use_async_ingestion = True  # fetch player data with asyncio instead of a thread pool
+max_in_flight = 32      # max amount of concurrent requests of the async ingestion
+bypass_cache = False    # ignore cached API responses and fetch everything fresh
+incremental_training = True # add trees fitted on recent rows to the stored model, full refit once a week
+model_engine = "random_forest"  # "random_forest" or "hist_gradient_boosting", see MODEL_ENGINES in modeling.py
+trace_report = os.getenv("KICKBASE_TRACE")  # path of a JSON report with the time, memory and API calls per stage, None = off
+profile_run = False     # also write a cProfile of the run next to the trace report (<trace_report>.prof)
 
 # which features to use for training and prediction
 features = [
@@ -40,8 +40,9 @@ features = [
     "mv_trend_7d", "market_divergence"
 ]
 
-# what column to learn and predict on
-target = "mv_target_clipped"
+# what columns to learn and predict on, the market value change over the next 1, 3 and 7 days (HORIZONS),
+# fitted together in one multi-output model
+target = ["mv_target_clipped", "mv_target_3d_clipped", "mv_target_7d_clipped"]
 
 # Set dot as thousands separator for better readability
 pd.options.display.float_format = lambda x: '{:,.0f}'.format(x).replace(',', '.')
@@ -59,52 +60,101 @@ league_name = "Hannover Kivis"  # Name of your league, must be exact match, can
 start_budget = 50_000_000               # Starting budget of your league, used to calculate current budgets of other managers
 league_start_date = "2025-08-08"        # Start date of your league, used to filter activities, format: YYYY-MM-DD
 email = os.getenv("EMAIL_USER")         # Email to send recommendations to, can be the same as EMAIL_USER or different
+all_leagues = False                     # one report for every league of your account in the same run, instead of only league_name
+league_settings = {}                    # start_budget and league_start_date of other leagues, e.g. {"Other League": {"start_budget": 40_000_000, "league_start_date": "2025-08-20"}}
 
 # ---------------------------------------------------
 
+# Apply the cache setting, can also be set via the KICKBASE_CACHE_BYPASS env variable
+client.cache.bypass = client.cache.bypass or bypass_cache
+
+# Time every stage and kickbase_api call of the run, see kickbase_api/tracing.py
+if trace_report:
+    tracer.start(http_stats=client.stats, profile=profile_run)
+
 # Load environment variables and login to kickbase
 USERNAME = os.getenv("KICK_USER") # DO NOT CHANGE THIS, YOU MUST SET THOSE IN GITHUB SECRETS OR A .env FILE
 PASSWORD = os.getenv("KICK_PASS") # DO NOT CHANGE THIS, YOU MUST SET THOSE IN GITHUB SECRETS OR A .env FILE
-token = login(USERNAME, PASSWORD)
-print("\nLogged in to Kickbase.")
-
-# Get league ID
-league_id = get_league_id(token, league_name)
-
-# Calculate (estimated) budgets of all managers in the league
-manager_budgets_df = calc_manager_budgets(token, league_id, league_start_date, start_budget)
-print("\n=== Manager Budgets ===")
-display(manager_budgets_df)
-
-# Data handling
-create_player_data_table()
-reload_data = check_if_data_reload_needed()
-save_player_data_to_db(token, competition_ids, last_mv_values, last_pfm_values, reload_data)
-player_df = load_player_data_from_db()
-print("\nData loaded from database.")
-
-# Preprocess the data and spit the data
-proc_player_df, today_df = preprocess_player_data(player_df)
-X_train, X_test, y_train, y_test = split_data(proc_player_df, features, target)
-print("\nData preprocessed.")
-
-# Train and evaluate the model
-model = train_model(X_train, y_train)
-signs_percent, rmse, mae, r2 = evaluate_model(model, X_test, y_test)
-print(f"\nModel evaluation:\nSigns correct: {signs_percent:.2f}%\nRMSE: {rmse:.2f}\nMAE: {mae:.2f}\nR2: {r2:.2f}")
-
-# Make live data predictions
-live_predictions_df = live_data_predictions(today_df, model, features)
-
-# Join with current available players on the market
-market_recommendations_df = join_current_market(token, league_id, live_predictions_df)
-print("\n=== Market Recommendations ===")
-display(market_recommendations_df)
-
-# Join with current players on the team
-squad_recommendations_df = join_current_squad(token, league_id, live_predictions_df)
-print("\n=== Squad Recommendations ===")
-display(squad_recommendations_df)
-
-# Send email with recommendations
-send_mail(manager_budgets_df, market_recommendations_df, squad_recommendations_df, email)
+with tracer.stage("session"):
+    token = login(USERNAME, PASSWORD)
+    print("\nLogged in to Kickbase.")
+
+    # Get the leagues to report on, league_name or all leagues of the account
+    league_infos = get_leagues_infos(token)
+    if all_leagues:
+        leagues = league_infos
+    else:
+        league = select_league(league_infos, league_name)
+        leagues = [league] if league is not None else []
+
+# The player data is fetched once for the competitions of all leagues, every competition gets its own model
+# The configured competitions come first, a league without a competition uses the first one
+ingested_competition_ids = list(dict.fromkeys(
+    competition_ids + sorted({int(league["competition_id"]) for league in leagues if league.get("competition_id")})
+))
+
+# ----------------- PIPELINE STAGES -----------------
+# Ingestion, preprocessing and training run once, budgets, market and squad once per league, see features/pipeline.py
+
+stages = build_stages(token, leagues, {
+    "features": features,
+    "target": target,
+    "competition_ids": ingested_competition_ids,
+    "last_mv_values": last_mv_values,
+    "last_pfm_values": last_pfm_values,
+    "incremental_ingestion": incremental_ingestion,
+    "use_async_ingestion": use_async_ingestion,
+    "max_in_flight": max_in_flight,
+    "incremental_training": incremental_training,
+    "model_engine": model_engine,
+    "start_budget": start_budget,
+    "league_start_date": league_start_date,
+    "league_settings": league_settings,
+    "email": email,
+})
+
+# ---------------------------------------------------
+
+# Independent stages (ingestion and the budgets, market and squad of every league) run concurrently
+results, timings = run_stage_graph(stages)
+path = critical_path(stages, timings)
+tracer.annotate(stage_graph=timings, critical_path=path)
+
+for league in leagues:
+    name = league["name"]
+
+    if f"budgets:{name}" in results:
+        print(f"\n=== Manager Budgets ({name}) ===")
+        display(results[f"budgets:{name}"])
+
+    if f"recommendations:{name}" in results:
+        market_recommendations_df, squad_recommendations_df = results[f"recommendations:{name}"]
+        print(f"\n=== Market Recommendations ({name}) ===")
+        display(market_recommendations_df)
+        print(f"\n=== Squad Recommendations ({name}) ===")
+        display(squad_recommendations_df)
+
+print("\n=== Stages ===")
+display(pd.DataFrame.from_dict(timings, orient="index")[["status", "start", "seconds", "error"]])
+print(f"Critical path: {' -> '.join(path)} ({timings[path[-1]]['end'] if path else 0:.1f} s)")
+
+# Show where the time of the API calls went
+stats_df = pd.DataFrame.from_dict(get_request_stats(), orient="index").sort_values("seconds", ascending=False)
+print("\n=== API Requests ===")
+display(stats_df)
+
+cache_df = pd.DataFrame.from_dict(get_cache_stats(), orient="index")
+print("\n=== API Cache ===")
+display(cache_df)
+
+# Show where the time of the run went and write the run report
+if trace_report:
+    report = tracer.write_report(trace_report)
+    print(f"\n=== Run Stages ({report['total_seconds']:.1f} s, report: {trace_report}) ===")
+    display(pd.DataFrame(report["stages"]).set_index("name"))
+
+# Fail the run (and the scheduled workflow) if a stage failed or was skipped, the results of the others are shown above
+unfinished = {name: timing["error"] for name, timing in timings.items() if timing["status"] in ("failed", "skipped")}
+if unfinished:
+    print(f"\nError: Stages failed or skipped: {unfinished}")
+    sys.exit(1)
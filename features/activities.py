@@ -0,0 +1,119 @@
+from kickbase_api.league import ACTIVITIES_PAGE_SIZE, get_league_activities_page
+from features.predictions.storage import connect
+import pandas as pd
+import hashlib
+import json
+
+# Local ledger of the league activity feed
+#   activities: one row per (league_id, account, activity_id) with the trade, login bonus and achievement fields
+# sync_league_activities pages through the feed (newest first) until it reaches an activity that is already
+# stored or one before since, so a daily run only fetches the events of the last day.
+# The feed is the one of the logged-in account, its login bonuses and achievements are its own, so every
+# account (username) of a league keeps its own rows, even if the daemon serves several accounts of one league.
+
+ACTIVITIES_DB_PATH = "league_activities.db"
+
+ACTIVITIES_SCHEMA_VERSION = 2   # bump when the table below changes, the ledger is synced again from the feed
+
+ACTIVITY_TYPES = {"trade": 15, "login": 22, "achievement": 26}
+
+ACTIVITIES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS activities (
+    league_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    activity_id TEXT NOT NULL,
+    t INTEGER,
+    dt TEXT,
+    byr TEXT,
+    slr TEXT,
+    pi TEXT,
+    trp REAL,
+    bn REAL,
+    achievement_id TEXT,
+    data TEXT,
+    PRIMARY KEY (league_id, account, activity_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_activities_dt ON activities (league_id, account, dt);
+"""
+
+ACTIVITY_FIELDS = ["league_id", "account", "activity_id", "t", "dt", "byr", "slr", "pi", "trp", "bn", "achievement_id", "data"]
+
+def create_activities_schema(conn):
+    """Create the ledger table, an older version of it is dropped"""
+
+    if conn.execute("PRAGMA user_version;").fetchone()[0] != ACTIVITIES_SCHEMA_VERSION:
+        conn.execute("DROP TABLE IF EXISTS activities;")
+    conn.executescript(ACTIVITIES_SCHEMA)
+    conn.execute(f"PRAGMA user_version = {ACTIVITIES_SCHEMA_VERSION};")
+
+def activity_id(entry):
+    """ID of a feed entry, a hash of its content if the feed has none"""
+
+    if entry.get("i") is not None:
+        return str(entry["i"])
+
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()[:16]
+
+def activity_row(league_id, account, entry):
+    """Ledger row of a feed entry of account"""
+
+    data = entry.get("data") or {}
+    achievement_id = data.get("t") if entry.get("t") == ACTIVITY_TYPES["achievement"] else None
+
+    return (
+        str(league_id), account, activity_id(entry), entry.get("t"), entry.get("dt", ""),
+        data.get("byr"), data.get("slr"), data.get("pi"), data.get("trp"), data.get("bn"),
+        None if achievement_id is None else str(achievement_id),
+        json.dumps(data),
+    )
+
+def sync_league_activities(token, league_id, account, since="", page_size=ACTIVITIES_PAGE_SIZE):
+    """Fetch the activities newer than the last synced one of account (the username of token) into the ledger,
+    returns the amount of new ones
+
+    Without synced activities of account the feed is paged back to since (ISO date).
+    """
+
+    conn = connect(ACTIVITIES_DB_PATH)
+    try:
+        create_activities_schema(conn)
+        known = {row[0] for row in conn.execute(
+            "SELECT activity_id FROM activities WHERE league_id = ? AND account = ?;", (str(league_id), account)
+        )}
+
+        rows = []
+        start = 0
+        while True:
+            page = get_league_activities_page(token, league_id, start, page_size)
+            new = [activity_row(league_id, account, entry) for entry in page]
+            new = [row for row in new if row[2] not in known]
+            rows.extend(new)
+
+            # Stop at the end of the feed, at stored activities or before since
+            if len(page) < page_size or len(new) < len(page) or page[-1].get("dt", "") < since:
+                break
+            start += len(page)
+
+        with conn:
+            conn.executemany(f"""
+                INSERT OR IGNORE INTO activities ({", ".join(ACTIVITY_FIELDS)})
+                VALUES ({", ".join("?" * len(ACTIVITY_FIELDS))});
+            """, rows)
+    finally:
+        conn.close()
+
+    return len(rows)
+
+def load_league_activities(league_id, account, since=""):
+    """Load the ledger rows of a league synced by account from since (ISO date) on"""
+
+    conn = connect(ACTIVITIES_DB_PATH)
+    try:
+        create_activities_schema(conn)
+        return pd.read_sql(
+            "SELECT * FROM activities WHERE league_id = ? AND account = ? AND dt >= ? ORDER BY dt;",
+            conn, params=(str(league_id), account, since),
+        )
+    finally:
+        conn.close()
@@ -1,58 +1,63 @@
 from kickbase_api.user import get_budget, get_username
 from kickbase_api.league import (
-    get_league_activities,
-    get_league_ranking
+    get_league_ranking_data,
+    parse_league_ranking,
 )
 from kickbase_api.manager import (
-    get_managers,
+    parse_managers,
     get_manager_performance,
     get_manager_info,
 )
 from kickbase_api.others import get_achievement_reward
+from kickbase_api.config import MAX_WORKERS
+from features.activities import ACTIVITY_TYPES, sync_league_activities, load_league_activities
+import concurrent.futures
 import pandas as pd
 
 def calc_manager_budgets(token, league_id, league_start_date, start_budget):
     """Calculate manager budgets based on activities, bonuses, and team performance."""
 
+    # The ledger is kept per account, the login bonuses and achievements of the feed are the own ones
     try:
-        activities, login_bonus, achievement_bonus = get_league_activities(token, league_id, league_start_date)
+        own_username = get_username(token)
+    except Exception as e:
+        raise RuntimeError(f"Failed to fetch own username: {e}")
+
+    # Only the activities since the last run are fetched, the older ones come from the ledger
+    try:
+        sync_league_activities(token, league_id, own_username, league_start_date)
     except Exception as e:
         raise RuntimeError(f"Failed to fetch activities: {e}")
 
-    activities_df = pd.DataFrame(activities)
+    activities_df = load_league_activities(league_id, own_username, league_start_date)
+    trades_df = activities_df[activities_df["t"] == ACTIVITY_TYPES["trade"]]
 
     # Bonuses
-    total_login_bonus = sum(entry.get("data", {}).get("bn", 0) for entry in login_bonus)
+    total_login_bonus = activities_df.loc[activities_df["t"] == ACTIVITY_TYPES["login"], "bn"].fillna(0).sum()
 
+    # Every achievement is fetched once, weighted by how often it shows up in the activities
     total_achievement_bonus = 0
-    for item in achievement_bonus:
+    achievement_counts = activities_df.loc[activities_df["t"] == ACTIVITY_TYPES["achievement"], "achievement_id"].value_counts()
+    for a_id, count in achievement_counts.items():
         try:
-            a_id = item.get("data", {}).get("t")
-            if a_id is None:
-                continue
             amount, reward = get_achievement_reward(token, league_id, a_id)
-            total_achievement_bonus += amount * reward
+            total_achievement_bonus += amount * reward * count
         except Exception as e:
-            print(f"Warning: Failed to process achievement bonus {item}: {e}")
+            print(f"Warning: Failed to process achievement bonus {a_id}: {e}")
 
-    # Manager performances
+    # The ranking holds the managers and their points, it is fetched once for both
     try:
-        managers = get_managers(token, league_id)
+        ranking_data = get_league_ranking_data(token, league_id)
+        managers = parse_managers(ranking_data)
     except Exception as e:
         raise RuntimeError(f"Failed to fetch managers: {e}")
 
-    performances = []
-    for manager in managers:
-        try:
-            manager_name, manager_id = manager
-            info = get_manager_info(token, league_id, manager_id)
-            team_value = info.get("tv", 0)
-
-            perf = get_manager_performance(token, league_id, manager_id, manager_name)
-            perf["Team Value"] = team_value
-            performances.append(perf)
-        except Exception as e:
-            print(f"Warning: Skipping manager {manager}: {e}")
+    # Manager performances, fetched concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        performances = [
+            perf for perf in executor.map(lambda manager: get_manager_data(token, league_id, manager), managers)
+            if perf is not None
+        ]
 
     perf_df = pd.DataFrame(performances)
     if not perf_df.empty:
@@ -62,24 +67,13 @@ def calc_manager_budgets(token, league_id, league_start_date, start_budget):
         perf_df["point_bonus"] = []
         perf_df["Team Value"] = []
 
-    # Initial budgets from activities
-    budgets = {user: start_budget for user in set(activities_df["byr"].dropna().unique())
-                                          .union(set(activities_df["slr"].dropna().unique()))}
+    # Initial budgets from the trades, the start budget minus the buys plus the sales of every user
+    spent = trades_df.groupby("byr")["trp"].sum()
+    earned = trades_df.groupby("slr")["trp"].sum()
+    users = spent.index.union(earned.index)
+    budgets = start_budget - spent.reindex(users, fill_value=0) + earned.reindex(users, fill_value=0)
 
-    for _, row in activities_df.iterrows():
-        byr, slr, trp = row.get("byr"), row.get("slr"), row.get("trp", 0)
-        try:
-            if pd.isna(byr) and pd.notna(slr):
-                budgets[slr] += trp
-            elif pd.isna(slr) and pd.notna(byr):
-                budgets[byr] -= trp
-            elif pd.notna(byr) and pd.notna(slr):
-                budgets[byr] -= trp
-                budgets[slr] += trp
-        except KeyError as e:
-            print(f"Warning: Skipping invalid activity row {row}: {e}")
-
-    budget_df = pd.DataFrame(list(budgets.items()), columns=["User", "Budget"])
+    budget_df = pd.DataFrame({"User": users, "Budget": budgets.to_numpy()})
 
     # Merge performance bonuses
     budget_df = budget_df.merge(
@@ -99,14 +93,13 @@ def calc_manager_budgets(token, league_id, league_start_date, start_budget):
     budget_df["Budget"] = budget_df["Budget"].astype(float)
 
     # add total achievement bonus based on anchor value and current ranking (estimation approach)
-    for user in budget_df["User"]:
-        achievement_bonus = calc_achievement_bonus_by_points(token, league_id, user, total_achievement_bonus)
-        budget_df.loc[budget_df["User"] == user, "Budget"] += achievement_bonus
+    ranking_df = pd.DataFrame(parse_league_ranking(ranking_data), columns=["Name", "Total Points"])
+    achievement_bonus = calc_achievement_bonus_by_points(ranking_df, own_username, total_achievement_bonus)
+    budget_df["Budget"] += budget_df["User"].map(achievement_bonus).fillna(0)
 
     # Sync with own actual budget
     try:
         own_budget = get_budget(token, league_id)
-        own_username = get_username(token)
         mask = budget_df["User"] == own_username
         if not budget_df.loc[mask, "Budget"].eq(own_budget).all():
             budget_df.loc[mask, "Budget"] = own_budget
@@ -124,78 +117,59 @@ def calc_manager_budgets(token, league_id, league_start_date, start_budget):
 
     return budget_df
 
-def calc_achievement_bonus_by_points(token, league_id, username, anchor_achievement_bonus):
-    """Estimate achievement bonus for a user based on their total points compared to anchor user."""
-
-    ranking = get_league_ranking(token, league_id)
-    ranking_df = pd.DataFrame(ranking, columns=["Name", "Total Points"])
+def get_manager_data(token, league_id, manager):
+    """Get the performance and team value of a manager, None if it can't be fetched."""
 
-    # Total number of users
-    num_users = len(ranking_df)
-    if num_users == 0:
-        return 0
+    try:
+        manager_name, manager_id = manager
+        info = get_manager_info(token, league_id, manager_id)
+        team_value = info.get("tv", 0)
 
-    # Get anchor user's name and points
-    anchor_user = get_username(token)
-    anchor_row = ranking_df[ranking_df["Name"] == anchor_user]
-    if anchor_row.empty:
-        return 0
-    anchor_points = anchor_row["Total Points"].values[0]
+        perf = get_manager_performance(token, league_id, manager_id, manager_name)
+        perf["Team Value"] = team_value
+        return perf
+    except Exception as e:
+        print(f"Warning: Skipping manager {manager}: {e}")
+        return None
 
-    # If the user is the anchor, return exactly the anchor achievement bonus
-    if username == anchor_user:
-        return anchor_achievement_bonus
+def calc_achievement_bonus_by_points(ranking_df, anchor_user, anchor_achievement_bonus):
+    """Estimate the achievement bonus of all users based on their total points compared to the anchor user."""
 
-    # Get target user's points
-    user_row = ranking_df[ranking_df["Name"] == username]
-    if user_row.empty:
-        return 0
-    user_points = user_row["Total Points"].values[0]
+    # Points per user, users missing in the ranking get no bonus
+    points = ranking_df.drop_duplicates("Name").set_index("Name")["Total Points"]
+    if points.empty or anchor_user not in points.index:
+        return pd.Series(0.0, index=points.index)
+    anchor_points = points[anchor_user]
 
     # Calculate bonus scaling based on points ratio
     if anchor_points == 0:
-        scale = 1.0
+        scale = pd.Series(1.0, index=points.index)
     else:
-        scale = user_points / anchor_points
+        scale = points / anchor_points
 
+    # The anchor user gets exactly the anchor achievement bonus
     estimated_bonus = anchor_achievement_bonus * scale
+    estimated_bonus[anchor_user] = anchor_achievement_bonus
+
     return estimated_bonus
 
-def calc_achievement_bonus_by_rank(token, league_id, username, anchor_achievement_bonus):
-    """Estimate achievement bonus for a user based on their ranking."""
+def calc_achievement_bonus_by_rank(ranking_df, anchor_user, anchor_achievement_bonus):
+    """Estimate the achievement bonus of all users based on their ranking."""
     """Currently not used, kept for reference."""
 
-    ranking = get_league_ranking(token, league_id)
-    ranking_df = pd.DataFrame(ranking, columns=["Name", "Total Points"])
-
-    # Total number of users
-    num_users = len(ranking_df)
-    if num_users == 0:
-        return 0
-
-    # Get anchor user's name and rank
-    anchor_user = get_username(token)
-    anchor_row = ranking_df[ranking_df["Name"] == anchor_user]
-    if anchor_row.empty:
-        return 0
-    anchor_rank = anchor_row.index[0] + 1
-
-    # If the user is the anchor, return exactly the anchor achievement bonus
-    if username == anchor_user:
-        return anchor_achievement_bonus
-
-    # Get target user's rank and points
-    user_row = ranking_df[ranking_df["Name"] == username]
-    if user_row.empty:
-        return 0
-    user_rank = user_row.index[0] + 1
+    # Rank per user, the ranking is sorted by points
+    ranks = pd.Series(range(1, len(ranking_df) + 1), index=ranking_df["Name"])
+    ranks = ranks[~ranks.index.duplicated()]
+    if ranks.empty or anchor_user not in ranks.index:
+        return pd.Series(0.0, index=ranks.index)
 
     # Calculate bonus scaling based on rank difference
     # If user is ranked lower (higher number): scale down
     # If user is ranked higher (lower number): scale up
-    rank_diff = anchor_rank - user_rank
-    scale = 1.0 + (rank_diff * 0.1)
+    scale = 1.0 + (ranks[anchor_user] - ranks) * 0.1
 
-    # Calculate estimated achievement bonus
+    # The anchor user gets exactly the anchor achievement bonus
     estimated_bonus = anchor_achievement_bonus * scale
-    return estimated_bonus
\ No newline at end of file
+    estimated_bonus[anchor_user] = anchor_achievement_bonus
+
+    return estimated_bonus
@@ -0,0 +1,376 @@
+from features.predictions.predictions import live_data_predictions, join_current_market, join_current_squad
+from features.predictions.preprocessing import preprocess_player_data, split_data, get_recent_train_data
+from features.predictions.modeling import UPDATE_WINDOW_DAYS
+from features.predictions.model_registry import competition_model_dir, get_model
+from features.predictions.data_handler import (
+    create_player_data_table,
+    check_if_data_reload_needed,
+    save_player_data_to_db_async,
+    update_player_features,
+    load_player_features_from_db,
+)
+from kickbase_api.league import get_leagues_infos, select_league, get_league_players_on_market
+from kickbase_api.user import login, get_players_in_squad
+from kickbase_api.config import RateLimit, client
+from kickbase_api.cache import next_market_value_update
+from kickbase_api.traffic import error_status
+from kickbase_api.tracing import tracer
+from features.notifier import send_league_mail
+from features.budgets import calc_manager_budgets
+from features.pipeline import league_competition, split_by_competition
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import concurrent.futures
+import pandas as pd
+import json
+import os
+import time
+
+# Long running advisor for many accounts (tenants)
+# The player data, features and one model per competition are shared by all tenants and refreshed once after
+# every market value update, with a session of its own. Only the work of an account (budgets, market, squad and
+# its email) runs per tenant, each tenant with its own token and rate limit. Due tenants are served least
+# recently served first with at most one job per tenant in flight, so a slow account can't starve the others.
+# Adding an account to the accounts file costs its login and leagues call, plus its league requests.
+
+RATE_LIMIT = 5          # requests per second of a tenant
+RATE_BURST = 10         # requests a tenant may send at once
+REFRESH_DELAY = timedelta(minutes=15)   # wait after the market value update before refreshing the shared data
+RETRY_DELAY = 300       # seconds before a failed login or tenant job is tried again
+
+# Settings of an account that are not in the accounts file
+ACCOUNT_DEFAULTS = {
+    "user_env": "KICK_USER",
+    "pass_env": "KICK_PASS",
+    "league_name": "",
+    "all_leagues": False,
+    "email": None,
+    "start_budget": 50_000_000,
+    "league_start_date": "2025-08-08",
+    "league_settings": {},
+    "rate_limit": RATE_LIMIT,
+    "rate_burst": RATE_BURST,
+}
+
+def load_accounts(path):
+    """Load the accounts file, a JSON list of accounts with a unique name, returns {name: account}
+
+    Credentials are not stored in the file, user_env and pass_env name the env variables holding them.
+    """
+
+    with open(path, encoding="utf-8") as f:
+        accounts = json.load(f)
+
+    return {account["name"]: {**ACCOUNT_DEFAULTS, **account} for account in accounts}
+
+class Session:
+    """Login token of an account, logs in again once when a call fails with an expired token (401)"""
+
+    def __init__(self, account, limit=None):
+        self.account = account
+        self.limit = limit
+        self.token = None
+
+    def login(self):
+        """Log in and register the rate limit of the new token"""
+
+        if self.token is not None:
+            client.token_limits.pop(self.token, None)
+
+        token = login(os.getenv(self.account["user_env"]), os.getenv(self.account["pass_env"]))
+        if not token:
+            raise RuntimeError(f"Login of {self.account['name']} failed")
+
+        self.token = token
+        if self.limit is not None:
+            client.token_limits[token] = self.limit
+
+    def logout(self):
+        """Forget the token and its rate limit"""
+
+        if self.token is not None:
+            client.token_limits.pop(self.token, None)
+        self.token = None
+
+    def call(self, func, *args, **kwargs):
+        """Call func with the token as first argument"""
+
+        if self.token is None:
+            self.login()
+
+        try:
+            return func(self.token, *args, **kwargs)
+        except Exception as e:
+            if error_status(e) != 401:
+                raise
+
+        print(f"Warning: Token of {self.account['name']} expired, logging in again.")
+        self.login()
+        return func(self.token, *args, **kwargs)
+
+class Tenant(Session):
+    """Account served by the daemon, its session, leagues and scheduling state"""
+
+    def __init__(self, account):
+        super().__init__(account, RateLimit(account["rate_limit"], account["rate_burst"]))
+        self.name = account["name"]
+        self.leagues = []
+        self.served_at = 0.0        # time.monotonic() of the last finished job
+        self.served_refresh = None  # refresh of the shared data the last report was built on
+        self.retry_at = 0.0         # time.monotonic() a failed job may run again
+
+    def login(self):
+        """Log in and get the leagues to report on, league_name or all leagues of the account"""
+
+        super().login()
+
+        league_infos = get_leagues_infos(self.token)
+        if self.account["all_leagues"]:
+            self.leagues = league_infos
+        else:
+            league = select_league(league_infos, self.account["league_name"])
+            self.leagues = [league] if league is not None else []
+
+    def league_settings(self, league_name):
+        """start_budget and league_start_date of a league"""
+
+        return {
+            "start_budget": self.account["start_budget"],
+            "league_start_date": self.account["league_start_date"],
+            **self.account["league_settings"].get(league_name, {}),
+        }
+
+class AdvisorDaemon:
+    """Serves the accounts of an accounts file until interrupted, see the top of this module"""
+
+    def __init__(self, accounts_path, pipeline, max_workers=4, tick_seconds=30):
+        self.accounts_path = accounts_path
+        self.pipeline = pipeline  # features, target, competition_ids and the ingestion and training settings
+        self.max_workers = max_workers
+        self.tick_seconds = tick_seconds
+
+        self.accounts = {}
+        self.accounts_mtime = None
+        self.tenants = {}
+        self.login_retry_at = {}
+        self.shared = None
+
+        self.predictions = {}   # competition_id -> live predictions of its players
+        self.refreshed_competitions = set()
+        self.refresh_count = 0
+        self.refresh_due = None
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.running = {}       # future -> (tenant name, refresh the job was started on)
+
+    def league_competition(self, league):
+        """Competition of a league, the first configured competition if the league has none"""
+
+        return league_competition(league, self.pipeline["competition_ids"][0])
+
+    def competition_ids(self):
+        """Configured competitions and the ones of all leagues of all tenants"""
+
+        return sorted(set(self.pipeline["competition_ids"]) | {
+            self.league_competition(league) for tenant in self.tenants.values() for league in tenant.leagues
+        })
+
+    def sync_accounts(self):
+        """Reload the accounts file if it changed and log in the accounts that are not logged in yet"""
+
+        try:
+            mtime = os.path.getmtime(self.accounts_path)
+            if mtime != self.accounts_mtime:
+                self.accounts = load_accounts(self.accounts_path)
+                self.accounts_mtime = mtime
+                print(f"\nAccounts loaded, {len(self.accounts)} accounts.")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Could not load the accounts file {self.accounts_path}: {e!r}")
+
+        # Drop removed or changed accounts once their job is done, a changed one is logged in again below
+        in_flight = {name for name, _ in self.running.values()}
+        for name, tenant in list(self.tenants.items()):
+            if self.accounts.get(name) != tenant.account and name not in in_flight:
+                tenant.logout()
+                del self.tenants[name]
+                print(f"\nAccount {name} removed.")
+
+        now = time.monotonic()
+        for name, account in self.accounts.items():
+            if name in self.tenants or self.login_retry_at.get(name, 0.0) > now:
+                continue
+
+            tenant = Tenant(account)
+            try:
+                tenant.login()
+            except Exception as e:
+                print(f"Warning: Login of {name} failed, retrying in {RETRY_DELAY} s: {e!r}")
+                self.login_retry_at[name] = now + RETRY_DELAY
+                continue
+
+            self.tenants[name] = tenant
+            self.login_retry_at.pop(name, None)
+            print(f"\nAccount {name} added, {len(tenant.leagues)} leagues.")
+
+        # The shared data is fetched with a session of its own, of the first account, without a rate limit
+        if self.shared is None or self.shared.account["name"] not in self.tenants:
+            self.shared = Session(next(iter(self.tenants.values())).account) if self.tenants else None
+
+    def refresh_needed(self):
+        """The shared data is refreshed after every market value update and for competitions without a model"""
+
+        if self.shared is None:
+            return False
+
+        if set(self.competition_ids()) - self.refreshed_competitions:
+            return True
+
+        return datetime.now(ZoneInfo("Europe/Berlin")) >= self.refresh_due
+
+    def refresh(self):
+        """Ingest the player data of all competitions, update the features and the model of every competition"""
+
+        pipeline = self.pipeline
+        competition_ids = self.competition_ids()
+
+        with tracer.stage("refresh"):
+            create_player_data_table()
+            reload_data = check_if_data_reload_needed() or bool(set(competition_ids) - self.refreshed_competitions)
+            self.shared.call(
+                save_player_data_to_db_async, competition_ids, pipeline["last_mv_values"], pipeline["last_pfm_values"],
+                reload_data, incremental=pipeline["incremental_ingestion"], max_in_flight=pipeline["max_in_flight"],
+            )
+            update_player_features()
+
+            proc_player_df, today_df = preprocess_player_data(load_player_features_from_db())
+            predictions = {
+                competition_id: self.competition_predictions(competition_id, proc_df, competition_today_df)
+                for competition_id, (proc_df, competition_today_df)
+                in split_by_competition(proc_player_df, today_df, competition_ids).items()
+            }
+
+        self.predictions = predictions
+        self.refreshed_competitions = set(competition_ids)
+        self.refresh_count += 1
+        self.refresh_due = next_market_value_update() + REFRESH_DELAY
+        print(f"\nShared data refreshed for competitions {sorted(predictions)}, next refresh at {self.refresh_due:%Y-%m-%d %H:%M}.")
+
+    def competition_predictions(self, competition_id, proc_df, today_df):
+        """Load or train the model of a competition and predict its players, every competition has its own models"""
+
+        pipeline = self.pipeline
+        features, target = pipeline["features"], pipeline["target"]
+
+        X_train, X_test, y_train, y_test = split_data(proc_df, features, target)
+        recent = get_recent_train_data(proc_df, features, target, UPDATE_WINDOW_DAYS) if pipeline["incremental_training"] else None
+        model, metrics, _, cached = get_model(
+            X_train, y_train, X_test, y_test, features, target, recent=recent, engine=pipeline["model_engine"],
+            model_dir=competition_model_dir(competition_id),
+        )
+        print(
+            f"\nModel of competition {competition_id} {'loaded from the registry' if cached else 'trained'}, "
+            f"signs correct: {metrics['signs_percent']:.2f}%"
+        )
+
+        return live_data_predictions(today_df, model, features)
+
+    def serve(self, tenant, predictions):
+        """Build and send the report of a tenant, one section per league"""
+
+        reports = {}
+        with tracer.stage(f"tenant:{tenant.name}"):
+            for league in tenant.leagues:
+                name, league_id = league["name"], league["id"]
+                prediction = predictions.get(self.league_competition(league))
+                if prediction is None:
+                    print(f"Warning: No predictions for {name} of {tenant.name}, left out of the email.")
+                    continue
+
+                settings = tenant.league_settings(name)
+                try:
+                    budgets_df = tenant.call(
+                        calc_manager_budgets, league_id, settings["league_start_date"], settings["start_budget"],
+                    )
+                except Exception as e:
+                    print(f"Warning: Budgets of {name} of {tenant.name} failed: {e!r}")
+                    budgets_df = pd.DataFrame()
+
+                market_df = join_current_market(
+                    tenant.token, league_id, prediction,
+                    players_on_market=tenant.call(get_league_players_on_market, league_id),
+                )
+                squad_df = join_current_squad(
+                    tenant.token, league_id, prediction, squad_players=tenant.call(get_players_in_squad, league_id),
+                )
+                reports[name if len(tenant.leagues) > 1 else None] = (budgets_df, market_df, squad_df)
+
+            if not reports:
+                raise RuntimeError(f"No league of {tenant.name} has recommendations")
+            send_league_mail(reports, tenant.account["email"])
+
+        return reports
+
+    def collect(self):
+        """Record the finished tenant jobs"""
+
+        now = time.monotonic()
+        for future in [future for future in self.running if future.done()]:
+            name, refresh = self.running.pop(future)
+            tenant = self.tenants.get(name)
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Warning: Report of {name} failed, retrying in {RETRY_DELAY} s: {e!r}")
+                if tenant is not None:
+                    tenant.retry_at = now + RETRY_DELAY
+                continue
+
+            if tenant is not None:
+                tenant.served_at, tenant.served_refresh = now, refresh
+                print(f"\nReport of {name} sent.")
+
+    def schedule(self):
+        """Start the jobs of due tenants, least recently served first, at most one per tenant and max_workers in total"""
+
+        now = time.monotonic()
+        in_flight = {name for name, _ in self.running.values()}
+        due = sorted(
+            (tenant for tenant in self.tenants.values()
+             if tenant.served_refresh != self.refresh_count and tenant.name not in in_flight and tenant.retry_at <= now),
+            key=lambda tenant: tenant.served_at,
+        )
+
+        for tenant in due[:max(0, self.max_workers - len(self.running))]:
+            future = self.executor.submit(self.serve, tenant, self.predictions)
+            self.running[future] = (tenant.name, self.refresh_count)
+
+    def tick(self):
+        """One round of the daemon, returns once the jobs it can start are started"""
+
+        self.collect()
+        self.sync_accounts()
+
+        if self.refresh_needed():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Warning: Refresh of the shared data failed, retrying in {RETRY_DELAY} s: {e!r}")
+                self.refreshed_competitions = set(self.competition_ids())
+                self.refresh_due = datetime.now(ZoneInfo("Europe/Berlin")) + timedelta(seconds=RETRY_DELAY)
+
+        if self.predictions:
+            self.schedule()
+
+    def run(self):
+        """Serve the accounts until interrupted"""
+
+        print(f"\nAdvisor daemon started, accounts: {self.accounts_path}")
+        try:
+            while True:
+                self.tick()
+                time.sleep(self.tick_seconds)
+        except KeyboardInterrupt:
+            print("\nStopping, waiting for the running reports...")
+        finally:
+            self.executor.shutdown(wait=True)
+            self.collect()
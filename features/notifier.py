@@ -2,11 +2,17 @@ from datetime import datetime, timedelta
 from email.message import EmailMessage
 from zoneinfo import ZoneInfo
 import smtplib
+import html
 import os
 
 def send_mail(budget_df, market_df, squad_df, email):
     """Sends an email with the provided DataFrames as HTML tables."""
 
+    send_league_mail({None: (budget_df, market_df, squad_df)}, email)
+
+def send_league_mail(reports, email):
+    """Sends one email with a section per league, reports maps the league names to (budget_df, market_df, squad_df)."""
+
     if not email:
         print("\nNo email provided, skipping email sending.")
         return
@@ -14,6 +20,65 @@ def send_mail(budget_df, market_df, squad_df, email):
     EMAIL_ADDRESS = os.getenv("EMAIL_USER")
     EMAIL_PASSWORD = os.getenv("EMAIL_PASS")
 
+    msg = build_league_mail(reports, email)
+
+    # Send email via Gmail SMTP
+    with smtplib.SMTP("smtp.gmail.com", 587) as smtp:
+        smtp.starttls()
+        smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+        smtp.send_message(msg)
+
+    print("\nEmail sent successfully!")
+
+def build_mail(budget_df, market_df, squad_df, email):
+    """Builds the email with the provided DataFrames as HTML tables, without sending it."""
+
+    return build_league_mail({None: (budget_df, market_df, squad_df)}, email)
+
+# Styling function for DataFrames
+def style_df(df):
+    return df.to_html(index=False, border=0, classes="dataframe", escape=False).replace(
+        "<table",
+        '<table style="width:100%;border-collapse:collapse;font-size:13px;margin:20px 0;"'
+    ).replace(
+        "<th>",
+        '<th style="background:#2c3e50;color:white;padding:8px;text-align:left;border-bottom:1px solid #ddd;">'
+    ).replace(
+        "<td>",
+        '<td style="padding:8px;border-bottom:1px solid #eee;">'
+    ).replace(
+        '<tr style="text-align: right;">',
+        '<tr style="background-color:#fefefe;">'
+    )
+
+def build_league_section(budget_df, market_df, squad_df, league_name=None):
+    """Builds the HTML tables of one league, with the league name as heading if given."""
+
+    heading = "" if league_name is None else f"""
+        <h2 style="color: #2c3e50; margin-top: 40px; border-bottom: 2px solid #2c3e50;">{html.escape(league_name)}</h2>
+"""
+
+    return f"""{heading}
+        <h3 style="color: #2c3e50; margin-top: 30px;">Manager Budgets</h3>
+        <p style="font-size: 14px; color: #333;">Here are the current budgets of all managers in your league:</p>
+        {style_df(budget_df)}
+
+        <h3 style="color: #2c3e50; margin-top: 30px;">Current Market Predictions</h3>
+        <p style="font-size: 14px; color: #333;">The following table shows all available players with a substantial positive predicted market value change for the next day, with the predicted changes over the next 3 and 7 days:</p>
+
+        {style_df(market_df)}
+
+        <h3 style="color: #2c3e50; margin-top: 30px;">Your Squad Predictions</h3>
+        <p style="font-size: 14px; color: #333;">Here are the predicted market value changes over the next 1, 3 and 7 days for all players currently in your squad:</p>
+
+        {style_df(squad_df)}
+"""
+
+def build_league_mail(reports, email):
+    """Builds the email with a section per league, reports maps the league names to (budget_df, market_df, squad_df)."""
+
+    EMAIL_ADDRESS = os.getenv("EMAIL_USER")
+
     # If it's 22:00 or later, show tomorrow's date; else today
     now = datetime.now(ZoneInfo("Europe/Berlin"))
     date_to_show = now + timedelta(days=1) if now.hour >= 22 else now
@@ -25,21 +90,10 @@ def send_mail(budget_df, market_df, squad_df, email):
     msg["From"] = EMAIL_ADDRESS
     msg["To"] = email
 
-    # Styling function for DataFrames
-    def style_df(df):
-        return df.to_html(index=False, border=0, classes="dataframe", escape=False).replace(
-            "<table",
-            '<table style="width:100%;border-collapse:collapse;font-size:13px;margin:20px 0;"'
-        ).replace(
-            "<th>",
-            '<th style="background:#2c3e50;color:white;padding:8px;text-align:left;border-bottom:1px solid #ddd;">'
-        ).replace(
-            "<td>",
-            '<td style="padding:8px;border-bottom:1px solid #eee;">'
-        ).replace(
-            '<tr style="text-align: right;">',
-            '<tr style="background-color:#fefefe;">'
-        )
+    sections = "".join(
+        build_league_section(budget_df, market_df, squad_df, league_name)
+        for league_name, (budget_df, market_df, squad_df) in reports.items()
+    )
 
     # Set email content
     msg.set_content("Sorry, results only via html visible.", subtype="plain")
@@ -51,21 +105,7 @@ def send_mail(budget_df, market_df, squad_df, email):
         <h2 style="color: #2c3e50; text-align: center; margin-top: 0;">Kickbase Report for {today}</h2>
         
         <p style="font-size: 14px; color: #333;">Greetings!</p>
-
-        <h3 style="color: #2c3e50; margin-top: 30px;">Manager Budgets</h3>
-        <p style="font-size: 14px; color: #333;">Here are the current budgets of all managers in your league:</p>
-        {style_df(budget_df)}
-
-        <h3 style="color: #2c3e50; margin-top: 30px;">Current Market Predictions</h3>
-        <p style="font-size: 14px; color: #333;">The following table shows all available players with a substantial positive predicted market value for the next day:</p>
-
-        {style_df(market_df)}
-
-        <h3 style="color: #2c3e50; margin-top: 30px;">Your Squad Predictions</h3>
-        <p style="font-size: 14px; color: #333;">Here are the predicted market values for all players currently in your squad:</p>
-
-        {style_df(squad_df)}
-
+{sections}
         <p style="margin-top: 20px; font-size: 14px;">Best regards, <br><b>Your KickAdvisor Bot</b></p>
         
         <hr style="border:none;border-top:1px solid #eee;margin:20px 0;">
@@ -81,10 +121,4 @@ def send_mail(budget_df, market_df, squad_df, email):
     </html>
     """, subtype="html")
 
-    # Send email via Gmail SMTP
-    with smtplib.SMTP("smtp.gmail.com", 587) as smtp:
-        smtp.starttls()
-        smtp.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-        smtp.send_message(msg)
-        
-    print("\nEmail sent successfully!")
\ No newline at end of file
+    return msg
@@ -0,0 +1,185 @@
+from features.predictions.predictions import live_data_predictions, join_current_market, join_current_squad
+from features.predictions.preprocessing import preprocess_player_data, split_data, get_recent_train_data
+from features.predictions.modeling import UPDATE_WINDOW_DAYS
+from features.predictions.model_registry import competition_model_dir, get_model
+from features.predictions.storage import load_player_competitions
+from features.predictions.data_handler import (
+    create_player_data_table,
+    check_if_data_reload_needed,
+    save_player_data_to_db,
+    save_player_data_to_db_async,
+    update_player_features,
+    load_player_features_from_db,
+)
+from kickbase_api.league import get_league_players_on_market
+from kickbase_api.user import get_players_in_squad
+from features.notifier import send_league_mail
+from features.budgets import calc_manager_budgets
+import pandas as pd
+
+# Stage graph of a daily run, run with stage_graph.run_stage_graph by daily_predictions.py and bench_pipeline.py
+# Every stage gets the results of the stages it needs (after) as arguments, see features/stage_graph.py
+# Ingestion runs once, preprocessing, training and prediction once per competition (every competition has its
+# own model) and budgets, market and squad once per league, joined with the predictions of its competition
+# settings holds the parameters of daily_predictions.py: features, target, competition_ids (of all leagues),
+# last_mv_values, last_pfm_values, incremental_ingestion, use_async_ingestion, max_in_flight,
+# incremental_training, model_engine, start_budget, league_start_date, league_settings and email.
+
+def league_competition(league, default_competition_id):
+    """Competition of a league, default_competition_id if the league has none"""
+
+    return int(league.get("competition_id") or default_competition_id)
+
+def split_by_competition(proc_player_df, today_df, competition_ids):
+    """Rows of the players of every competition, returns {competition_id: (proc_df, today_df)}
+
+    A competition without stored rows is left out with a warning.
+    """
+
+    player_competitions = load_player_competitions()
+    proc_competitions = proc_player_df["player_id"].astype(str).map(player_competitions)
+    today_competitions = today_df["player_id"].astype(str).map(player_competitions)
+
+    frames = {}
+    for competition_id in competition_ids:
+        proc_df = proc_player_df[proc_competitions == competition_id]
+        competition_today_df = today_df[today_competitions == competition_id]
+        if proc_df.empty or competition_today_df.empty:
+            print(f"Warning: No player data of competition {competition_id}.")
+            continue
+        frames[competition_id] = (proc_df, competition_today_df)
+
+    return frames
+
+def build_stages(token, leagues, settings, send_mail=send_league_mail):
+    """Stages of a daily run for the leagues, send_mail(reports, email) is called by the mail stage"""
+
+    features, target = settings["features"], settings["target"]
+
+    def ingestion_stage():
+        create_player_data_table()
+        reload_data = settings.get("force_reload", False) or check_if_data_reload_needed()
+        if settings["use_async_ingestion"]:
+            save_player_data_to_db_async(
+                token, settings["competition_ids"], settings["last_mv_values"], settings["last_pfm_values"], reload_data,
+                incremental=settings["incremental_ingestion"], max_in_flight=settings["max_in_flight"],
+            )
+        else:
+            save_player_data_to_db(
+                token, settings["competition_ids"], settings["last_mv_values"], settings["last_pfm_values"], reload_data,
+                incremental=settings["incremental_ingestion"],
+            )
+
+    def player_features_stage(ingestion):
+        update_player_features()
+        player_df = load_player_features_from_db()
+        print("\nData loaded from database.")
+        return player_df
+
+    def preprocessing_stage(player_features):
+        # Preprocess the data (features are precomputed in the feature store) and split the data of every competition
+        proc_player_df, today_df = preprocess_player_data(player_features)
+        data = {}
+        for competition_id, (proc_df, competition_today_df) in split_by_competition(
+            proc_player_df, today_df, settings["competition_ids"],
+        ).items():
+            X_train, X_test, y_train, y_test = split_data(proc_df, features, target)
+            recent = get_recent_train_data(proc_df, features, target, UPDATE_WINDOW_DAYS) if settings["incremental_training"] else None
+            data[competition_id] = (X_train, X_test, y_train, y_test, recent, competition_today_df)
+        print("\nData preprocessed.")
+        return data
+
+    def training_stage(preprocessing):
+        # Train and evaluate the model of every competition, or load it from the model registry if nothing changed
+        # since it was trained
+        model_engine = settings["model_engine"]
+        models = {}
+        for competition_id, (X_train, X_test, y_train, y_test, recent, _) in preprocessing.items():
+            model, metrics, costs, cached = get_model(
+                X_train, y_train, X_test, y_test, features, target, recent=recent, engine=model_engine,
+                model_dir=competition_model_dir(competition_id),
+            )
+            signs_percent, rmse, mae, r2 = metrics["signs_percent"], metrics["rmse"], metrics["mae"], metrics["r2"]
+            print(f"\nModel of competition {competition_id} loaded from the registry, training data unchanged." if cached
+                  else f"\nModel of competition {competition_id} trained and stored in the registry.")
+            print(f"\nModel evaluation ({model_engine}, next day):\nSigns correct: {signs_percent:.2f}%\nRMSE: {rmse:.2f}\nMAE: {mae:.2f}\nR2: {r2:.2f}")
+            print(
+                f"Fit: {costs.get('fit_s', 0):.1f} s, predict: {costs.get('predict_ms', 0):.1f} ms, "
+                f"size: {costs.get('size_mb', 0):.1f} MB, peak memory: {costs.get('fit_peak_mb') or 0:.0f} MB"
+            )
+            models[competition_id] = model
+        return models
+
+    def prediction_stage(preprocessing, training):
+        # Make live data predictions of every competition with its own model
+        return {
+            competition_id: live_data_predictions(preprocessing[competition_id][-1], model, features)
+            for competition_id, model in training.items()
+        }
+
+    def league_stages(league):
+        # Budgets, market, squad and the joined recommendations of one league, named <stage>:<league name>
+        name, league_id = league["name"], league["id"]
+        competition_id = league_competition(league, settings["competition_ids"][0])
+        league_settings = {
+            "start_budget": settings["start_budget"],
+            "league_start_date": settings["league_start_date"],
+            **settings["league_settings"].get(name, {}),
+        }
+
+        def recommendations(**results):
+            # Join the predictions of its competition with the current market and squad of the league
+            prediction = results["prediction"].get(competition_id)
+            if prediction is None:
+                raise RuntimeError(f"No predictions of competition {competition_id}")
+            return (
+                join_current_market(token, league_id, prediction, players_on_market=results[f"market:{name}"]),
+                join_current_squad(token, league_id, prediction, squad_players=results[f"squad:{name}"]),
+            )
+
+        return {
+            # Calculate (estimated) budgets of all managers in the league
+            f"budgets:{name}": {"func": lambda: calc_manager_budgets(
+                token, league_id, league_settings["league_start_date"], league_settings["start_budget"],
+            )},
+            f"market:{name}": {"func": lambda: get_league_players_on_market(token, league_id)},
+            f"squad:{name}": {"func": lambda: get_players_in_squad(token, league_id)},
+            f"recommendations:{name}": {
+                "func": recommendations, "after": ["prediction", f"market:{name}", f"squad:{name}"],
+            },
+        }
+
+    def mail_stage(**results):
+        # Send one email with a section per league, a league without recommendations is left out, without budgets
+        # its budgets table is empty
+        reports = {}
+        for league in leagues:
+            name = league["name"]
+            if results.get(f"recommendations:{name}") is None:
+                print(f"Warning: No recommendations for {name}, left out of the email.")
+                continue
+            budgets_df = results.get(f"budgets:{name}")
+            reports[name if len(leagues) > 1 else None] = (
+                budgets_df if budgets_df is not None else pd.DataFrame(), *results[f"recommendations:{name}"],
+            )
+
+        if not reports:
+            raise RuntimeError("No league has recommendations")
+        send_mail(reports, settings["email"])
+
+    stages = {
+        "ingestion": {"func": ingestion_stage},
+        "player_features": {"func": player_features_stage, "after": ["ingestion"]},
+        "preprocessing": {"func": preprocessing_stage, "after": ["player_features"]},
+        "training": {"func": training_stage, "after": ["preprocessing"]},
+        "prediction": {"func": prediction_stage, "after": ["preprocessing", "training"]},
+    }
+    for league in leagues:
+        stages.update(league_stages(league))
+
+    league_results = [
+        stage for league in leagues for stage in (f"budgets:{league['name']}", f"recommendations:{league['name']}")
+    ]
+    stages["mail"] = {"func": mail_stage, "after": league_results, "optional": league_results}
+
+    return stages
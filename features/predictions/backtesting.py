@@ -0,0 +1,138 @@
+from features.predictions.modeling import DEFAULT_ENGINE, evaluate_model, train_model
+from features.predictions.predictions import MIN_PREDICTED_GAIN, select_bids
+from features.predictions.model_registry import METRIC_NAMES
+from itertools import repeat
+import concurrent.futures
+import pandas as pd
+import numpy as np
+import tempfile
+import os
+
+# Walk-forward backtesting of the prediction pipeline
+# For every fold date D a model is trained on the rows before D (their next day market values are known on D),
+# predicts the rows of D and is compared with the realized market value changes of D+1.
+# The folds run in a process pool. The preprocessed frame is sorted by date and written once as .npy files,
+# the workers memory-map them read-only, so the training rows of a fold are a slice of the shared arrays
+# instead of a copy of the frame per worker.
+
+# Memory-mapped arrays of a worker process, set by load_shared_arrays
+shared = {}
+
+def get_fold_dates(df, n_folds=10, step_days=7, min_train_days=60):
+    """Fold dates of the walk-forward backtest, every step_days days back from the last date of df
+
+    Dates with less than min_train_days of history before them are skipped.
+    """
+
+    dates = np.unique(df["date"].to_numpy().astype("datetime64[D]"))
+    if len(dates) == 0:
+        return []
+
+    candidates = dates[-1] - np.arange(n_folds)[::-1] * np.timedelta64(step_days, "D")
+    candidates = candidates[candidates >= dates[0] + np.timedelta64(min_train_days, "D")]
+
+    return list(candidates[np.isin(candidates, dates)])
+
+def save_arrays(arrays, directory):
+    """Write a dict of arrays as .npy files, one per name"""
+
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), values)
+
+def write_shared_arrays(df, features, target, directory):
+    """Write the features, the target, the realized market value change and the date of df sorted by date"""
+
+    df = df.sort_values("date", kind="stable")
+
+    save_arrays({
+        "X": df[features].to_numpy(dtype=float),
+        "y": df[target].to_numpy(dtype=float),
+        "realized": df["mv_target"].to_numpy(dtype=float),
+        "date": df["date"].to_numpy().astype("datetime64[D]").astype(np.int64),
+    }, directory)
+
+def load_shared_arrays(directory):
+    """Memory-map all .npy files of directory read-only, initializer of the worker processes"""
+
+    for name in os.listdir(directory):
+        if name.endswith(".npy"):
+            shared[name[:-len(".npy")]] = np.load(os.path.join(directory, name), mmap_mode="r")
+
+def run_fold(fold_date, params, engine, market_size, min_gain, seed):
+    """Train on the rows before fold_date, predict the rows of fold_date and trade on the recommendations"""
+
+    X, y, realized = shared["X"], shared["y"], shared["realized"]
+    train_end, test_end = np.searchsorted(shared["date"], [fold_date, fold_date + 1])
+
+    # One job per model, the folds are already spread over the processes
+    model = train_model(X[:train_end], y[:train_end], params, engine, n_jobs=1)
+
+    X_test, y_test = X[train_end:test_end], y[train_end:test_end]
+    predicted = model.predict(X_test)
+    metrics = dict(zip(METRIC_NAMES, map(float, evaluate_model(model, X_test, y_test, predicted))))
+
+    # The market offers market_size random players of the day (all with None), bids follow join_current_market
+    market_df = pd.DataFrame({"predicted_mv_1d": predicted, "realized": realized[train_end:test_end]})
+    if market_size is not None and market_size < len(market_df):
+        rng = np.random.default_rng([seed, fold_date])
+        market_df = market_df.iloc[rng.choice(len(market_df), market_size, replace=False)]
+    bids_df = select_bids(market_df, min_gain)
+
+    return {
+        "date": np.datetime64(int(fold_date), "D"),
+        "n_train": int(train_end),
+        "n_test": int(test_end - train_end),
+        **metrics,
+        "n_market": len(market_df),
+        "n_bids": len(bids_df),
+        "pnl": float(bids_df["realized"].sum()),
+        "hit_rate": float((bids_df["realized"] > 0).mean() * 100) if len(bids_df) else np.nan,
+        "market_mean": float(market_df["realized"].mean()) if len(market_df) else np.nan,
+    }
+
+def backtest(df, features, target, params=None, engine=DEFAULT_ENGINE, n_folds=10, step_days=7, min_train_days=60,
+             market_size=None, min_gain=MIN_PREDICTED_GAIN, max_workers=None, seed=0):
+    """Walk-forward backtest over the preprocessed frame, one row per fold with the metrics and the P&L
+
+    pnl is the summed next day market value change of the players join_current_market would recommend,
+    market_mean the mean change of all players on the market as a baseline. A multi-horizon target is
+    backtested on its first (next day) target, the one the recommendations are based on.
+    """
+
+    target = target if isinstance(target, str) else target[0]
+    df = df.dropna(subset=[target, "mv_target"])
+
+    fold_dates = [int(date.astype(np.int64)) for date in get_fold_dates(df, n_folds, step_days, min_train_days)]
+    if not fold_dates:
+        print("Warning: Not enough history for a backtest.")
+        return pd.DataFrame()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_shared_arrays(df, features, target, tmp_dir)
+
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(max_workers or os.cpu_count() or 1, len(fold_dates)),
+            initializer=load_shared_arrays,
+            initargs=(tmp_dir,),
+        ) as executor:
+            results = list(executor.map(
+                run_fold, fold_dates, repeat(params), repeat(engine), repeat(market_size), repeat(min_gain), repeat(seed)
+            ))
+
+    return pd.DataFrame(results)
+
+def summarize_backtest(results):
+    """Summary over all folds: mean metrics and the P&L of following the recommendations"""
+
+    n_bids = results["n_bids"].sum()
+    hits = (results["hit_rate"].fillna(0) * results["n_bids"]).sum() / 100
+
+    return {
+        "folds": len(results),
+        **{name: float(results[name].mean()) for name in METRIC_NAMES},
+        "bids": int(n_bids),
+        "pnl": float(results["pnl"].sum()),
+        "pnl_per_bid": float(results["pnl"].sum() / n_bids) if n_bids else np.nan,
+        "hit_rate": float(hits / n_bids * 100) if n_bids else np.nan,
+        "market_mean": float(results["market_mean"].mean()),
+    }
@@ -1,189 +1,236 @@
 from kickbase_api.player import (
-    get_all_players,
+    MV_TIMEFRAMES,
+    get_market_value_timeframe,
+    get_competition_roster,
     get_player_info,
     get_player_market_value,
     get_player_performance,
 )
+from kickbase_api.async_api import (
+    MAX_IN_FLIGHT,
+    AsyncKickbaseClient,
+    get_competition_roster_async,
+    get_player_info_async,
+    get_player_market_value_async,
+    get_player_performance_async,
+)
+from kickbase_api.config import MAX_WORKERS
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
+from features.predictions import feature_store, storage
 import concurrent.futures
+import asyncio
 import pandas as pd
-import sqlite3
+
+# Player fields the ingestion can't do without, get_player_info is called if the roster lacks one
+REQUIRED_PLAYER_FIELDS = ("team_id", "team_name", "last_name", "position")
 
 def create_player_data_table():
-    """Create the player_data_1d table in the SQLite database if it doesn't exist"""
-
-    conn = sqlite3.connect("player_data_total.db")
-    cursor = conn.cursor()
-
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS player_data_1d (
-        player_id INTEGER,
-        team_id INTEGER,
-        team_name TEXT,
-        first_name TEXT,
-        last_name TEXT,
-        position TEXT,
-        md DATE,
-        date DATE,
-        p REAL,
-        mp INTEGER,
-        ppm REAL,
-        t1 INTEGER,
-        t2 INTEGER,
-        t1g INTEGER,
-        t2g INTEGER,
-        won INTEGER,
-        k TEXT,
-        mv REAL
-    );
-    """)
-
-    conn.commit()
+    """Create the player data tables and the player_data_1d view in the SQLite database if they don't exist"""
 
-def check_if_data_reload_needed():
-    """Check if data reload is needed based on the last entry with null market value"""
+    conn = storage.connect()
+    try:
+        storage.create_schema(conn)
+    finally:
+        conn.close()
 
-    print("\nData reload needed, this takes a few minutes...")
-    return True # Due to some issues with the data, we always reload for now, until fixed
+def check_if_data_reload_needed():
+    """Check if data reload is needed based on the last complete market value date in the database"""
 
     now = datetime.now(ZoneInfo("Europe/Berlin"))
     today_date = now.date()
 
-    # Get nearest entry to today where mv is null
-    with sqlite3.connect("player_data_total.db") as conn:
-        cursor = conn.cursor()
-
-        # Get the most recent date where mv is NULL
-        cursor.execute("SELECT date FROM player_data_1d WHERE mv IS NULL ORDER BY date ASC LIMIT 1;")
-        last_null_entry = cursor.fetchone()
-
-        # convert last_null_entry (timestamp) to date
-        if last_null_entry is not None:
-            last_null_entry = datetime.fromisoformat(last_null_entry[0]).date()
-
-        # Get the most recent date where mv is NOT NULL and at least 100 rows have this date
-        # Hardcoded 100, bc if a player transfers on day x, he immediately has a mv value on day x and we dont want that
-        cursor.execute("""
-            SELECT date
-            FROM player_data_1d
-            WHERE mv IS NOT NULL
-            GROUP BY date
-            HAVING COUNT(*) >= 100
-            ORDER BY date DESC
-            LIMIT 1;
-        """)
-        last_non_null_entry = cursor.fetchone()
-
-        # convert last_non_null_entry (timestamp) to date
-        if last_non_null_entry is not None:
-            last_non_null_entry = datetime.fromisoformat(last_non_null_entry[0]).date()
-
-        # If there are no entries with null mv or no entries with non-null mv, we need to reload
-        if last_null_entry is None or last_non_null_entry is None:
-            return True
-
-        # Cutoff-Time: 22:15 Uhr
-        cutoff = now.replace(hour=22, minute=15, second=0, microsecond=0)
-
-        # If it is before 22:15 then yesterday should exist in the database with a mv value or today should exist with a null mv value
-        if now < cutoff and (last_non_null_entry == today_date - timedelta(days=1) or last_null_entry == today_date):
-            return False
-
-        # If it is after 22:15 today should exist in the database with a mv value
-        elif now >= cutoff and last_non_null_entry == today_date:
-            return False
-        
-        # Any other case we need to reload
-        else:
-            print("\nData reload needed, this takes a few minutes...")
-            return True
-
-
-def save_player_data_to_db(token, competition_ids, last_mv_values, last_pfm_values, reload_data):
-    """Fetch player data and save to SQLite database if reload_data is needed"""
+    # Get the most recent date where at least 100 players have a market value
+    # Hardcoded 100, bc if a player transfers on day x, he immediately has a mv value on day x and we dont want that
+    last_non_null_entry = storage.load_last_complete_market_value_date(min_players=100)
+
+    # If there are no entries with a market value, we need to reload
+    if last_non_null_entry is None:
+        print("\nData reload needed, no market values stored yet...")
+        return True
+
+    last_non_null_entry = datetime.fromisoformat(last_non_null_entry).date()
+
+    # Market values are updated around 22:15, before that yesterday is the latest available date
+    cutoff = now.replace(hour=22, minute=15, second=0, microsecond=0)
+    latest_available = today_date if now >= cutoff else today_date - timedelta(days=1)
+
+    if last_non_null_entry >= latest_available:
+        return False
+
+    print("\nData reload needed, fetching new market values...")
+    return True
+
+def check_if_full_rebuild_needed(last_mv_values):
+    """Check if the stored data can be updated incrementally or has to be rebuilt from scratch"""
+
+    # Schema changes, the database was created with another schema version
+    conn = storage.connect()
+    try:
+        schema_is_current = storage.schema_is_current(conn)
+    finally:
+        conn.close()
+
+    if not schema_is_current:
+        print("\nSchema of the player database changed, rebuilding all player data...")
+        return True
+
+    # Gaps, a player is missing market values between his first and last stored date
+    # or the stored data is too old to be covered by the largest market value window
+    players_with_gaps, min_days_behind, n_players = storage.load_market_value_gaps()
+
+    if not n_players:
+        print("\nNo player data stored yet, loading all player data...")
+        return True
+
+    if players_with_gaps or min_days_behind > min(last_mv_values, MV_TIMEFRAMES[-1]):
+        print("\nGaps in the stored player data, rebuilding all player data...")
+        return True
+
+    return False
+
+def get_market_value_window(last_dates, player_id, last_mv_values):
+    """Get the market value timeframe to fetch and the first date to keep for a player
+
+    Without stored data (full rebuild or new player) the whole history of last_mv_values days is loaded,
+    otherwise the smallest timeframe covering the days since the last stored date.
+    """
+
+    last_date = last_dates.get(player_id) if last_dates is not None else None
+    if last_date is None:
+        return MV_TIMEFRAMES[-1], None
+
+    days_missing = (pd.Timestamp(datetime.now(ZoneInfo("Europe/Berlin")).date()) - last_date).days + 1
+    timeframe = get_market_value_timeframe(days_missing) or MV_TIMEFRAMES[-1]
+
+    # Keep the last stored date as overlap, so changes of that day are picked up as well
+    return timeframe, last_date
+
+def filter_market_values(market_values, since):
+    """Keep the market values from since on, all if since is None"""
+
+    if since is None:
+        return market_values
+
+    since = since.date().isoformat()
+    return [value for value in market_values if value["date"] >= since]
+
+def has_missing_player_info(player_info):
+    """Check if a roster record lacks fields needed downstream (the first name is optional)"""
+
+    return any(player_info.get(field) is None for field in REQUIRED_PLAYER_FIELDS)
+
+def fill_missing_player_info(player_info, fetched_info):
+    """Fill the missing fields of a roster record with the ones from get_player_info"""
+
+    return {field: fetched_info.get(field) if value is None else value for field, value in player_info.items()}
+
+def save_player_data_to_db(token, competition_ids, last_mv_values, last_pfm_values, reload_data, incremental=True):
+    """Fetch player data and save to SQLite database if reload_data is needed
+
+    In incremental mode only the market values since the last stored date are fetched and upserted,
+    the whole database is only rebuilt on schema changes or gaps in the stored data.
+    """
 
     if reload_data:
-        all_competitions_dfs = []
+        full_rebuild = not incremental or check_if_full_rebuild_needed(last_mv_values)
+        last_dates = None if full_rebuild else storage.load_last_market_value_dates()
+        player_records = []
 
         for competition_id in competition_ids:
-            players = get_all_players(token, competition_id)
-
-            def process_player(player_id):
-                player_info = get_player_info(token, competition_id, player_id)
-                player_team_id = player_info["team_id"]
-                player_df = pd.DataFrame([player_info])
-
-                # Market Value
-                mv_df = pd.DataFrame(get_player_market_value(token, competition_id, player_id, last_mv_values))
-                if not mv_df.empty:
-                    mv_df["date"] = pd.to_datetime(mv_df["date"])
-                    mv_df = mv_df.sort_values("date")
-
-                # Special case for players with 500k market value and no change, manually add them
-                #if (mv_df["date"].max() < pd.Timestamp(datetime.now(ZoneInfo("Europe/Berlin")).date())) and mv_df["mv"].iloc[-1] == 500_000:
-                #    print("Testing special case")
-                #    last_row = mv_df.iloc[-1].copy()
-                #    last_row["date"] = pd.Timestamp(datetime.now(ZoneInfo("Europe/Berlin")).date())
-                #    mv_df = pd.concat([mv_df, pd.DataFrame([last_row])], ignore_index=True)
-
-                # Performance
-                p_df = pd.DataFrame(get_player_performance(token, competition_id, player_id, last_pfm_values, player_team_id))
-                if not p_df.empty:
-                    p_df["date"] = pd.to_datetime(p_df["date"])
-                    p_df = p_df.sort_values("date")
-                else:
-                    p_df = pd.DataFrame({"date": pd.to_datetime([])})
-
-                # Ensure date columns are in datetime64[us] format, see problem #6
-                p_df["date"] = p_df["date"].astype("datetime64[us]")
-
-                # Merge DataFrames
-                merged_df = (
-                    pd.merge_asof(mv_df, p_df, on="date", direction="backward")
-                    if not mv_df.empty else pd.DataFrame()
-                )
+            roster = get_competition_roster(token, competition_id)
 
-                # Get p_df values where p_df.date > max(mv_df.date) and append to merged_df
-                if not p_df.empty and not mv_df.empty:
-                    max_mv_date = mv_df["date"].max()
-                    additional_p_df = p_df[p_df["date"] > max_mv_date]
-                    merged_df = pd.concat([merged_df, additional_p_df], ignore_index=True) 
+            def process_player(player_info):
+                player_id = player_info["player_id"]
+                timeframe, since = get_market_value_window(last_dates, player_id, last_mv_values)
 
-                if not merged_df.empty:
-                    merged_df = player_df.merge(merged_df, how="cross")
-                    merged_df["competition_id"] = competition_id
+                # The roster from the team profiles usually has everything, only ask for the rest
+                if has_missing_player_info(player_info):
+                    player_info = fill_missing_player_info(player_info, get_player_info(token, competition_id, player_id))
 
-                return merged_df
+                market_values = get_player_market_value(token, competition_id, player_id, last_mv_values, timeframe)
+                performances = get_player_performance(token, competition_id, player_id, last_pfm_values, player_info["team_id"])
+
+                return competition_id, player_info, filter_market_values(market_values, since), performances
 
             # Use ThreadPoolExecutor to parallelize player fetching
-            with concurrent.futures.ThreadPoolExecutor(max_workers=12) as executor:
-                comp_dfs = list(executor.map(process_player, players))
-            
-            comp_final_df = pd.concat(
-                [df.dropna(how="all", axis=1) for df in comp_dfs if df is not None and not df.empty],
-                ignore_index=True
-            )
+            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                player_records.extend(executor.map(process_player, roster))
+
+        write_player_records(player_records, last_mv_values, full_rebuild)
 
-            all_competitions_dfs.append(comp_final_df)
+def save_player_data_to_db_async(token, competition_ids, last_mv_values, last_pfm_values, reload_data, incremental=True, max_in_flight=MAX_IN_FLIGHT):
+    """Fetch player data concurrently with asyncio and save to SQLite database if reload_data is needed"""
 
-        # Combine all competitions
-        final_df = pd.concat(all_competitions_dfs, ignore_index=True)
+    if reload_data:
+        full_rebuild = not incremental or check_if_full_rebuild_needed(last_mv_values)
+        last_dates = None if full_rebuild else storage.load_last_market_value_dates()
 
-        # Convert k column to string
-        final_df["k"] = final_df["k"].apply(
-            lambda x: ",".join(map(str, x)) if isinstance(x, list) else (None if x is None else str(x))
+        player_records = asyncio.run(
+            fetch_player_records_async(token, competition_ids, last_mv_values, last_pfm_values, last_dates, max_in_flight)
         )
 
-        # Save to SQLite
-        with sqlite3.connect("player_data_total.db") as conn:
-            final_df.to_sql("player_data_1d", conn, if_exists="replace", index=False)
+        write_player_records(player_records, last_mv_values, full_rebuild)
+
+async def fetch_player_records_async(token, competition_ids, last_mv_values, last_pfm_values, last_dates=None, max_in_flight=MAX_IN_FLIGHT):
+    """Fetch (competition_id, player_info, market_values, performances) of all players of all competitions concurrently"""
+
+    async with AsyncKickbaseClient(max_in_flight) as aclient:
+
+        async def process_player(competition_id, player_info):
+            player_id = player_info["player_id"]
+            timeframe, since = get_market_value_window(last_dates, player_id, last_mv_values)
+
+            # The roster from the team profiles usually has everything, only ask for the rest
+            if has_missing_player_info(player_info):
+                player_info = fill_missing_player_info(
+                    player_info, await get_player_info_async(aclient, token, competition_id, player_id)
+                )
+
+            market_values, performances = await asyncio.gather(
+                get_player_market_value_async(aclient, token, competition_id, player_id, last_mv_values, timeframe),
+                get_player_performance_async(aclient, token, competition_id, player_id, last_pfm_values, player_info["team_id"]),
+            )
+
+            return competition_id, player_info, filter_market_values(market_values, since), performances
+
+        async def process_competition(competition_id):
+            roster = await get_competition_roster_async(aclient, token, competition_id)
+            return await asyncio.gather(*(process_player(competition_id, player_info) for player_info in roster))
+
+        # The semaphore of the client bounds the requests in flight over all competitions and players
+        competition_records = await asyncio.gather(*(process_competition(competition_id) for competition_id in competition_ids))
+
+    return [record for records in competition_records for record in records]
+
+def write_player_records(player_records, last_mv_values, full_rebuild):
+    """Write the fetched player records to the database"""
+
+    n_changed = storage.write_player_records(player_records, last_mv_values, full_rebuild)
+
+    if full_rebuild:
+        print(f"\nPlayer data rebuilt, {n_changed} rows written.")
+    else:
+        print(f"\nPlayer data updated incrementally, {n_changed} new or changed rows.")
 
 def load_player_data_from_db():
     """Load player data from SQLite database into a dataframe"""
-    
-    conn = sqlite3.connect("player_data_total.db")
-    df = pd.read_sql("SELECT * FROM player_data_1d", conn)
-    conn.close()
 
-    return df
\ No newline at end of file
+    return storage.load_player_data()
+
+def update_player_features():
+    """Recompute the stored features of the rows changed by the last ingestion"""
+
+    start, n_rows = feature_store.update_feature_store()
+
+    if start is None:
+        print("\nFeatures up to date.")
+    elif start == "":
+        print(f"\nFeatures recomputed, {n_rows} rows.")
+    else:
+        print(f"\nFeatures updated from {start} on, {n_rows} rows.")
+
+def load_player_features_from_db():
+    """Load the player data with the precomputed features from the SQLite database into a dataframe"""
+
+    return feature_store.load_features()
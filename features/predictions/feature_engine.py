@@ -0,0 +1,178 @@
+import pandas as pd
+import numpy as np
+
+# Vectorized feature engine for preprocess_player_data
+# The frame is sorted once by (player_id, date), every per-player operation (shift, diff,
+# pct_change, rolling, backfill) then works on plain NumPy arrays using the group start offsets,
+# so there is no Python call per player.
+
+# Forecast horizons in days, the market value change over each of them is a target
+HORIZONS = [1, 3, 7]
+
+def target_column(horizon):
+    """Name of the market value change target of a horizon, mv_target is the next day"""
+
+    return "mv_target" if horizon == 1 else f"mv_target_{horizon}d"
+
+# Columns added by compute_features
+FEATURE_COLUMNS = [
+    "next_day", "next_md", "days_to_next", "mv_next_day",
+] + [target_column(horizon) for horizon in HORIZONS] + [
+    "mv_change_1d", "mv_trend_1d", "mv_change_3d", "mv_vol_3d", "mv_trend_7d", "market_divergence",
+]
+
+class Segments:
+    """Group boundaries of a frame sorted by integer group codes, one segment per player"""
+
+    def __init__(self, codes):
+        n = len(codes)
+        self.n = n
+
+        # First row of every segment and, per row, the first and the end row of its segment
+        starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        ends = np.append(starts[1:], n)[:len(starts)]
+        lengths = ends - starts
+        self.start = np.repeat(starts, lengths)
+        self.end = np.repeat(ends, lengths)
+        self.pos = np.arange(n) - self.start
+
+    def shift(self, values, periods):
+        """Per-segment shift, like groupby().shift(periods)"""
+
+        values = np.asarray(values, dtype=float)
+        result = np.full(self.n, np.nan)
+        idx = np.arange(self.n) - periods
+
+        if periods >= 0:
+            valid = self.pos >= periods
+        else:
+            valid = idx < self.end
+        result[valid] = values[idx[valid]]
+
+        return result
+
+    def shift_datetime(self, values, periods):
+        """Per-segment shift of a datetime64 array, NaT where there is no row"""
+
+        result = np.full(self.n, np.datetime64("NaT"), dtype=values.dtype)
+        idx = np.arange(self.n) - periods
+
+        if periods >= 0:
+            valid = self.pos >= periods
+        else:
+            valid = idx < self.end
+        result[valid] = values[idx[valid]]
+
+        return result
+
+    def pct_change(self, values, periods):
+        """Per-segment pct_change(periods, fill_method=None)"""
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return values / self.shift(values, periods) - 1
+
+    def rolling_mean(self, values, window):
+        """Per-segment rolling(window).mean(), NaN unless all values of the window are present"""
+
+        stacked = np.vstack([self.shift(values, lag) for lag in range(window)])
+        return stacked.mean(axis=0)
+
+    def rolling_std(self, values, window):
+        """Per-segment rolling(window).std() with ddof=1, NaN unless all values of the window are present"""
+
+        stacked = np.vstack([self.shift(values, lag) for lag in range(window)])
+        return stacked.std(axis=0, ddof=1)
+
+    def bfill(self, values):
+        """Per-segment backward fill of a datetime64 array"""
+
+        # Index of the next valid value at or after every row, over the whole array
+        valid = ~np.isnat(values)
+        idx = np.where(valid, np.arange(self.n), self.n)
+        next_valid = np.minimum.accumulate(idx[::-1])[::-1]
+
+        # Only fill from the same segment
+        result = np.full(self.n, np.datetime64("NaT"), dtype=values.dtype)
+        same_segment = next_valid < self.end
+        result[same_segment] = values[next_valid[same_segment]]
+
+        return result
+
+def group_mean(keys, values):
+    """Mean of values per key, broadcast back to the rows, like groupby(keys).transform("mean")"""
+
+    codes, _ = pd.factorize(keys)  # missing keys get -1 and a NaN mean
+    present = (codes >= 0) & ~np.isnan(values)
+
+    n_keys = codes.max() + 1 if len(codes) else 0
+    sums = np.bincount(codes[present], weights=values[present], minlength=n_keys)
+    counts = np.bincount(codes[present], minlength=n_keys)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / counts
+
+    result = np.full(len(values), np.nan)
+    result[codes >= 0] = means[codes[codes >= 0]]
+
+    return result
+
+def compute_features(df):
+    """Compute the dates, targets and market value features of preprocess_player_data (steps 1-4)"""
+
+    # 1. Sort and filter, the player ids are factorized once in sorted order and used as group codes
+    keep = (     # Keep rows where team_id matches t1 or t2 OR where both t1 and t2 are missing
+        (df["team_id"] == df["t1"]) |
+        (df["team_id"] == df["t2"]) |
+        (df["t1"].isna() & df["t2"].isna())
+    ).to_numpy()
+
+    codes, _ = pd.factorize(df["player_id"], sort=True)
+    order = np.lexsort((pd.to_datetime(df["date"]).to_numpy(), codes))
+    order = order[keep[order]]
+    df, codes = df.take(order), codes[order]
+
+    # Convert date columns to datetime
+    df["date"] = pd.to_datetime(df["date"])
+    df["md"] = pd.to_datetime(df["md"])
+
+    seg = Segments(codes)
+    date = df["date"].to_numpy()
+    md = df["md"].to_numpy()
+    mv = df["mv"].to_numpy(dtype=float)
+
+    # 2. Date and matchday calculations, next_md is the next different matchday of the player
+    df["next_day"] = seg.shift_datetime(date, -1)
+    next_md = seg.shift_datetime(md, -1)
+    next_md[~np.isnat(next_md) & (next_md == md)] = np.datetime64("NaT")
+    df["next_md"] = seg.bfill(next_md)
+    df["days_to_next"] = (df["next_md"] - df["date"]).dt.days
+
+    # 3. Next day market value and the changes over all horizons
+    df["mv_next_day"] = seg.shift(mv, -1)
+    df["mv_target"] = df["mv_next_day"] - df["mv"]
+    for horizon in HORIZONS[1:]:
+        df[target_column(horizon)] = seg.shift(mv, -horizon) - mv
+    keep = np.flatnonzero((df["mv"] != 0.0).to_numpy())
+    df, codes = df.take(keep), codes[keep]
+
+    # The segments change with the dropped rows
+    seg = Segments(codes)
+    mv = df["mv"].to_numpy(dtype=float)
+
+    # 4. Feature engineering
+    # Market value trend 1d
+    df["mv_change_1d"] = mv - seg.shift(mv, 1)
+    df["mv_trend_1d"] = np.nan_to_num(seg.pct_change(mv, 1), nan=0, posinf=0, neginf=0)
+
+    # Market value trend 3d
+    df["mv_change_3d"] = mv - seg.shift(mv, 3)
+    df["mv_vol_3d"] = seg.rolling_std(mv, 3)
+
+    # Market value trend 7d
+    df["mv_trend_7d"] = np.nan_to_num(seg.pct_change(mv, 7), nan=0, posinf=0, neginf=0)
+
+    ## League-wide market context, rolling per player
+    ratio = mv / group_mean(df["md"].to_numpy(), mv)
+    df["market_divergence"] = seg.rolling_mean(ratio, 3)
+
+    return df
@@ -0,0 +1,146 @@
+from features.predictions import feature_engine, storage
+from features.predictions.feature_engine import FEATURE_COLUMNS, HORIZONS, compute_features, target_column
+from datetime import date, timedelta
+import pandas as pd
+import hashlib
+import inspect
+
+# Persistent feature store in the player database (table player_features)
+# After each ingestion only the rows from the first changed date on are recomputed, the triggers of the
+# source tables record that date per player in feature_changes. The stored features are versioned by a
+# hash of the feature definitions, any change of feature_engine recomputes everything.
+
+FEATURE_VERSION = hashlib.sha256(inspect.getsource(feature_engine).encode()).hexdigest()[:16]
+
+# History loaded before the first recomputed row, covers the 7 rows of mv_trend_7d and the rolling windows
+LOOKBACK_DAYS = 14
+
+STORE_COLUMNS = [
+    "player_id", "date", "mv", "md", "p", "mp", "ppm", "t1", "t2", "t1g", "t2g", "won", "k",
+] + FEATURE_COLUMNS
+
+DATE_COLUMNS = ["date", "md", "next_day", "next_md"]
+
+def get_update_start(conn):
+    """Get the first date whose features have to be recomputed, '' for all dates, None if they are up to date"""
+
+    version = conn.execute("SELECT value FROM feature_store_meta WHERE key = 'version';").fetchone()
+    if version is None or version[0] != FEATURE_VERSION:
+        return ""
+
+    if conn.execute("SELECT 1 FROM player_features LIMIT 1;").fetchone() is None:
+        return ""
+
+    # Per changed player the earliest of
+    #   the first changed date,
+    #   rows whose next day, next matchday or longest horizon target is still open and is taken from the new rows,
+    #   the matchday of the first changed date, its market value mean over all players changes
+    row = conn.execute(f"""
+        SELECT MIN(MIN(
+            c.since,
+            COALESCE((
+                SELECT MIN(f.date) FROM player_features f
+                WHERE f.player_id = c.player_id AND (
+                    f.next_day IS NULL OR f.{target_column(HORIZONS[-1])} IS NULL OR (f.next_md IS NULL AND (
+                        f.md IS NOT NULL OR EXISTS (SELECT 1 FROM performances p WHERE p.player_id = c.player_id)
+                    ))
+                )
+            ), c.since),
+            COALESCE((
+                SELECT MAX(p.md) FROM performances p WHERE p.player_id = c.player_id AND p.md <= c.since
+            ), c.since)
+        ))
+        FROM feature_changes c;
+    """).fetchone()
+
+    return row[0]
+
+def get_context_start(conn, start):
+    """Get the first date to load for recomputing the features from start on
+
+    Besides LOOKBACK_DAYS of history the matchdays of those days are loaded completely,
+    so the market value means per matchday of market_divergence are the same as over all rows.
+    """
+
+    cutoff = (date.fromisoformat(start) - timedelta(days=LOOKBACK_DAYS)).isoformat()
+    row = conn.execute("""
+        SELECT MIN(md) FROM (
+            SELECT MAX(md) AS md FROM performances WHERE md <= ? GROUP BY player_id
+        );
+    """, (cutoff,)).fetchone()
+
+    return min(cutoff, row[0]) if row[0] is not None else cutoff
+
+def write_features(df, start):
+    """Replace the stored features from start on ('' for all) with the rows of df in one transaction"""
+
+    df = df[STORE_COLUMNS].copy()
+    for column in DATE_COLUMNS:
+        df[column] = df[column].dt.strftime("%Y-%m-%d")  # NaT is written as NULL
+
+    conn = storage.connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM player_features WHERE date >= ?;", (start,))
+
+            # Players that left the competitions and market values pruned from the history
+            conn.execute("DELETE FROM player_features WHERE player_id NOT IN (SELECT player_id FROM players);")
+            first_dates = conn.execute("SELECT player_id, MIN(date) FROM market_values GROUP BY player_id;").fetchall()
+            conn.executemany("DELETE FROM player_features WHERE player_id = ? AND date < ?;", first_dates)
+
+            placeholders = ", ".join("?" * len(STORE_COLUMNS))
+            conn.executemany(
+                f"INSERT INTO player_features ({', '.join(STORE_COLUMNS)}) VALUES ({placeholders});",
+                zip(*(df[column].tolist() for column in STORE_COLUMNS)),
+            )
+
+            conn.execute("DELETE FROM feature_changes;")
+            conn.execute(
+                "INSERT OR REPLACE INTO feature_store_meta (key, value) VALUES ('version', ?);", (FEATURE_VERSION,)
+            )
+    finally:
+        conn.close()
+
+def update_feature_store():
+    """Recompute the features of the changed rows, returns (first recomputed date, '' for all or None, rows)"""
+
+    conn = storage.connect()
+    try:
+        start = get_update_start(conn)
+        context_start = get_context_start(conn, start) if start else None
+    finally:
+        conn.close()
+
+    if start is None:
+        return None, 0
+
+    if start == "":
+        df = compute_features(storage.load_player_data())
+    else:
+        df = compute_features(storage.load_player_data(since=context_start))
+        df = df[df["date"] >= start]
+
+    write_features(df, start)
+
+    return start, len(df)
+
+def load_features():
+    """Load the stored features with the current player info, same columns and rows as compute_features"""
+
+    player_columns = [column for column in storage.PLAYER_DATA_COLUMNS if column not in STORE_COLUMNS]
+
+    conn = storage.connect()
+    try:
+        df = pd.read_sql(f"""
+            SELECT f.*, {', '.join(f'pl.{column}' for column in player_columns)}
+            FROM player_features f
+            JOIN players pl ON pl.player_id = f.player_id
+            ORDER BY f.player_id, f.date;
+        """, conn)
+    finally:
+        conn.close()
+
+    for column in DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column])
+
+    return df[storage.PLAYER_DATA_COLUMNS + FEATURE_COLUMNS]
@@ -0,0 +1,219 @@
+from features.predictions.modeling import (
+    DEFAULT_ENGINE,
+    MODEL_ENGINES,
+    UPDATE_TREES,
+    evaluate_targets,
+    measure,
+    measure_model_costs,
+    train_model,
+    update_model,
+)
+from datetime import datetime, timedelta
+import pandas as pd
+import sklearn
+import hashlib
+import joblib
+import json
+import os
+
+# On-disk registry of fitted models
+# A model is stored as models/<key>.joblib with its evaluation metrics and costs in models/<key>.json, the key
+# is a hash of the training and test data, the features, the target, the engine and its hyperparameters.
+# A run with the same key loads the stored model instead of fitting it again.
+# In incremental mode a new model is built from the latest stored one by adding trees fitted on recent rows
+# (modeling.update_model), with a full refit every FULL_REFIT_DAYS days.
+
+MODEL_DIR = "models"
+MAX_MODELS = 3  # amount of models kept, older ones are removed
+FULL_REFIT_DAYS = 7 # days after which an incrementally updated model is fitted from scratch again
+
+METRIC_NAMES = ["signs_percent", "rmse", "mae", "r2"]
+
+def hash_frame(df):
+    """Hash the values and column names of a frame or series, independent of the index"""
+
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    columns = df.columns if isinstance(df, pd.DataFrame) else [df.name]
+    digest.update(json.dumps([str(column) for column in columns]).encode())
+
+    return digest.hexdigest()
+
+def model_key(X_train, y_train, X_test, y_test, features, target, params, engine=DEFAULT_ENGINE):
+    """Key of a model, changes with the data, the features, the target, the engine, its hyperparameters and sklearn"""
+
+    digest = hashlib.sha256()
+    for df in (X_train, y_train, X_test, y_test):
+        digest.update(hash_frame(df).encode())
+
+    digest.update(json.dumps({
+        "features": list(features),
+        "target": target,
+        "engine": engine,
+        "params": params,
+        "sklearn": sklearn.__version__,
+    }, sort_keys=True).encode())
+
+    return digest.hexdigest()[:24]
+
+def competition_model_dir(competition_id, model_dir=MODEL_DIR):
+    """Directory of the models of a competition, every competition has its own models"""
+
+    return os.path.join(model_dir, f"competition_{competition_id}")
+
+def model_paths(key, model_dir=MODEL_DIR):
+    """Paths of the model file and the metrics file of a key"""
+
+    return os.path.join(model_dir, f"{key}.joblib"), os.path.join(model_dir, f"{key}.json")
+
+def load_model(key, model_dir=MODEL_DIR):
+    """Load a stored model and its metadata, None if there is no model with that key"""
+
+    model_path, meta_path = model_paths(key, model_dir)
+    if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    # The tree arrays are memory-mapped instead of read into memory
+    try:
+        model = joblib.load(model_path, mmap_mode="r")
+    except Exception as e:
+        print(f"Warning: Could not load stored model {key}: {e}")
+        return None
+
+    return model, meta
+
+def save_model(key, model, model_dir=MODEL_DIR):
+    """Store a model uncompressed, so it can be memory-mapped, returns the size of the file in bytes"""
+
+    os.makedirs(model_dir, exist_ok=True)
+    model_path, _ = model_paths(key, model_dir)
+
+    # Write to a temporary file first, so an interrupted run leaves no half written model
+    joblib.dump(model, model_path + ".tmp")
+    os.replace(model_path + ".tmp", model_path)
+
+    return os.path.getsize(model_path)
+
+def save_meta(key, meta, model_dir=MODEL_DIR):
+    """Store the metadata of a model, a model is only loaded once its metadata exists"""
+
+    _, meta_path = model_paths(key, model_dir)
+
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+
+def prune_models(model_dir=MODEL_DIR, keep=MAX_MODELS):
+    """Remove all but the keep most recently used models"""
+
+    if not os.path.isdir(model_dir):
+        return
+
+    model_files = [name for name in os.listdir(model_dir) if name.endswith(".joblib")]
+    model_files.sort(key=lambda name: os.path.getmtime(os.path.join(model_dir, name)), reverse=True)
+
+    for name in model_files[keep:]:
+        for path in model_paths(name[:-len(".joblib")], model_dir):
+            if os.path.exists(path):
+                os.remove(path)
+
+def get_full_refit_at(meta):
+    """Time of the last full refit in the lineage of a model"""
+
+    return meta.get("full_refit_at") or meta["created_at"]
+
+def find_base_model(features, target, params, engine=DEFAULT_ENGINE, model_dir=MODEL_DIR, full_refit_days=FULL_REFIT_DAYS):
+    """Find the latest stored model with the same features, target, engine and parameters to update incrementally
+
+    Returns (model, meta) or None if there is none or its last full refit is older than full_refit_days.
+    """
+
+    if not os.path.isdir(model_dir):
+        return None
+
+    meta_files = [name for name in os.listdir(model_dir) if name.endswith(".json")]
+    meta_files.sort(key=lambda name: os.path.getmtime(os.path.join(model_dir, name)), reverse=True)
+
+    for name in meta_files:
+        with open(os.path.join(model_dir, name)) as f:
+            meta = json.load(f)
+
+        same_setup = (
+            meta.get("features") == list(features) and meta.get("target") == target
+            and meta.get("engine", DEFAULT_ENGINE) == engine and meta.get("params") == params
+            and meta.get("sklearn") == sklearn.__version__
+        )
+        if not same_setup:
+            continue
+
+        if datetime.now() - datetime.fromisoformat(get_full_refit_at(meta)) >= timedelta(days=full_refit_days):
+            return None
+
+        return load_model(meta["key"], model_dir)
+
+    return None
+
+def get_model(X_train, y_train, X_test, y_test, features, target, params=None, model_dir=MODEL_DIR, recent=None, engine=DEFAULT_ENGINE):
+    """Load the model for this data, features, target, engine and parameters, or train, evaluate and store it
+
+    With recent=(X_recent, y_recent) the latest stored model is updated with trees fitted on those rows
+    instead of training from scratch (engines that support it), as long as its last full refit is younger
+    than FULL_REFIT_DAYS.
+    Returns (model, metrics, costs, cached), metrics are the ones of evaluate_model for the first target and
+    costs the ones of modeling.measure_model_costs, both stored next to the model with the metrics of every
+    target (target_metrics) of a multi-horizon model.
+    """
+
+    spec = MODEL_ENGINES[engine]
+    params = spec["params"] if params is None else params
+    key = model_key(X_train, y_train, X_test, y_test, features, target, params, engine)
+
+    stored = load_model(key, model_dir)
+    if stored is not None:
+        model, meta = stored
+        os.utime(model_paths(key, model_dir)[0])  # mark as recently used for prune_models
+        return model, meta["metrics"], meta.get("costs", {}), True
+
+    now = datetime.now().isoformat(timespec="seconds")
+    use_base = spec["incremental"] and recent is not None and len(recent[0])
+    base = find_base_model(features, target, params, engine, model_dir) if use_base else None
+
+    if base is not None:
+        model, base_meta = base
+        model, fit_seconds, fit_memory = measure(
+            update_model, model, *recent, n_new_trees=UPDATE_TREES, max_trees=params["n_estimators"]
+        )
+        lineage = {"mode": "incremental", "base_key": base_meta["key"], "full_refit_at": get_full_refit_at(base_meta)}
+    else:
+        model, fit_seconds, fit_memory = measure(train_model, X_train, y_train, params, engine)
+        lineage = {"mode": "full", "base_key": None, "full_refit_at": now}
+
+    target_metrics = {
+        column: dict(zip(METRIC_NAMES, map(float, values)))
+        for column, values in evaluate_targets(model, X_test, y_test).items()
+    }
+    metrics = next(iter(target_metrics.values()))
+
+    meta = {
+        "key": key,
+        "created_at": now,
+        **lineage,
+        "engine": engine,
+        "features": list(features),
+        "target": target,
+        "params": params,
+        "sklearn": sklearn.__version__,
+        "n_train": len(X_train),
+        "n_test": len(X_test),
+        "metrics": metrics,
+        "target_metrics": target_metrics,
+    }
+    size = save_model(key, model, model_dir)
+    meta["costs"] = measure_model_costs(model, X_test, fit_seconds, fit_memory, size)
+    save_meta(key, meta, model_dir)
+
+    prune_models(model_dir)
+
+    return model, metrics, meta["costs"], False
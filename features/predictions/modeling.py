@@ -1,28 +1,105 @@
+from kickbase_api.tracing import PeakMemory
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.multioutput import MultiOutputRegressor
 import numpy as np
+import tempfile
+import joblib
+import time
+import os
 
-def train_model(X_train, y_train):
-    """Train a RandomForestRegressor model, parameters optimized via grid search"""
+# Model engines, selected by name (model_engine in daily_predictions.py)
+#   estimator:   the scikit-learn regressor
+#   params:      hyperparameters, part of the model registry key
+#   fixed:       arguments that don't change the fitted model, e.g. the amount of jobs
+#   incremental: the fitted model can be grown with update_model
+#   multi_output: fits several targets (horizons) at once, otherwise one model per target is fitted
+MODEL_ENGINES = {
+    # Parameters optimized via grid search, tune.py searches them again on the current data
+    "random_forest": {
+        "estimator": RandomForestRegressor,
+        "params": {
+            "n_estimators": 500,
+            "max_depth": 20,
+            "min_samples_split": 5,
+            "min_samples_leaf": 2,
+            "max_features": "sqrt",
+        },
+        "fixed": {"n_jobs": -1},
+        "incremental": True,
+        "multi_output": True,
+    },
+    # Histogram based gradient boosting, bins the features once and fits shallow trees, much smaller and faster
+    "hist_gradient_boosting": {
+        "estimator": HistGradientBoostingRegressor,
+        "params": {
+            "max_iter": 300,
+            "learning_rate": 0.05,
+            "max_leaf_nodes": 31,
+            "min_samples_leaf": 20,
+            "l2_regularization": 1.0,
+        },
+        "fixed": {"early_stopping": False},
+        "incremental": False,
+        "multi_output": False,
+    },
+}
 
-    model = RandomForestRegressor(
-        n_estimators=500,
-        max_depth=20,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        max_features="sqrt",
-        n_jobs=-1
-    )
+DEFAULT_ENGINE = "random_forest"
+MODEL_PARAMS = MODEL_ENGINES[DEFAULT_ENGINE]["params"]
+
+# Incremental updates, see update_model
+UPDATE_TREES = 25       # trees added (and retired) per update
+UPDATE_WINDOW_DAYS = 30 # days of recent training rows the added trees are fitted on
+
+def train_model(X_train, y_train, params=None, engine=DEFAULT_ENGINE, n_jobs=None):
+    """Train a model of the given engine, by default a RandomForestRegressor with parameters optimized via grid search (tune.py)
+
+    With several target columns (horizons) in y_train the forest fits all of them in the same trees,
+    engines without multi-output support fit one model per target.
+    n_jobs replaces the amount of jobs of engines that have one, e.g. 1 inside worker processes.
+    """
+
+    spec = MODEL_ENGINES[engine]
+    params = spec["params"] if params is None else params
+    fixed = dict(spec["fixed"])
+    if n_jobs is not None and "n_jobs" in fixed:
+        fixed["n_jobs"] = n_jobs
+
+    model = spec["estimator"](**params, **fixed)
+    if np.ndim(y_train) == 2 and not spec["multi_output"]:
+        model = MultiOutputRegressor(model)
 
     model.fit(X_train, y_train)
 
     return model
 
 
-def evaluate_model(model, X_test, y_test):
+def update_model(model, X_recent, y_recent, n_new_trees=UPDATE_TREES, max_trees=None):
+    """Add n_new_trees trees fitted on recent rows to a fitted forest and retire the oldest trees beyond max_trees"""
+
+    max_trees = max_trees or model.n_estimators
+
+    # warm_start keeps the fitted trees and only fits the additional ones
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_new_trees)
+    model.fit(X_recent, y_recent)
+
+    # The trees are kept in the order they were added, the first ones are the oldest
+    model.estimators_ = model.estimators_[-max_trees:]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+
+    return model
+
+
+def evaluate_model(model, X_test, y_test, y_pred=None):
     """Evaluate the model using RMSE, MAE, R2 and percentage of correct sign predictions"""
 
-    y_pred = model.predict(X_test)
+    y_pred = model.predict(X_test) if y_pred is None else y_pred
+
+    # Multi-horizon models are evaluated on their first target (next day, known for every row),
+    # evaluate_targets covers all of them
+    if np.ndim(y_pred) == 2:
+        y_test, y_pred = np.asarray(y_test)[:, 0], y_pred[:, 0]
 
     rmse = mean_squared_error(y_test, y_pred)
     mae = mean_absolute_error(y_test, y_pred)
@@ -30,4 +107,60 @@ def evaluate_model(model, X_test, y_test):
     signs_correct = np.sum(np.sign(y_test) == np.sign(y_pred))
     signs_percent = (signs_correct / len(y_test)) * 100
 
-    return signs_percent, rmse, mae, r2
\ No newline at end of file
+    return signs_percent, rmse, mae, r2
+
+def evaluate_targets(model, X_test, y_test):
+    """Evaluate every target of a model with a single predict call, returns {target: evaluate_model metrics}
+
+    Every target is evaluated on the rows it has a value for, the longer horizons are missing on the last days.
+    """
+
+    y_pred = model.predict(X_test)
+    if np.ndim(y_test) == 1:
+        return {y_test.name: evaluate_model(model, X_test, y_test, y_pred)}
+
+    metrics = {}
+    for i, column in enumerate(y_test.columns):
+        known = y_test[column].notna().to_numpy()
+        metrics[column] = evaluate_model(model, X_test[known], y_test[column][known], y_pred[known, i])
+
+    return metrics
+
+
+def measure(func, *args, interval=0.01, **kwargs):
+    """Call func and return (result, seconds, peak resident memory above the start in bytes or None)
+
+    The memory is sampled every interval seconds in a background thread.
+    """
+
+    with PeakMemory(interval) as memory:
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+
+    return result, seconds, memory.peak
+
+def serialized_size(model):
+    """Size of the model as stored by joblib in bytes"""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "model.joblib")
+        joblib.dump(model, path)
+        return os.path.getsize(path)
+
+def measure_model_costs(model, X_test, fit_seconds, fit_peak_memory, size=None):
+    """Cost report of a fitted model: fit time, predict latency, serialized size and peak memory of the fit"""
+
+    _, predict_seconds, _ = measure(model.predict, X_test)
+    _, row_seconds, _ = measure(model.predict, X_test[:1])
+    size = serialized_size(model) if size is None else size
+
+    return {
+        "fit_s": fit_seconds,
+        "predict_ms": predict_seconds * 1000,
+        "predict_row_ms": row_seconds * 1000,
+        "size_mb": size / 2**20,
+        "fit_peak_mb": fit_peak_memory / 2**20 if fit_peak_memory is not None else None,
+    }
@@ -1,22 +1,43 @@
 from kickbase_api.league import get_league_players_on_market
 from kickbase_api.user import get_players_in_squad
+from features.predictions.feature_engine import HORIZONS
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import pandas as pd
 import numpy as np
 
-def live_data_predictions(today_df, model, features):
-    """Make live data predictions for today_df using the trained model"""
+MIN_PREDICTED_GAIN = 5000   # predicted next day market value change a market player needs to be recommended
+
+def prediction_columns(df):
+    """Predicted market value change columns of df, one per horizon (predicted_mv_1d, predicted_mv_3d, ...)"""
+
+    return [column for column in df.columns if column.startswith("predicted_mv_")]
+
+def select_bids(df, min_gain=MIN_PREDICTED_GAIN):
+    """Players worth bidding on, a predicted_mv_1d above min_gain, sorted by predicted_mv_1d descending"""
+
+    df = df[df["predicted_mv_1d"] > min_gain]
+
+    return df.sort_values("predicted_mv_1d", ascending=False)
+
+def live_data_predictions(today_df, model, features, horizons=HORIZONS):
+    """Make live data predictions for today_df using the trained model
+
+    A multi-horizon model predicts all horizons in one call, one predicted_mv_<horizon>d column each.
+    A single target model only gives predicted_mv_1d.
+    """
 
     # Set features and copy df
     today_df_features = today_df[features]
     today_df_results = today_df.copy()
 
-    # Predict mv_target
-    today_df_results["predicted_mv_target"] = np.round(model.predict(today_df_features), 2)
+    # Predict the market value changes of all horizons at once
+    predictions = np.round(model.predict(today_df_features), 2).reshape(len(today_df_features), -1)
+    for i, horizon in enumerate(horizons[:predictions.shape[1]]):
+        today_df_results[f"predicted_mv_{horizon}d"] = predictions[:, i]
 
-    # Sort by predicted_mv_target descending
-    today_df_results = today_df_results.sort_values("predicted_mv_target", ascending=False)
+    # Sort by predicted_mv_1d descending
+    today_df_results = today_df_results.sort_values("predicted_mv_1d", ascending=False)
 
     # Filter date to today or yesterday if before 22:15, because mv is updated around 22:15
     now = datetime.now(ZoneInfo("Europe/Berlin"))
@@ -28,13 +49,16 @@ def live_data_predictions(today_df, model, features):
     today_df_results = today_df_results.dropna(subset=["mv"])
 
     # Keep only relevant columns
-    today_df_results = today_df_results[["player_id", "first_name", "last_name", "position", "team_name", "date", "mv_change_1d", "mv_trend_1d", "mv", "predicted_mv_target"]]
+    today_df_results = today_df_results[["player_id", "first_name", "last_name", "position", "team_name", "date", "mv_change_1d", "mv_trend_1d", "mv"] + prediction_columns(today_df_results)]
 
     return today_df_results
 
 
-def join_current_squad(token, league_id, today_df_results):
-    squad_players = get_players_in_squad(token, league_id)
+def join_current_squad(token, league_id, today_df_results, squad_players=None):
+    """Join the live predictions with the players in the squad, squad_players is fetched if not given"""
+
+    if squad_players is None:
+        squad_players = get_players_in_squad(token, league_id)
 
     squad_df = pd.DataFrame(squad_players["it"])
 
@@ -59,16 +83,20 @@ def join_current_squad(token, league_id, today_df_results):
     squad_df = squad_df.rename(columns={"mv_x": "mv"})
 
     # Keep only relevant columns
-    squad_df = squad_df[["last_name", "team_name", "mv", "mv_change_yesterday", "predicted_mv_target", "s_11_prob"]]
+    squad_df = squad_df[["last_name", "team_name", "mv", "mv_change_yesterday"] + prediction_columns(today_df_results) + ["s_11_prob"]]
 
     return squad_df 
 
 
 # TODO Add fail-safe check before player expires if the prob (starting 11) is still high, so no injuries or anything. if it dropped. dont bid / reccommend
-def join_current_market(token, league_id, today_df_results):
-    """Join the live predictions with the current market data to get bid recommendations"""
+def join_current_market(token, league_id, today_df_results, players_on_market=None):
+    """Join the live predictions with the current market data to get bid recommendations
 
-    players_on_market = get_league_players_on_market(token, league_id)
+    players_on_market is fetched if not given.
+    """
+
+    if players_on_market is None:
+        players_on_market = get_league_players_on_market(token, league_id)
 
     # players_on_market to DataFrame
     market_df = pd.DataFrame(players_on_market)
@@ -93,11 +121,8 @@ def join_current_market(token, league_id, today_df_results):
     # If hours_to_exp < diff then it expires today
     bid_df["expiring_today"] = bid_df["hours_to_exp"] < diff
 
-    # Drop rows where predicted_mv_target is less than 5000
-    bid_df = bid_df[bid_df["predicted_mv_target"] > 5000]
-
-    # Sort by predicted_mv_target descending
-    bid_df = bid_df.sort_values("predicted_mv_target", ascending=False)
+    # Keep the players with a substantial predicted gain
+    bid_df = select_bids(bid_df)
 
     # Rename prob to s_11_prob for better understanding
     if "prob" not in bid_df.columns:
@@ -108,6 +133,6 @@ def join_current_market(token, league_id, today_df_results):
     bid_df = bid_df.rename(columns={"mv_change_1d": "mv_change_yesterday"})
 
     # Keep only relevant columns
-    bid_df = bid_df[["last_name", "team_name", "mv", "mv_change_yesterday", "predicted_mv_target", "s_11_prob", "hours_to_exp", "expiring_today"]]
+    bid_df = bid_df[["last_name", "team_name", "mv", "mv_change_yesterday"] + prediction_columns(today_df_results) + ["s_11_prob", "hours_to_exp", "expiring_today"]]
 
     return bid_df
\ No newline at end of file
@@ -1,60 +1,25 @@
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-import pandas as pd
+from features.predictions.feature_engine import FEATURE_COLUMNS, HORIZONS, compute_features, target_column
 import numpy as np
 
 def preprocess_player_data(df):
-    """Preprocess the player data for modeling"""
-    
-    # 1. Sort and filter
-    df = df.sort_values(["player_id", "date"])
-    df = df[     # Keep rows where team_id matches t1 or t2 OR where both t1 and t2 are missing
-        (df["team_id"] == df["t1"]) |
-        (df["team_id"] == df["t2"]) |
-        (df["t1"].isna() & df["t2"].isna())
-    ]
-
-    # Convert date columns to datetime
-    df["date"] = pd.to_datetime(df["date"])
-    df["md"] = pd.to_datetime(df["md"])
-
-    # 2. Date and matchday calculations 
-    df["next_day"] = df.groupby("player_id")["date"].shift(-1) 
-    df["next_md"] = df.groupby("player_id")["md"].transform(
-        lambda x: x.shift(-1).where(x.shift(-1) != x).bfill()
-    )
-    df["days_to_next"] = (df["next_md"] - df["date"]).dt.days
-
-    # 3. Next day market value
-    df["mv_next_day"] = df.groupby("player_id")["mv"].shift(-1)
-    df["mv_target"] = df["mv_next_day"] - df["mv"]
-    df = df[df["mv"] != 0.0]
-
-    # 4. Feature engineering 
-    # Market value trend 1d
-    df["mv_change_1d"] = df["mv"] - df.groupby("player_id")["mv"].shift(1)
-    df["mv_trend_1d"] = df.groupby("player_id")["mv"].pct_change(fill_method=None)
-    df["mv_trend_1d"] = df["mv_trend_1d"].replace([np.inf, -np.inf], 0).fillna(0)
-
-    # Market value trend 3d
-    df["mv_change_3d"] = df["mv"] - df.groupby("player_id")["mv"].shift(3)
-    df["mv_vol_3d"] = df.groupby("player_id")["mv"].rolling(3).std().reset_index(0,drop=True)
-
-    # Market value trend 7d
-    df["mv_trend_7d"] = df.groupby("player_id")["mv"].pct_change(periods=7, fill_method=None)
-    df["mv_trend_7d"] = df["mv_trend_7d"].replace([np.inf, -np.inf], 0).fillna(0)
-
-    ## League-wide market context
-    df["market_divergence"] = (df["mv"] / df.groupby("md")["mv"].transform("mean")).rolling(3).mean()
-
-    # 5. Clip outliers in mv_target
-    Q1 = df["mv_target"].quantile(0.25)
-    Q3 = df["mv_target"].quantile(0.75)
-    IQR = Q3 - Q1
-    lower_bound = Q1 - 2.5 * IQR
-    upper_bound = Q3 + 2.5 * IQR
-
-    df["mv_target_clipped"] = df["mv_target"].clip(lower_bound, upper_bound)
+    """Preprocess the player data for modeling, the features are read from df if they were precomputed (feature store)"""
+
+    # 1.-4. Sort, filter, targets of all horizons and market value features, computed per player on NumPy arrays
+    if not set(FEATURE_COLUMNS).issubset(df.columns):
+        df = compute_features(df)
+
+    # 5. Clip outliers in the targets (mv_target_clipped, mv_target_3d_clipped, ...), each with its own quantiles
+    for horizon in HORIZONS:
+        column = target_column(horizon)
+        Q1 = df[column].quantile(0.25)
+        Q3 = df[column].quantile(0.75)
+        IQR = Q3 - Q1
+        lower_bound = Q1 - 2.5 * IQR
+        upper_bound = Q3 + 2.5 * IQR
+
+        df[f"{column}_clipped"] = df[column].clip(lower_bound, upper_bound)
 
     # 6. Fill missing values
     df = df.fillna({
@@ -83,17 +48,38 @@ def preprocess_player_data(df):
     return df, today_df
 
 
+def drop_missing_targets(df, target):
+    """Drop rows without a value for the target, or for any of them if target is a list (multi-horizon)
+
+    The targets of the longer horizons are missing for the last days of every player.
+    """
+
+    targets = [target] if isinstance(target, str) else list(target)
+
+    return df.dropna(subset=targets)
+
+def get_split_date(df):
+    """First date of the test set, the last quarter of the rows by date"""
+
+    dates = np.sort(df["date"].to_numpy())
+
+    return dates[int(len(dates) * 0.75)]
+
 def split_data(df, features, target):
-    """Split the data into training and testing sets based on date to avoid data leakage"""
+    """Split the data into training and testing sets based on date to avoid data leakage
+
+    The split date and the test rows are the ones of the next-day target, only the training rows need every
+    target. The targets of the longer horizons missing on the last days stay NaN in y_test, evaluate_targets
+    evaluates every target on its own rows.
+    """
 
     # Sort by date
     df = df.sort_values("date").reset_index(drop=True)
 
-    split_idx = int(len(df) * 0.75)
-    split_date = df["date"].iloc[split_idx]
+    split_date = get_split_date(df)
 
     # Split by time, to avoid data leakage
-    train = df[df["date"] < split_date]
+    train = drop_missing_targets(df[df["date"] < split_date], target)
     test = df[(df["date"] >= split_date)]
 
     X_train = train[features]
@@ -102,4 +88,14 @@ def split_data(df, features, target):
     X_test = test[features]
     y_test = test[target]
 
-    return X_train, X_test, y_train, y_test
\ No newline at end of file
+    return X_train, X_test, y_train, y_test
+
+
+def get_recent_train_data(df, features, target, days):
+    """Get the training rows of the last days before the split date, used for incremental model updates"""
+
+    split_date = get_split_date(df)
+    recent = df[(df["date"] < split_date) & (df["date"] >= split_date - np.timedelta64(days, "D"))]
+    recent = drop_missing_targets(recent, target)
+
+    return recent[features], recent[target]
@@ -0,0 +1,454 @@
+import pandas as pd
+import numpy as np
+import sqlite3
+
+# Normalized SQLite storage of the player history
+#   players:        static info per player
+#   market_values:  one row per (player_id, date)
+#   performances:   one row per (player_id, matchday)
+# The wide player_data_1d frame is built by load_player_data, the view of the same name
+# gives the same rows for ad hoc queries.
+#
+# Feature store, see features/predictions/feature_store.py
+#   player_features:    the rows of compute_features, one per (player_id, date)
+#   feature_changes:    per player the first date whose source rows changed since the last feature update,
+#                       filled by triggers on the tables above
+#   feature_store_meta: version of the feature definitions the stored features were computed with
+
+DB_PATH = "player_data_total.db"
+SCHEMA_VERSION = 3  # bump when the tables below change, triggers a full rebuild
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    player_id TEXT PRIMARY KEY,
+    competition_id INTEGER,
+    team_id TEXT,
+    team_name TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    position INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS market_values (
+    player_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    mv REAL,
+    PRIMARY KEY (player_id, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS performances (
+    player_id TEXT NOT NULL,
+    md TEXT NOT NULL,
+    p REAL,
+    mp INTEGER,
+    ppm REAL,
+    t1 TEXT,
+    t2 TEXT,
+    t1g INTEGER,
+    t2g INTEGER,
+    won INTEGER,
+    k TEXT,
+    PRIMARY KEY (player_id, md)
+) WITHOUT ROWID;
+
+-- Covering index for the per-date checks (latest complete date, players per date)
+CREATE INDEX IF NOT EXISTS idx_market_values_date ON market_values (date, mv);
+
+-- One row per market value day with the latest performance up to that day,
+-- plus the performances after the last market value day (upcoming matchdays)
+CREATE VIEW IF NOT EXISTS player_data_1d AS
+SELECT
+    pl.player_id, pl.team_id, pl.team_name, pl.first_name, pl.last_name, pl.position,
+    m.mv, m.date, pf.md, pf.p, pf.mp, pf.ppm, pf.t1, pf.t2, pf.t1g, pf.t2g, pf.won, pf.k,
+    pl.competition_id
+FROM market_values m
+JOIN players pl ON pl.player_id = m.player_id
+LEFT JOIN performances pf ON pf.player_id = m.player_id AND pf.md = (
+    SELECT MAX(md) FROM performances WHERE player_id = m.player_id AND md <= m.date
+)
+UNION ALL
+SELECT
+    pl.player_id, pl.team_id, pl.team_name, pl.first_name, pl.last_name, pl.position,
+    NULL AS mv, pf.md AS date, pf.md, pf.p, pf.mp, pf.ppm, pf.t1, pf.t2, pf.t1g, pf.t2g, pf.won, pf.k,
+    pl.competition_id
+FROM performances pf
+JOIN players pl ON pl.player_id = pf.player_id
+WHERE pf.md > (SELECT MAX(date) FROM market_values WHERE player_id = pf.player_id);
+
+CREATE TABLE IF NOT EXISTS player_features (
+    player_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    mv REAL,
+    md TEXT,
+    p REAL,
+    mp INTEGER,
+    ppm REAL,
+    t1 TEXT,
+    t2 TEXT,
+    t1g INTEGER,
+    t2g INTEGER,
+    won INTEGER,
+    k TEXT,
+    next_day TEXT,
+    next_md TEXT,
+    days_to_next INTEGER,
+    mv_next_day REAL,
+    mv_target REAL,
+    mv_change_1d REAL,
+    mv_trend_1d REAL,
+    mv_change_3d REAL,
+    mv_vol_3d REAL,
+    mv_trend_7d REAL,
+    market_divergence REAL,
+    mv_target_3d REAL,
+    mv_target_7d REAL,
+    PRIMARY KEY (player_id, date)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_player_features_date ON player_features (date);
+
+CREATE TABLE IF NOT EXISTS feature_changes (
+    player_id TEXT PRIMARY KEY,
+    since TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS feature_store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- Record the first changed date per player for the feature store, '' marks the whole history.
+-- Pruning old market values is not recorded, the stored features of the remaining days stay valid.
+CREATE TRIGGER IF NOT EXISTS market_values_insert AFTER INSERT ON market_values BEGIN
+    INSERT INTO feature_changes (player_id, since) VALUES (NEW.player_id, NEW.date)
+    ON CONFLICT (player_id) DO UPDATE SET since = MIN(since, excluded.since);
+END;
+
+CREATE TRIGGER IF NOT EXISTS market_values_update AFTER UPDATE ON market_values BEGIN
+    INSERT INTO feature_changes (player_id, since) VALUES (NEW.player_id, NEW.date)
+    ON CONFLICT (player_id) DO UPDATE SET since = MIN(since, excluded.since);
+END;
+
+CREATE TRIGGER IF NOT EXISTS performances_insert AFTER INSERT ON performances BEGIN
+    INSERT INTO feature_changes (player_id, since) VALUES (NEW.player_id, NEW.md)
+    ON CONFLICT (player_id) DO UPDATE SET since = MIN(since, excluded.since);
+END;
+
+CREATE TRIGGER IF NOT EXISTS performances_update AFTER UPDATE ON performances BEGIN
+    INSERT INTO feature_changes (player_id, since) VALUES (NEW.player_id, NEW.md)
+    ON CONFLICT (player_id) DO UPDATE SET since = MIN(since, excluded.since);
+END;
+
+CREATE TRIGGER IF NOT EXISTS performances_delete AFTER DELETE ON performances BEGIN
+    INSERT INTO feature_changes (player_id, since) VALUES (OLD.player_id, OLD.md)
+    ON CONFLICT (player_id) DO UPDATE SET since = MIN(since, excluded.since);
+END;
+
+-- The team decides which performances are kept, a transfer changes the whole history
+CREATE TRIGGER IF NOT EXISTS players_team_update AFTER UPDATE OF team_id ON players
+WHEN OLD.team_id IS NOT NEW.team_id BEGIN
+    INSERT INTO feature_changes (player_id, since) VALUES (NEW.player_id, '')
+    ON CONFLICT (player_id) DO UPDATE SET since = '';
+END;
+"""
+
+def connect(path=DB_PATH):
+    """Open the player database in WAL mode"""
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+
+    return conn
+
+def create_schema(conn):
+    """Create the tables, indexes and the player_data_1d view if they don't exist"""
+
+    # The old denormalized player_data_1d was a table, it is replaced by the view
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'player_data_1d' AND type = 'table';").fetchone():
+        conn.execute("DROP TABLE player_data_1d;")
+
+    conn.executescript(SCHEMA)
+    if conn.execute("PRAGMA user_version;").fetchone()[0] == 0:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+    conn.commit()
+
+def schema_is_current(conn):
+    """Check if the database was created with the current schema version"""
+
+    return conn.execute("PRAGMA user_version;").fetchone()[0] == SCHEMA_VERSION
+
+def split_statements(script):
+    """Split a SQL script into its statements (triggers included), so they can run with execute in a transaction"""
+
+    statements, statement = [], ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement.strip())
+            statement = ""
+
+    return statements
+
+def rebuild_schema(conn):
+    """Drop all player data and recreate the schema in its current version
+
+    Runs in the open transaction of conn (executescript would commit it), so a failed rebuild is rolled back
+    together with the writes that follow it.
+    """
+
+    if not conn.in_transaction:
+        conn.execute("BEGIN;")
+
+    conn.execute("DROP VIEW IF EXISTS player_data_1d;")
+    for table in ("player_data_1d", "players", "market_values", "performances",
+                  "player_features", "feature_changes", "feature_store_meta"):
+        conn.execute(f"DROP TABLE IF EXISTS {table};")
+
+    for statement in split_statements(SCHEMA):
+        conn.execute(statement)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION};")
+
+PLAYER_FIELDS = ["player_id", "competition_id", "team_id", "team_name", "first_name", "last_name", "position"]
+MARKET_VALUE_FIELDS = ["player_id", "date", "mv"]
+PERFORMANCE_FIELDS = ["player_id", "md", "p", "mp", "ppm", "t1", "t2", "t1g", "t2g", "won", "k"]
+
+# Columns of the wide player_data_1d frame
+PLAYER_DATA_COLUMNS = [
+    "player_id", "team_id", "team_name", "first_name", "last_name", "position",
+    "mv", "date", "md", "p", "mp", "ppm", "t1", "t2", "t1g", "t2g", "won", "k",
+    "competition_id",
+]
+
+def encode_k(values):
+    """Encode the k lists of many performances as comma separated strings in one pass"""
+
+    return [
+        ",".join(map(str, k)) if isinstance(k, list) else (None if k is None else str(k))
+        for k in values
+    ]
+
+def collect_player_columns(player_records):
+    """Collect the fetched (competition_id, player_info, market_values, performances) records into flat columns
+
+    Returns one dict of column lists per table, the values of all players are appended to the same lists.
+    The performance columns of all players are concatenated as arrays and converted to Python values once.
+    """
+
+    players = {field: [] for field in PLAYER_FIELDS}
+    market_values = {field: [] for field in MARKET_VALUE_FIELDS}
+    performance_arrays = {field: [] for field in PERFORMANCE_FIELDS}
+
+    for competition_id, info, player_mvs, player_pfms in player_records:
+        player_id = info["player_id"]
+
+        for field in PLAYER_FIELDS:
+            players[field].append(competition_id if field == "competition_id" else info[field])
+
+        market_values["player_id"].extend([player_id] * len(player_mvs))
+        market_values["date"].extend(value["date"] for value in player_mvs)
+        market_values["mv"].extend(value["mv"] for value in player_mvs)
+
+        performance_arrays["player_id"].append(np.full(len(player_pfms["md"]), player_id, dtype=object))
+        for field in PERFORMANCE_FIELDS[1:]:
+            performance_arrays[field].append(player_pfms[field])
+
+    performances = {field: [] for field in PERFORMANCE_FIELDS}
+    for field, arrays in performance_arrays.items():
+        if not arrays:
+            continue
+        column = np.concatenate(arrays)
+        if field == "md":
+            column = np.datetime_as_string(column, unit="D")
+        performances[field] = column.tolist()  # NaN is written as NULL
+
+    performances["k"] = encode_k(performances["k"])
+
+    return players, market_values, performances
+
+def write_player_records(player_records, last_mv_values, full_rebuild):
+    """Upsert the fetched (competition_id, player_info, market_values, performances) records in one transaction
+
+    Rows are only written when they are new or changed. The performances of every fetched player are
+    replaced by the fetched ones, players that were not fetched are removed and market values older
+    than last_mv_values days are pruned, so the result is the same as loading everything from scratch.
+    """
+
+    # Rows are only materialized as tuples (zip over the columns) while sqlite consumes them
+    players, market_values, performances = collect_player_columns(player_records)
+
+    conn = connect()
+    try:
+        with conn:
+            if full_rebuild:
+                rebuild_schema(conn)
+            changes_before = conn.total_changes
+
+            conn.executemany("""
+                INSERT INTO players (player_id, competition_id, team_id, team_name, first_name, last_name, position)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (player_id) DO UPDATE SET
+                    competition_id = excluded.competition_id, team_id = excluded.team_id,
+                    team_name = excluded.team_name, first_name = excluded.first_name,
+                    last_name = excluded.last_name, position = excluded.position
+                WHERE (competition_id, team_id, team_name, first_name, last_name, position)
+                    IS NOT (excluded.competition_id, excluded.team_id, excluded.team_name,
+                            excluded.first_name, excluded.last_name, excluded.position);
+            """, zip(*players.values()))
+
+            conn.executemany("""
+                INSERT INTO market_values (player_id, date, mv) VALUES (?, ?, ?)
+                ON CONFLICT (player_id, date) DO UPDATE SET mv = excluded.mv
+                WHERE mv IS NOT excluded.mv;
+            """, zip(*market_values.values()))
+
+            conn.executemany("""
+                INSERT INTO performances (player_id, md, p, mp, ppm, t1, t2, t1g, t2g, won, k)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (player_id, md) DO UPDATE SET
+                    p = excluded.p, mp = excluded.mp, ppm = excluded.ppm, t1 = excluded.t1, t2 = excluded.t2,
+                    t1g = excluded.t1g, t2g = excluded.t2g, won = excluded.won, k = excluded.k
+                WHERE (p, mp, ppm, t1, t2, t1g, t2g, won, k)
+                    IS NOT (excluded.p, excluded.mp, excluded.ppm, excluded.t1, excluded.t2,
+                            excluded.t1g, excluded.t2g, excluded.won, excluded.k);
+            """, zip(*performances.values()))
+
+            n_changed = conn.total_changes - changes_before
+
+            # Performances of fetched players that are no longer returned (e.g. rescheduled matchdays)
+            conn.execute("CREATE TEMP TABLE fetched_players (player_id TEXT PRIMARY KEY);")
+            conn.execute("CREATE TEMP TABLE fetched_performances (player_id TEXT, md TEXT, PRIMARY KEY (player_id, md));")
+            conn.executemany("INSERT OR IGNORE INTO fetched_players VALUES (?);", zip(players["player_id"]))
+            conn.executemany(
+                "INSERT OR IGNORE INTO fetched_performances VALUES (?, ?);",
+                zip(performances["player_id"], performances["md"]),
+            )
+            n_changed += conn.execute("""
+                DELETE FROM performances
+                WHERE player_id IN (SELECT player_id FROM fetched_players)
+                AND (player_id, md) NOT IN (SELECT player_id, md FROM fetched_performances);
+            """).rowcount
+
+            # Players that left the fetched competitions
+            for table in ("players", "market_values", "performances"):
+                n_changed += conn.execute(
+                    f"DELETE FROM {table} WHERE player_id NOT IN (SELECT player_id FROM fetched_players);"
+                ).rowcount
+            conn.execute("DROP TABLE fetched_players;")
+            conn.execute("DROP TABLE fetched_performances;")
+
+            # Keep only the last last_mv_values days of each player, as primary key range deletes per player
+            cutoffs = conn.execute(
+                "SELECT player_id, date(MAX(date), ?) FROM market_values GROUP BY player_id;",
+                (f"-{int(last_mv_values)} days",),
+            ).fetchall()
+            n_changed += conn.executemany(
+                "DELETE FROM market_values WHERE player_id = ? AND date <= ?;", cutoffs
+            ).rowcount
+    finally:
+        conn.close()
+
+    return n_changed
+
+def load_player_data(since=None):
+    """Load the wide player_data_1d frame, same rows as the view but joined in one merge_asof over all players
+
+    With since (ISO date) only the rows from that date on are loaded, with the same performances joined.
+    """
+
+    conn = connect()
+    try:
+        players = pd.read_sql("SELECT * FROM players", conn)
+        if since is None:
+            mv_df = pd.read_sql("SELECT player_id, date, mv FROM market_values", conn)
+            p_df = pd.read_sql("SELECT * FROM performances", conn)
+        else:
+            mv_df = pd.read_sql("SELECT player_id, date, mv FROM market_values WHERE date >= ?", conn, params=(since,))
+
+            # The latest performance up to since of every player is joined to its first rows
+            p_df = pd.read_sql("""
+                SELECT * FROM performances p
+                WHERE md >= COALESCE(
+                    (SELECT MAX(md) FROM performances q WHERE q.player_id = p.player_id AND q.md <= ?), ?
+                )
+            """, conn, params=(since, since))
+    finally:
+        conn.close()
+
+    # merge_asof needs both sides sorted by the date
+    mv_df["date"] = pd.to_datetime(mv_df["date"])
+    mv_df = mv_df.sort_values("date", kind="stable")
+    p_df["date"] = pd.to_datetime(p_df["md"])
+    p_df = p_df.sort_values("date", kind="stable")
+
+    # Latest performance up to each market value day
+    merged_df = pd.merge_asof(mv_df, p_df, on="date", by="player_id", direction="backward")
+
+    # Performances after the last market value day of a player (upcoming matchdays)
+    last_mv_date = p_df["player_id"].map(mv_df.groupby("player_id")["date"].max())
+    upcoming_df = p_df[p_df["date"] > last_mv_date]
+
+    df = pd.concat([merged_df, upcoming_df], ignore_index=True)
+    df = df.merge(players, on="player_id", how="inner")
+
+    return df[PLAYER_DATA_COLUMNS].sort_values(["player_id", "date"], ignore_index=True)
+
+def load_player_competitions():
+    """Get the competition of every stored player"""
+
+    conn = connect()
+    try:
+        rows = conn.execute("SELECT player_id, competition_id FROM players;").fetchall()
+    finally:
+        conn.close()
+
+    return dict(rows)
+
+def load_last_market_value_dates():
+    """Get the last stored market value date per player"""
+
+    conn = connect()
+    try:
+        rows = conn.execute("SELECT player_id, MAX(date) FROM market_values GROUP BY player_id;").fetchall()
+    finally:
+        conn.close()
+
+    return {player_id: pd.Timestamp(last_date) for player_id, last_date in rows}
+
+def load_last_complete_market_value_date(min_players=100):
+    """Get the most recent date with market values of at least min_players players, None if there is none"""
+
+    conn = connect()
+    try:
+        row = conn.execute("""
+            SELECT date
+            FROM market_values
+            WHERE mv IS NOT NULL
+            GROUP BY date
+            HAVING COUNT(*) >= ?
+            ORDER BY date DESC
+            LIMIT 1;
+        """, (min_players,)).fetchone()
+    finally:
+        conn.close()
+
+    return row[0] if row is not None else None
+
+def load_market_value_gaps():
+    """Get (players with missing days in their history, min days since a player's last value, players)"""
+
+    conn = connect()
+    try:
+        return conn.execute("""
+            SELECT
+                SUM(julianday(last_date) - julianday(first_date) + 1 > n_dates),
+                MIN(julianday('now') - julianday(last_date)),
+                COUNT(*)
+            FROM (
+                SELECT player_id, MIN(date) AS first_date, MAX(date) AS last_date, COUNT(*) AS n_dates
+                FROM market_values
+                GROUP BY player_id
+            );
+        """).fetchone()
+    finally:
+        conn.close()
@@ -0,0 +1,222 @@
+from features.predictions.backtesting import load_shared_arrays, save_arrays, shared
+from features.predictions.modeling import DEFAULT_ENGINE, evaluate_model, train_model
+from features.predictions.model_registry import METRIC_NAMES, hash_frame
+from sklearn.model_selection import ParameterGrid
+import concurrent.futures
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import math
+import os
+
+# Hyperparameter and feature search for the market value model
+# The data is sorted by date and cached once per data hash in tuning/<key>_<n_splits>/ as .npy files with the bounds of
+# the time-series folds, the worker processes memory-map it. Successive halving evaluates all candidates on
+# the most recent 1/eta^k of the training rows of every fold first and only keeps the best 1/eta for the next
+# round with eta times more rows. Every evaluation is appended to results.jsonl when it is done, a rerun skips
+# the ones already there.
+
+TUNING_DIR = "tuning"
+
+# Searched hyperparameters per engine, the other ones keep their MODEL_ENGINES value
+PARAM_GRIDS = {
+    "random_forest": {
+        "n_estimators": [200, 500],
+        "max_depth": [10, 20, None],
+        "min_samples_split": [5],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": ["sqrt", 0.5],
+    },
+    "hist_gradient_boosting": {
+        "max_iter": [150, 300, 600],
+        "learning_rate": [0.025, 0.05, 0.1],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [20],
+        "l2_regularization": [0.0, 1.0],
+    },
+}
+
+# Metrics where a higher value is better, the others are errors
+HIGHER_IS_BETTER = {"signs_percent", "r2"}
+
+def make_candidates(feature_sets, engine=DEFAULT_ENGINE, param_grid=None):
+    """All combinations of the hyperparameter grid and the feature sets, each with a stable key"""
+
+    param_grid = PARAM_GRIDS[engine] if param_grid is None else param_grid
+
+    candidates = []
+    for features in feature_sets:
+        for params in ParameterGrid(param_grid):
+            candidate = {"engine": engine, "params": params, "features": list(features)}
+            candidate["key"] = hashlib.sha256(json.dumps(candidate, sort_keys=True).encode()).hexdigest()[:16]
+            candidates.append(candidate)
+
+    return candidates
+
+def get_fold_bounds(dates, n_splits=3, test_fraction=0.25):
+    """Time-series folds over rows sorted by date as (train_end, val_end) row indices
+
+    The last test_fraction of the rows is cut into n_splits blocks of whole days, every fold trains on all
+    rows before its block and validates on the block.
+    """
+
+    n = len(dates)
+    bounds = []
+    for i in range(n_splits):
+        start = int(n * (1 - test_fraction + i * test_fraction / n_splits))
+        end = int(n * (1 - test_fraction + (i + 1) * test_fraction / n_splits))
+        if start >= n:
+            break
+        train_end = int(np.searchsorted(dates, dates[start], "left"))
+        val_end = int(np.searchsorted(dates, dates[end - 1], "right"))
+        if train_end > 0 and val_end > train_end and (not bounds or val_end > bounds[-1][1]):
+            bounds.append((train_end, val_end))
+
+    return bounds
+
+def prepare_data(df, features, target, n_splits=3, tuning_dir=TUNING_DIR):
+    """Cache the columns of all features, the target and the fold bounds, returns (cache directory, folds)
+
+    A cache of the same data is reused as it is.
+    """
+
+    columns = list(dict.fromkeys(features))
+    targets = [target] if isinstance(target, str) else list(target)
+    df = df.dropna(subset=targets).sort_values("date", kind="stable")
+
+    key = hash_frame(df[columns + targets + ["date"]])[:16]
+    directory = os.path.join(tuning_dir, f"{key}_{n_splits}")
+    folds_path = os.path.join(directory, "folds.json")
+
+    if not os.path.exists(folds_path):
+        os.makedirs(directory, exist_ok=True)
+        dates = df["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+        save_arrays({
+            "X": df[columns].to_numpy(dtype=float),
+            "y": df[target].to_numpy(dtype=float),
+        }, directory)
+
+        # The fold bounds are written last, a cache without them is incomplete and written again
+        with open(folds_path + ".tmp", "w") as f:
+            json.dump({"columns": columns, "folds": get_fold_bounds(dates, n_splits)}, f)
+        os.replace(folds_path + ".tmp", folds_path)
+
+    with open(folds_path) as f:
+        cache = json.load(f)
+
+    return directory, cache
+
+def evaluate_candidate(feature_idx, params, engine, train_end, val_end, fraction):
+    """Fit on the most recent fraction of the training rows of a fold and evaluate on its validation rows"""
+
+    X, y = shared["X"], shared["y"]
+    train_start = train_end - max(1, int(train_end * fraction))
+
+    X_train = X[train_start:train_end][:, feature_idx]
+    X_val = X[train_end:val_end][:, feature_idx]
+
+    model = train_model(X_train, y[train_start:train_end], params, engine, n_jobs=1)
+
+    return dict(zip(METRIC_NAMES, map(float, evaluate_model(model, X_val, y[train_end:val_end]))))
+
+def load_results(path):
+    """Evaluations of an earlier run, a line cut off by an interrupt is dropped from the file"""
+
+    results = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+
+        # Rewrite the complete lines, so new evaluations are not appended to a cut off one
+        with open(path + ".tmp", "w") as f:
+            f.writelines(json.dumps(result) + "\n" for result in results)
+        os.replace(path + ".tmp", path)
+
+    return results
+
+def score_candidates(results, fraction, metric):
+    """Mean metric per candidate key over the folds evaluated with fraction of the rows"""
+
+    scores = {}
+    for result in results:
+        if result["fraction"] == fraction:
+            scores.setdefault(result["candidate"], []).append(result[metric])
+
+    return {key: float(np.mean(values)) for key, values in scores.items()}
+
+def tune(df, feature_sets, target, engine=DEFAULT_ENGINE, param_grid=None, metric="rmse", eta=3, n_rounds=3,
+         n_splits=3, max_workers=None, tuning_dir=TUNING_DIR):
+    """Successive halving search over the hyperparameters and feature sets, resumes an interrupted search
+
+    Returns one row per candidate and round with the mean metrics over the folds, the best candidate of the
+    last round first.
+    """
+
+    candidates = make_candidates(feature_sets, engine, param_grid)
+    all_features = [feature for features in feature_sets for feature in features]
+    directory, cache = prepare_data(df, all_features, target, n_splits, tuning_dir)
+    columns, folds = cache["columns"], cache["folds"]
+
+    results_path = os.path.join(directory, "results.jsonl")
+    results = load_results(results_path)
+    done = {(result["candidate"], result["fold"], result["fraction"]) for result in results}
+
+    fractions = [1 / eta ** k for k in reversed(range(n_rounds))]
+    higher_is_better = metric in HIGHER_IS_BETTER
+    survivors = candidates
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=load_shared_arrays, initargs=(directory,),
+    ) as executor, open(results_path, "a") as results_file:
+
+        for round_idx, fraction in enumerate(fractions):
+            futures = {}
+            for candidate in survivors:
+                feature_idx = [columns.index(feature) for feature in candidate["features"]]
+                for fold, (train_end, val_end) in enumerate(folds):
+                    if (candidate["key"], fold, fraction) in done:
+                        continue
+                    future = executor.submit(
+                        evaluate_candidate, feature_idx, candidate["params"], engine,
+                        train_end, val_end, fraction,
+                    )
+                    futures[future] = (candidate["key"], fold)
+
+            # Persist every evaluation as soon as it is done
+            for future in concurrent.futures.as_completed(futures):
+                key, fold = futures[future]
+                result = {"candidate": key, "fold": fold, "fraction": fraction, **future.result()}
+                results_file.write(json.dumps(result) + "\n")
+                results_file.flush()
+                results.append(result)
+                done.add((key, fold, fraction))
+
+            print(f"Round {round_idx + 1}/{len(fractions)}: {len(survivors)} candidates on {fraction:.0%} of the rows")
+
+            if round_idx < len(fractions) - 1:
+                scores = score_candidates(results, fraction, metric)
+                survivors = sorted(survivors, key=lambda c: scores[c["key"]], reverse=higher_is_better)
+                survivors = survivors[:max(1, math.ceil(len(survivors) / eta))]
+
+    return summarize_tuning(candidates, results, metric)
+
+def summarize_tuning(candidates, results, metric="rmse"):
+    """One row per candidate and round with the mean metrics over the folds, best of the last round first"""
+
+    by_key = {candidate["key"]: candidate for candidate in candidates}
+    results_df = pd.DataFrame([result for result in results if result["candidate"] in by_key])
+    if results_df.empty:
+        return results_df
+
+    summary_df = results_df.groupby(["candidate", "fraction"], as_index=False)[METRIC_NAMES].mean()
+    summary_df["features"] = summary_df["candidate"].map(lambda key: by_key[key]["features"])
+    summary_df["params"] = summary_df["candidate"].map(lambda key: by_key[key]["params"])
+
+    return summary_df.sort_values(
+        ["fraction", metric], ascending=[False, metric not in HIGHER_IS_BETTER]
+    ).reset_index(drop=True)
@@ -0,0 +1,248 @@
+from features.predictions.predictions import live_data_predictions, join_current_market, join_current_squad
+from features.predictions.preprocessing import preprocess_player_data, split_data, get_recent_train_data
+from features.predictions.modeling import UPDATE_WINDOW_DAYS
+from features.predictions.model_registry import get_model
+from features.predictions.data_handler import (
+    create_player_data_table,
+    check_if_data_reload_needed,
+    save_player_data_to_db_async,
+    update_player_features,
+    load_player_features_from_db,
+)
+from features.daemon import REFRESH_DELAY, RETRY_DELAY
+from kickbase_api.league import get_leagues_infos, get_league_players_on_market
+from kickbase_api.user import get_players_in_squad
+from kickbase_api.cache import next_market_value_update
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from collections import namedtuple
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import threading
+import json
+import time
+
+# Local HTTP service answering recommendation requests from memory
+#   GET /predict?player_id=<id>    predictions of a player
+#   GET /market?league=<name|id>   market players worth bidding on, see join_current_market
+#   GET /squad?league=<name|id>    predictions of the squad players, see join_current_squad
+# The model and the latest feature row of every player (today_df of preprocess_player_data) are kept in memory
+# with the predictions of all players, rendered once per snapshot, so /predict is a lookup. The market and squad
+# of a league are fetched at most every LIVE_TTL seconds and the joined response is cached until they or the
+# snapshot change. After the market value update the snapshot is rebuilt in the background, the old one keeps
+# answering until the new one is ready.
+
+LIVE_TTL = 60   # seconds the market and squad of a league are reused
+
+Snapshot = namedtuple("Snapshot", ["version", "model", "today_df", "predictions", "players", "expires_at"])
+
+def load_model_and_features(token, pipeline):
+    """Update the player data and features, returns (model, today_df) like daily_predictions.py"""
+
+    features, target = pipeline["features"], pipeline["target"]
+
+    create_player_data_table()
+    save_player_data_to_db_async(
+        token, pipeline["competition_ids"], pipeline["last_mv_values"], pipeline["last_pfm_values"],
+        check_if_data_reload_needed(), incremental=pipeline["incremental_ingestion"],
+        max_in_flight=pipeline["max_in_flight"],
+    )
+    update_player_features()
+
+    proc_player_df, today_df = preprocess_player_data(load_player_features_from_db())
+    X_train, X_test, y_train, y_test = split_data(proc_player_df, features, target)
+    recent = get_recent_train_data(proc_player_df, features, target, UPDATE_WINDOW_DAYS) if pipeline["incremental_training"] else None
+    model, _, _, _ = get_model(
+        X_train, y_train, X_test, y_test, features, target, recent=recent, engine=pipeline["model_engine"],
+    )
+
+    return model, today_df
+
+def to_json(df):
+    """JSON list of the rows of df"""
+
+    return df.to_json(orient="records", date_format="iso").encode()
+
+class PredictionService:
+    """Predictions, market and squad recommendations of one account, kept in memory"""
+
+    def __init__(self, session, pipeline, live_ttl=LIVE_TTL):
+        self.session = session      # daemon.Session of the account
+        self.pipeline = pipeline    # features, target, competition_ids and the ingestion and training settings
+        self.live_ttl = live_ttl
+
+        self.snapshot = None
+        self.leagues = []
+        self.live = {}          # (kind, league_id) -> (fetched_at, data)
+        self.responses = {}     # (kind, league_id) -> (snapshot version, fetched_at, body)
+        self._lock = threading.Lock()
+        self._live_locks = {}
+        self._refreshing = False
+        self._retry_at = 0.0    # time.monotonic() a failed refresh may be tried again
+
+    def refresh(self):
+        """Build a new snapshot, the model, the feature rows and the rendered predictions of all players"""
+
+        model, today_df = self.session.call(load_model_and_features, self.pipeline)
+        predictions = live_data_predictions(today_df, model, self.pipeline["features"])
+        players = {
+            str(player_id): json.dumps(record, separators=(",", ":")).encode()
+            for player_id, record in zip(predictions["player_id"], json.loads(to_json(predictions)))
+        }
+
+        version = self.snapshot.version + 1 if self.snapshot is not None else 1
+        self.snapshot = Snapshot(version, model, today_df, predictions, players, next_market_value_update() + REFRESH_DELAY)
+        self.leagues = self.session.call(get_leagues_infos)
+        print(f"\nSnapshot {version} loaded, {len(players)} players, valid until {self.snapshot.expires_at:%Y-%m-%d %H:%M}.")
+
+        return self.snapshot
+
+    def refresh_in_background(self):
+        """Rebuild the snapshot in a thread, the current one keeps answering meanwhile
+
+        A failed rebuild is tried again after RETRY_DELAY seconds, not on the next request.
+        """
+
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._retry_at:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Warning: Snapshot refresh failed, retrying in {RETRY_DELAY} s: {e!r}")
+                self._retry_at = time.monotonic() + RETRY_DELAY
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def current(self):
+        """Current snapshot, starts its rebuild once the market value update passed"""
+
+        snapshot = self.snapshot
+        if datetime.now(ZoneInfo("Europe/Berlin")) >= snapshot.expires_at:
+            self.refresh_in_background()
+
+        return snapshot
+
+    def find_league(self, league):
+        """League of the account by id or name, None if there is none"""
+
+        for info in self.leagues:
+            if league in (str(info["id"]), info["name"]):
+                return info
+
+        return None
+
+    def fetch_live(self, kind, league_id):
+        """Market or squad of a league, fetched again after live_ttl seconds, returns (fetched_at, data)"""
+
+        key = (kind, league_id)
+        with self._lock:
+            lock = self._live_locks.setdefault(key, threading.Lock())
+
+        # One fetch per league and kind at a time, the other requests wait for its result
+        with lock:
+            cached = self.live.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.live_ttl:
+                return cached
+
+            fetch = get_league_players_on_market if kind == "market" else get_players_in_squad
+            self.live[key] = (time.monotonic(), self.session.call(fetch, league_id))
+            return self.live[key]
+
+    def predict(self, player_id):
+        """Rendered predictions of a player, None if the player is unknown"""
+
+        return self.current().players.get(str(player_id))
+
+    def recommendations(self, kind, league):
+        """Rendered market ("market") or squad ("squad") recommendations of a league, None if the league is unknown"""
+
+        snapshot = self.current()
+        info = self.find_league(league)
+        if info is None:
+            return None
+
+        league_id = info["id"]
+        fetched_at, data = self.fetch_live(kind, league_id)
+
+        cached = self.responses.get((kind, league_id))
+        if cached is not None and cached[:2] == (snapshot.version, fetched_at):
+            return cached[2]
+
+        join = join_current_market if kind == "market" else join_current_squad
+        body = to_json(join(self.session.token, league_id, snapshot.predictions, data))
+        self.responses[(kind, league_id)] = (snapshot.version, fetched_at, body)
+
+        return body
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer with a listen backlog for many concurrent connections"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+def service_handler(service):
+    """Request handler class of the endpoints of service"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body are written separately, don't wait for the ACK in between
+
+        def send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def error(self, status, message):
+            self.send(status, json.dumps({"error": message}).encode())
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+            if service.snapshot is None:
+                return self.error(503, "predictions are loading")
+
+            try:
+                if parts.path == "/predict":
+                    if "player_id" not in query:
+                        return self.error(400, "player_id missing")
+                    body = service.predict(query["player_id"])
+                    missing = f"unknown player {query['player_id']}"
+                elif parts.path in ("/market", "/squad"):
+                    if "league" not in query:
+                        return self.error(400, "league missing")
+                    body = service.recommendations(parts.path[1:], query["league"])
+                    missing = f"unknown league {query['league']}"
+                else:
+                    return self.error(404, f"unknown endpoint {parts.path}")
+            except Exception as e:
+                print(f"Warning: Request {self.path} failed: {e!r}")
+                return self.error(502, repr(e))
+
+            if body is None:
+                return self.error(404, missing)
+            self.send(200, body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def serve(service, host="127.0.0.1", port=8000):
+    """Serve the endpoints of service until interrupted"""
+
+    httpd = ServiceHTTPServer((host, port), service_handler(service))
+    print(f"\nServing predictions on http://{host}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        httpd.server_close()
@@ -0,0 +1,120 @@
+from kickbase_api.tracing import tracer
+import concurrent.futures
+import time
+
+# Concurrent execution of a pipeline given as a dependency graph of stages
+# Every stage is a dict with its function ("func") and the stages whose results it needs ("after"), the
+# function is called with these results as keyword arguments. A stage starts as soon as all stages it needs are
+# done and independent stages run concurrently in a thread pool, so a run takes as long as its longest chain
+# (the critical path) instead of the sum of all stages. A failed stage only skips the stages that need its
+# result, its "optional" dependents get None instead.
+# Stages that overlap share the process, their traced peak memory and HTTP calls include each other's.
+
+def check_stage_graph(stages):
+    """Raise a ValueError if a stage needs an unknown stage or the stages depend on each other in a cycle"""
+
+    for name, stage in stages.items():
+        unknown = set(stage.get("after", [])) - set(stages)
+        if unknown:
+            raise ValueError(f"Stage {name} needs unknown stages {sorted(unknown)}")
+
+    resolved = set()
+    while len(resolved) < len(stages):
+        ready = [name for name, stage in stages.items()
+                 if name not in resolved and set(stage.get("after", [])) <= resolved]
+        if not ready:
+            raise ValueError(f"Stages {sorted(set(stages) - resolved)} depend on each other in a cycle")
+        resolved.update(ready)
+
+def run_stage(name, func, kwargs, started):
+    """Run a stage in a tracer stage, returns (result, timing), a failure is caught and printed"""
+
+    start = time.perf_counter()
+    try:
+        with tracer.stage(name):
+            result = func(**kwargs)
+        status, error = "done", None
+    except Exception as e:
+        print(f"Warning: Stage {name} failed: {e!r}")
+        result, status, error = None, "failed", repr(e)
+    end = time.perf_counter()
+
+    return result, {
+        "status": status,
+        "start": start - started,
+        "end": end - started,
+        "seconds": end - start,
+        "error": error,
+    }
+
+def run_stage_graph(stages, max_workers=None):
+    """Run the stages as soon as the stages they need are done, returns ({stage: result}, {stage: timing})
+
+    timing holds the status ("done", "failed" or "skipped"), the start and end in seconds since the start of
+    the run and the error of a failed stage.
+    """
+
+    check_stage_graph(stages)
+
+    results, timings = {}, {}
+    pending = dict(stages)
+    running = {}
+    started = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(stages)) as executor:
+        while pending or running:
+
+            # Skip the stages that need a failed or skipped stage, start the ones whose stages are all done
+            changed = True
+            while changed:
+                changed = False
+                for name, stage in list(pending.items()):
+                    after = stage.get("after", [])
+                    required = [dep for dep in after if dep not in stage.get("optional", [])]
+
+                    missing = [dep for dep in required if timings.get(dep, {}).get("status") in ("failed", "skipped")]
+                    if missing:
+                        now = time.perf_counter() - started
+                        timings[name] = {"status": "skipped", "start": now, "end": now, "seconds": 0.0,
+                                         "error": f"needs {missing}"}
+                        print(f"Warning: Stage {name} skipped, it needs the unfinished stages {missing}")
+                        del pending[name]
+                        changed = True
+                    elif all(dep in timings for dep in after):
+                        kwargs = {dep: results.get(dep) for dep in after}
+                        running[executor.submit(run_stage, name, stage["func"], kwargs, started)] = name
+                        del pending[name]
+                        changed = True
+
+            if not running:
+                break
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result, timings[name] = future.result()
+                if timings[name]["status"] == "done":
+                    results[name] = result
+
+    return results, timings
+
+def critical_path(stages, timings):
+    """Chain of stages that determined the run time, from the first stage to the one that finished last
+
+    Walks back from the last finished stage, always through the stage it needed that finished last.
+    """
+
+    finished = {name: timing for name, timing in timings.items() if timing["status"] != "skipped"}
+    if not finished:
+        return []
+
+    name = max(finished, key=lambda stage: finished[stage]["end"])
+    path = [name]
+    while True:
+        needed = [dep for dep in stages[name].get("after", []) if dep in finished]
+        if not needed:
+            break
+        name = max(needed, key=lambda stage: finished[stage]["end"])
+        path.append(name)
+
+    return path[::-1]
@@ -0,0 +1,180 @@
+from kickbase_api.config import (
+    BASE_URL,
+    MAX_RETRIES,
+    REQUEST_TIMEOUT,
+    RETRY_STATUS_CODES,
+    backoff_delay,
+    client,
+    endpoint_key,
+    parse_retry_after,
+)
+from kickbase_api.cache import revalidation_headers
+from kickbase_api.others import parse_all_teams
+from kickbase_api.player import (
+    parse_player_info,
+    parse_player_market_value,
+    parse_player_performance,
+    parse_team_roster,
+)
+from kickbase_api.tracing import traced
+import asyncio
+import aiohttp
+import json
+import time
+
+# Asyncio variants of the kickbase_api functions, used for the concurrent ingestion
+
+MAX_IN_FLIGHT = 32  # amount of requests in flight at the same time
+
+class AsyncKickbaseClient:
+    """Asyncio HTTP client for the Kickbase API, all requests share one bounded semaphore"""
+
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES):
+        self.max_in_flight = max_in_flight
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.max_retries = max_retries
+        self.stats = client.stats  # share the counters and the response cache with the sync client
+        self.cache = client.cache
+        self.cache_stats = client.cache_stats
+        self.traffic = client.traffic
+        self.token_limits = client.token_limits
+        self.session = None
+        self.semaphore = None
+
+    async def __aenter__(self):
+        # Replayed responses need no connections
+        if self.traffic is not None and self.traffic.replaying:
+            return self
+
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_in_flight),
+            timeout=self.timeout,
+            headers={"Accept": "application/json", "Accept-Encoding": "gzip, deflate"},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.session is not None:
+            await self.session.close()
+
+    async def request(self, url, token=None, headers=None):
+        """GET a URL and return (status, headers, body), retrying on connection errors, 429 and 5xx"""
+
+        endpoint = endpoint_key(url)
+        headers = dict(headers or {})
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+
+        limit = self.token_limits.get(token)
+
+        attempt = 0
+        while True:
+            if limit is not None:
+                await asyncio.sleep(limit.reserve())
+
+            retry_after = None
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    async with self.session.get(url, headers=headers) as resp:
+                        body = await resp.read()
+                        self.stats.add(endpoint, requests=1, bytes=len(body), seconds=time.perf_counter() - start)
+
+                        if resp.status not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                            resp.raise_for_status()
+                            return resp.status, resp.headers, body
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    self.stats.add(endpoint, requests=1, errors=1, seconds=time.perf_counter() - start)
+                    if attempt >= self.max_retries:
+                        raise
+
+            # Back off outside of the semaphore, so other requests can use the slot
+            self.stats.add(endpoint, retries=1)
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    async def get_json(self, url, token=None):
+        """GET a URL and return the decoded JSON body, recorded or replayed if a traffic archive is set"""
+
+        if self.traffic is not None:
+            return await self.traffic.call_async("GET", url, lambda: self.fetch_json(url, token))
+
+        return await self.fetch_json(url, token)
+
+    async def fetch_json(self, url, token=None):
+        """GET a URL and return the decoded JSON body, served from the response cache where possible"""
+
+        endpoint = endpoint_key(url)
+        expires_at = self.cache.expires_at(endpoint)
+        if expires_at is None:
+            _, _, body = await self.request(url, token)
+            return json.loads(body)
+
+        # On bypass the cache is not read, but still refreshed with the new response
+        entry = None if self.cache.bypass else self.cache.get(url)
+        if self.cache.is_fresh(entry):
+            self.cache_stats.add(endpoint, hits=1)
+            return json.loads(entry.body)
+
+        status, headers, body = await self.request(url, token, revalidation_headers(entry))
+
+        if status == 304 and entry is not None:
+            self.cache.touch(url, expires_at)
+            self.cache_stats.add(endpoint, revalidated=1)
+            return json.loads(entry.body)
+
+        self.cache.put(url, body, headers.get("ETag"), headers.get("Last-Modified"), expires_at)
+        self.cache_stats.add(endpoint, misses=1)
+        return json.loads(body)
+
+@traced
+async def get_all_teams_async(aclient, token, competition_id):
+    """Get all teams in a competition."""
+
+    url = f"{BASE_URL}/competitions/{competition_id}/table"
+    data = await aclient.get_json(url, token)
+
+    return parse_all_teams(data)
+
+@traced
+async def get_competition_roster_async(aclient, token, competition_id):
+    """Get all players in a competition with their team, names and position, fetching the team profiles concurrently."""
+
+    teams = await get_all_teams_async(aclient, token, competition_id)
+
+    profiles = await asyncio.gather(*(
+        aclient.get_json(f"{BASE_URL}/competitions/{competition_id}/teams/{team['team_id']}/teamprofile", token)
+        for team in teams
+    ))
+
+    return [player for team, data in zip(teams, profiles) for player in parse_team_roster(data, team)]
+
+@traced
+async def get_player_info_async(aclient, token, competition_id, player_id):
+    """Get basic information about a player."""
+
+    url = f"{BASE_URL}/competitions/{competition_id}/players/{player_id}"
+    data = await aclient.get_json(url, token)
+
+    return parse_player_info(data)
+
+@traced
+async def get_player_market_value_async(aclient, token, competition_id, player_id, last_mv_values, timeframe=365):
+    """Get the market value history of a player."""
+
+    # timeframe is the amount of last values to retrieve, see MV_TIMEFRAMES
+    url = f"{BASE_URL}/competitions/{competition_id}/players/{player_id}/marketvalue/{timeframe}"
+    data = await aclient.get_json(url, token)
+
+    return parse_player_market_value(data, last_mv_values)
+
+@traced
+async def get_player_performance_async(aclient, token, competition_id, player_id, last_pfm_values, player_team):
+    """Get the performance history of a player, including different metrics."""
+
+    url = f"{BASE_URL}/competitions/{competition_id}/players/{player_id}/performance"
+    data = await aclient.get_json(url, token)
+
+    return parse_player_performance(data, last_pfm_values, player_team)
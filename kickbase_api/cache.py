@@ -0,0 +1,132 @@
+from collections import namedtuple
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import threading
+import sqlite3
+import time
+import os
+
+# Persistent on-disk cache for Kickbase API responses
+
+CACHE_PATH = "kickbase_cache.db"
+
+UNTIL_UPDATE = "until_update"   # cache until the next market value update at 22:15 (Europe/Berlin)
+
+# How long responses of an endpoint stay fresh, endpoints without a rule are never cached.
+# Only competition wide endpoints are listed, league and user endpoints depend on the token.
+TTL_RULES = {
+    "/competitions/{id}/table": timedelta(hours=1),
+    "/competitions/{id}/matchdays": timedelta(days=1),
+    "/competitions/{id}/teams/{id}/teamprofile": timedelta(days=7),
+    "/competitions/{id}/players/{id}": timedelta(days=7),
+    "/competitions/{id}/players/{id}/performance": timedelta(hours=1),
+    "/competitions/{id}/players/{id}/marketvalue/{id}": UNTIL_UPDATE,
+}
+
+CachedResponse = namedtuple("CachedResponse", ["body", "etag", "last_modified", "expires_at"])
+
+def next_market_value_update(now=None):
+    """Get the next market value update (22:15 Europe/Berlin) after now"""
+
+    now = now or datetime.now(ZoneInfo("Europe/Berlin"))
+    update = now.replace(hour=22, minute=15, second=0, microsecond=0)
+    if now >= update:
+        update += timedelta(days=1)
+
+    return update
+
+class ResponseCache:
+    """SQLite backed response cache with per-endpoint TTLs and ETag / Last-Modified validators"""
+
+    def __init__(self, path=CACHE_PATH, rules=TTL_RULES, bypass=False):
+        self.path = path
+        self.rules = rules
+        self.bypass = bypass or os.getenv("KICKBASE_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL
+            );
+            """)
+            self._conn.commit()
+
+        return self._conn
+
+    def expires_at(self, endpoint, now=None):
+        """Get the expiry (unix timestamp) of a response fetched now, None if the endpoint is not cached"""
+
+        rule = self.rules.get(endpoint)
+        if rule is None:
+            return None
+
+        now = now or datetime.now(ZoneInfo("Europe/Berlin"))
+        if rule == UNTIL_UPDATE:
+            return next_market_value_update(now).timestamp()
+
+        return (now + rule).timestamp()
+
+    def get(self, url):
+        """Get the cached response of a URL, None if there is none"""
+
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT body, etag, last_modified, expires_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+
+        return CachedResponse(*row) if row is not None else None
+
+    def is_fresh(self, entry):
+        """Check if a cached response can be used without asking the server"""
+
+        return entry is not None and entry.expires_at > time.time()
+
+    def put(self, url, body, etag, last_modified, expires_at):
+        """Store a response"""
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, expires_at),
+            )
+            conn.commit()
+
+    def touch(self, url, expires_at):
+        """Extend the expiry of a response the server confirmed as unchanged"""
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("UPDATE responses SET expires_at = ? WHERE url = ?", (expires_at, url))
+            conn.commit()
+
+    def clear(self):
+        """Remove all cached responses"""
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM responses;")
+            conn.commit()
+
+def revalidation_headers(entry):
+    """Conditional request headers for a stale cached response"""
+
+    headers = {}
+    if entry is None:
+        return headers
+
+    if entry.etag:
+        headers["If-None-Match"] = entry.etag
+    if entry.last_modified:
+        headers["If-Modified-Since"] = entry.last_modified
+
+    return headers
@@ -1,11 +1,231 @@
+from kickbase_api.cache import ResponseCache, revalidation_headers
+from kickbase_api.traffic import TrafficArchive
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from collections import defaultdict
+import threading
 import requests
+import json
+import random
+import time
+import os
+import re
 
-BASE_URL = "https://api.kickbase.com/v4"
+# Can be pointed to a local stand-in of the API, e.g. benchmarks/stand_in_api.py
+BASE_URL = os.getenv("KICKBASE_BASE_URL", "https://api.kickbase.com/v4").rstrip("/")
+
+MAX_WORKERS = 12            # amount of parallel workers used for fetching, also the size of the connection pool
+REQUEST_TIMEOUT = (5, 30)   # (connect, read) timeout in seconds
+MAX_RETRIES = 5             # retries per request on connection errors, 429 and 5xx
+BACKOFF_BASE = 0.5          # first backoff delay in seconds, doubled on every retry
+BACKOFF_MAX = 30            # upper bound for a single backoff delay in seconds
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def endpoint_key(url):
+    """Normalize a URL to its endpoint, e.g. /competitions/{id}/players/{id}/performance"""
+
+    path = urlsplit(url).path
+    if path.startswith("/v4"):
+        path = path[len("/v4"):]
+
+    # Replace ids (numeric path segments) with a placeholder
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+def backoff_delay(attempt, retry_after=None):
+    """Delay before the next retry, jittered exponential backoff or the server's Retry-After"""
+
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX)
+
+    # Full jitter, see "Exponential Backoff And Jitter" (AWS Architecture Blog)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds, None if missing or invalid"""
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class EndpointStats:
+    """Thread-safe counters per endpoint, by default requests, retries and bytes"""
+
+    def __init__(self, fields=("requests", "retries", "bytes", "errors", "seconds")):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: dict.fromkeys(fields, 0))
+
+    def add(self, endpoint, **counts):
+        with self._lock:
+            entry = self._stats[endpoint]
+            for name, value in counts.items():
+                entry[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(entry) for endpoint, entry in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+class RateLimit:
+    """Token bucket allowing rate requests per second with bursts of up to burst requests, shared by all threads"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a request from the bucket, returns the seconds to wait before sending it"""
+
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            return max(0.0, -self.tokens / self.rate)
+
+
+class KickbaseClient:
+    """Shared HTTP client with connection pooling, timeouts and retries for the Kickbase API"""
+
+    def __init__(self, pool_size=MAX_WORKERS, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, cache=None,
+                 traffic=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stats = EndpointStats()
+        self.cache = cache if cache is not None else ResponseCache()
+        self.cache_stats = EndpointStats(fields=("hits", "misses", "revalidated"))
+        self.traffic = traffic  # TrafficArchive in record or replay mode, see traffic.py
+        self.token_limits = {}  # RateLimit per token, e.g. per account of the advisor daemon
+
+        # Keep-alive connection pool, sized to the amount of parallel workers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+
+    def request(self, method, url, token=None, **kwargs):
+        """Send a request, retrying on connection errors, 429 and 5xx with backoff"""
+
+        endpoint = endpoint_key(url)
+        headers = kwargs.pop("headers", {})
+        if token is not None:
+            headers["Authorization"] = f"Bearer {token}"
+
+        limit = self.token_limits.get(token)
+
+        attempt = 0
+        while True:
+            if limit is not None:
+                time.sleep(limit.reserve())
+
+            start = time.perf_counter()
+            try:
+                resp = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.stats.add(endpoint, requests=1, errors=1, seconds=time.perf_counter() - start)
+                if attempt >= self.max_retries:
+                    raise
+                retry_after = None
+            else:
+                self.stats.add(
+                    endpoint,
+                    requests=1,
+                    bytes=len(resp.content),
+                    seconds=time.perf_counter() - start,
+                )
+                if resp.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    resp.raise_for_status()
+                    return resp
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+
+            self.stats.add(endpoint, retries=1)
+            time.sleep(backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    def get_json(self, url, token=None):
+        """GET a URL and return the decoded JSON body, recorded or replayed if a traffic archive is set."""
+
+        if self.traffic is not None:
+            return self.traffic.call("GET", url, lambda: self.fetch_json(url, token))
+
+        return self.fetch_json(url, token)
+
+    def fetch_json(self, url, token=None):
+        """GET a URL and return the decoded JSON body, served from the response cache where possible."""
+
+        endpoint = endpoint_key(url)
+        expires_at = self.cache.expires_at(endpoint)
+        if expires_at is None:
+            return self.request("GET", url, token=token).json()
+
+        # On bypass the cache is not read, but still refreshed with the new response
+        entry = None if self.cache.bypass else self.cache.get(url)
+        if self.cache.is_fresh(entry):
+            self.cache_stats.add(endpoint, hits=1)
+            return json.loads(entry.body)
+
+        resp = self.request("GET", url, token=token, headers=revalidation_headers(entry))
+
+        if resp.status_code == 304 and entry is not None:
+            self.cache.touch(url, expires_at)
+            self.cache_stats.add(endpoint, revalidated=1)
+            return json.loads(entry.body)
+
+        self.cache.put(url, resp.content, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), expires_at)
+        self.cache_stats.add(endpoint, misses=1)
+        return resp.json()
+
+    def post_json(self, url, payload, token=None):
+        """POST a JSON payload to a URL and return the decoded JSON body."""
+
+        # The payload is not part of the archive key, it holds the credentials on login
+        if self.traffic is not None:
+            return self.traffic.call("POST", url, lambda: self.request("POST", url, token=token, json=payload).json())
+
+        return self.request("POST", url, token=token, json=payload).json()
+
+
+# Shared client, used by all modules of kickbase_api
+# KICKBASE_RECORD=<archive> records its traffic, KICKBASE_REPLAY=<archive> replays it without network
+client = KickbaseClient(traffic=TrafficArchive.from_env())
 
 def get_json_with_token(url, token):
     """Fetch JSON data from a given URL using token for authorization."""
 
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(url, headers=headers)
-    resp.raise_for_status()
-    return resp.json()
\ No newline at end of file
+    return client.get_json(url, token)
+
+def get_request_stats():
+    """Get the per-endpoint counters of the shared client."""
+
+    return client.stats.snapshot()
+
+def get_cache_stats():
+    """Get the per-endpoint hit/miss counters of the response cache."""
+
+    return client.cache_stats.snapshot()
@@ -1,11 +1,21 @@
 from kickbase_api.config import BASE_URL, get_json_with_token
+from kickbase_api.tracing import traced
 
 # All functions related to league data
 
+ACTIVITIES_PAGE_SIZE = 500  # entries per request when paging through the activity feed
+
+@traced
 def get_league_id(token, league_name):
     """Get the league ID based on the league name."""
 
     league_infos = get_leagues_infos(token)
+    league = select_league(league_infos, league_name)
+
+    return league["id"] if league is not None else None
+
+def select_league(league_infos, league_name):
+    """Select the league with the given name from the league infos, falls back to the first league."""
 
     if not league_infos:
         print("Warning: You are not part of any league.")
@@ -21,10 +31,11 @@ def get_league_id(token, league_name):
             f"Warning: No league found with name '{league_name}'. "
             f"Falling back to the first available league: '{fallback_league['name']}'"
         )
-        return fallback_league["id"]
+        return fallback_league
 
-    return selected_league[0]["id"]
+    return selected_league[0]
 
+@traced
 def get_leagues_infos(token):
     """Get information about all leagues the user is part of."""
 
@@ -36,21 +47,44 @@ def get_leagues_infos(token):
     for item in data.get("it", []):
         result.append({
             "id": item.get("i"),
-            "name": item.get("n")
+            "name": item.get("n"),
+            "competition_id": item.get("cpi"),
         })
 
     return result
 
+@traced
 def get_league_activities(token, league_id, league_start_date):
     """Get league activities such as trades, logins, and achievements since the league start date."""
 
-    # TODO magic number with 5000, have to find a better solution
-    url = f"{BASE_URL}/leagues/{league_id}/activitiesFeed?max=5000"
+    entries = []
+    start = 0
+    while True:
+        page = get_league_activities_page(token, league_id, start)
+        entries.extend(page)
+
+        # The feed is sorted newest first, stop at the end or before the league start date
+        if len(page) < ACTIVITIES_PAGE_SIZE or page[-1].get("dt", "") < league_start_date:
+            break
+        start += len(page)
+
+    return parse_league_activities(entries, league_start_date)
+
+@traced
+def get_league_activities_page(token, league_id, start=0, max_entries=ACTIVITIES_PAGE_SIZE):
+    """Get a page of the league activity feed (newest first), the entries from start on."""
+
+    url = f"{BASE_URL}/leagues/{league_id}/activitiesFeed?start={start}&max={max_entries}"
     data = get_json_with_token(url, token)
 
+    return data.get("af", [])
+
+def parse_league_activities(entries, league_start_date):
+    """Split activity feed entries since the league start date into trades, logins and achievements."""
+
     # Filter out entries prior to reset_Date
     filtered_activities = []
-    for entry in data["af"]:
+    for entry in entries:
         entry_date = entry.get("dt", "")
         if entry_date >= league_start_date:
             filtered_activities.append(entry)
@@ -66,6 +100,7 @@ def get_league_activities(token, league_id, league_start_date):
 
     return trading, login, achievements
 
+@traced
 def get_league_players_on_market(token, league_id):
     """Get all players currently available on the market in the league."""
 
@@ -83,11 +118,24 @@ def get_league_players_on_market(token, league_id):
 
     return result
 
+@traced
+def get_league_ranking_data(token, league_id):
+    """Get the raw league ranking, the managers with their IDs and points, see parse_league_ranking and parse_managers."""
+
+    url = f"{BASE_URL}/leagues/{league_id}/ranking"
+
+    return get_json_with_token(url, token)
+
+@traced
 def get_league_ranking(token, league_id):
     """Get the overall league ranking."""
-    
-    url = f"{BASE_URL}/leagues/{league_id}/ranking"
-    data = get_json_with_token(url, token)
+
+    data = get_league_ranking_data(token, league_id)
+
+    return parse_league_ranking(data)
+
+def parse_league_ranking(data):
+    """Parse the league ranking response into (name, points) tuples, best first."""
 
     players = [(user["n"], user["sp"]) for user in data["us"]]
 
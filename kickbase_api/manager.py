@@ -1,17 +1,25 @@
 from kickbase_api.config import BASE_URL, get_json_with_token
+from kickbase_api.league import get_league_ranking_data
+from kickbase_api.tracing import traced
 
 # All functions related to manager data
 
+@traced
 def get_managers(token, league_id):
     """Get a list of all managers in the league with their IDs and names."""
 
-    url = f"{BASE_URL}/leagues/{league_id}/ranking"
-    data = get_json_with_token(url, token)
+    data = get_league_ranking_data(token, league_id)
+
+    return parse_managers(data)
+
+def parse_managers(data):
+    """Parse the league ranking response into (name, ID) tuples of all managers."""
 
     user_info = [(user["n"], user["i"]) for user in data["us"]]
 
     return user_info
 
+@traced
 def get_manager_info(token, league_id, manager_id):
     """Get detailed information about a specific manager in the league."""
 
@@ -20,6 +28,7 @@ def get_manager_info(token, league_id, manager_id):
 
     return data
 
+@traced
 def get_manager_performance(token, league_id, manager_id, manager_name):
     """Get performance data for a specific manager in the league."""
 
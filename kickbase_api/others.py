@@ -1,15 +1,21 @@
 from kickbase_api.config import BASE_URL, get_json_with_token
+from kickbase_api.tracing import traced
 from datetime import datetime
-import requests
 
 # All other functions that don't fit anywhere else
 
+@traced
 def get_all_teams(token, competition_id):
     """Get all teams in a competition."""
 
     url = f"{BASE_URL}/competitions/{competition_id}/table"
     data = get_json_with_token(url, token)
 
+    return parse_all_teams(data)
+
+def parse_all_teams(data):
+    """Parse the teams from a competition table payload."""
+
     teams = [
         {
             "team_id": item.get("tid"),   # Team-ID
@@ -20,6 +26,7 @@ def get_all_teams(token, competition_id):
 
     return teams
 
+@traced
 def get_matchdays(token, competition_id):
     """Get all matchdays in a competition with the latest date for each matchday."""
 
@@ -46,6 +53,7 @@ def get_matchdays(token, competition_id):
 
     return result
 
+@traced
 def get_achievement_reward(token, league_id, achievement_id):
     """Get the reward and how often this was achieved by the user for a specific achievement in a league."""
 
@@ -1,9 +1,19 @@
 from kickbase_api.config import BASE_URL, get_json_with_token
 from kickbase_api.others import get_all_teams
+from kickbase_api.tracing import traced
 from datetime import datetime, timedelta
+import numpy as np
 
 # All functions related to player data
 
+MV_TIMEFRAMES = (92, 365)  # market value windows offered by the API, in days
+
+def get_market_value_timeframe(days):
+    """Get the smallest market value timeframe covering the given amount of days, None if none does."""
+
+    return next((timeframe for timeframe in MV_TIMEFRAMES if timeframe >= days), None)
+
+@traced
 def get_player_id(token, competition_id, name):
     """Search for a player by name and return their player ID."""
 
@@ -14,13 +24,19 @@ def get_player_id(token, competition_id, name):
 
     return player_id
 
-def get_player_market_value(token, competition_id, player_id, last_mv_values):
+@traced
+def get_player_market_value(token, competition_id, player_id, last_mv_values, timeframe=365):
     """Get the market value history of a player."""
 
-    timeframe = 365  # amount of last values to retrieve, min 92, max 365
+    # timeframe is the amount of last values to retrieve, see MV_TIMEFRAMES
     url = f"{BASE_URL}/competitions/{competition_id}/players/{player_id}/marketvalue/{timeframe}"
     data = get_json_with_token(url, token)
 
+    return parse_player_market_value(data, last_mv_values)
+
+def parse_player_market_value(data, last_mv_values):
+    """Parse the market value history payload of a player."""
+
     # get last last_mv_values market values
     market_values = [(item['dt'], item['mv']) for item in data['it'][-last_mv_values:]]
 
@@ -36,12 +52,18 @@ def get_player_market_value(token, competition_id, player_id, last_mv_values):
 
     return market_values
 
+@traced
 def get_player_info(token, competition_id, player_id):
     """Get basic information about a player."""
 
     url = f"{BASE_URL}/competitions/{competition_id}/players/{player_id}"
     data = get_json_with_token(url, token)
 
+    return parse_player_info(data)
+
+def parse_player_info(data):
+    """Parse the basic information payload of a player."""
+
     player_info = {
         "player_id": data.get("i"),     
         "team_id": data.get("tid"),     
@@ -53,31 +75,52 @@ def get_player_info(token, competition_id, player_id):
 
     return player_info
 
-def get_all_players(token, competition_id):
-    """Get all players in a competition by iterating through all teams."""
-
-    all_players = []  # Initialize an empty list to store all players
+@traced
+def get_competition_roster(token, competition_id):
+    """Get all players in a competition with their team, names and position from the team profiles."""
 
-    team_ids = [team["team_id"] for team in get_all_teams(token, competition_id)]
+    roster = []
 
-    for team_id in team_ids:
-        url = f"{BASE_URL}/competitions/{competition_id}/teams/{team_id}/teamprofile"
+    for team in get_all_teams(token, competition_id):
+        url = f"{BASE_URL}/competitions/{competition_id}/teams/{team['team_id']}/teamprofile"
         data = get_json_with_token(url, token)
 
-        # Extract player IDs and names
-        players = [(player["i"]) for player in data['it']]
+        roster.extend(parse_team_roster(data, team))
+
+    return roster
 
-        # Append the players to the main list
-        all_players.extend(players)
+def parse_team_roster(data, team):
+    """Parse the player records of a team profile payload, same fields as get_player_info."""
 
-    return all_players  # Return the combined list at the end
+    # Fields the team profile does not contain stay None, e.g. the first name
+    return [
+        {
+            "player_id": player.get("i"),
+            "team_id": data.get("tid", team["team_id"]),
+            "team_name": data.get("tn", team["team_name"]),
+            "first_name": player.get("fn"),
+            "last_name": player.get("ln", player.get("n")),
+            "position": player.get("pos")
+        }
+        for player in data["it"]
+    ]
 
+@traced
 def get_player_performance(token, competition_id, player_id, last_pfm_values, player_team):
     """Get the performance history of a player, including different metrics."""
 
     url = f"{BASE_URL}/competitions/{competition_id}/players/{player_id}/performance"
     data = get_json_with_token(url, token)
 
+    return parse_player_performance(data, last_pfm_values, player_team)
+
+def parse_player_performance(data, last_pfm_values, player_team):
+    """Parse the performance history payload of a player into typed columns.
+
+    Returns a dict of equally long NumPy arrays: md and date (datetime64[D]), p, ppm, t1g, t2g and won
+    (float, NaN if missing), mp (int), t1, t2 and k (object).
+    """
+
     # Gather all performance entries
     all_ph = [
         m
@@ -85,76 +128,57 @@ def get_player_performance(token, competition_id, player_id, last_pfm_values, pl
         for m in item["ph"]
     ]
 
+    # Parse the matchday dates once, the first 10 characters of the ISO timestamp are its date
+    dates = np.array([m["md"][:10] for m in all_ph], dtype="datetime64[D]")
+
     # TODO: This makes problems rn, as one row of data will be added for each matchday
     # Since they are not on the same days this makes problems if we are on the day of a matchday
     # Only include performances up to the current date or the next md
-    current_date = datetime.now().date()
-
-    future_dates = [
-        datetime.fromisoformat(m["md"].replace("Z", "+00:00")).date()
-        for m in all_ph
-        if datetime.fromisoformat(m["md"].replace("Z", "+00:00")).date() > current_date
-    ]
-    next_md = min(future_dates) if future_dates else current_date
-
-    # Keep performances up to next_md
-    all_ph = [
-        m for m in all_ph
-        if datetime.fromisoformat(m["md"].replace("Z", "+00:00")).date() <= next_md
-    ]
-    
-    # Last n performance values
-    performance_values = all_ph[-last_pfm_values:]
-
-    result = []
-    for m in performance_values:
-        # Extract minutes played, handling possible formats and missing values
-        mp_str = m.get("mp", "0'")
-        try:
-            minutes_played = int(mp_str.replace("'", "")) if mp_str else 0
-        except ValueError:
-            minutes_played = 0
-
-        # Points
-        points = m.get("p", None)
-
-        # Points per Minute
-        ppm = points / minutes_played if points is not None and minutes_played > 0 else None
-
-        # Determine match result for player's team
-        t1 = m.get("t1")
-        t2 = m.get("t2")
-        t1g = m.get("t1g")
-        t2g = m.get("t2g")
-        won = None
-        if t1g is not None and t2g is not None:
-            if player_team == t1:
-                if t1g > t2g:
-                    won = 1
-                elif t1g < t2g:
-                    won = 0
-                else:
-                    won = None
-            elif player_team == t2:
-                if t2g > t1g:
-                    won = 1
-                elif t2g < t1g:
-                    won = 0
-                else:
-                    won = None
-
-        result.append({
-            "md": datetime.fromisoformat(m["md"].replace("Z", "+00:00")).date().isoformat(),
-            "date": datetime.fromisoformat(m["md"].replace("Z", "+00:00")).date().isoformat(),
-            "p": points,
-            "mp": minutes_played,
-            "ppm": ppm,
-            "t1": t1,
-            "t2": t2,
-            "t1g": t1g,
-            "t2g": t2g,
-            "won": won,
-            "k": m.get("k")
-        })
-
-    return result
\ No newline at end of file
+    current_date = np.datetime64(datetime.now().date(), "D")
+
+    future_dates = dates[dates > current_date]
+    next_md = future_dates.min() if future_dates.size else current_date
+
+    # Keep performances up to next_md, last n performance values, all of them if last_pfm_values is 0
+    keep = np.flatnonzero(dates <= next_md)
+    if last_pfm_values > 0:
+        keep = keep[-last_pfm_values:]
+    performance_values = [all_ph[i] for i in keep]
+    dates = dates[keep]
+
+    def column(key, dtype=float):
+        return np.array([np.nan if m.get(key) is None else m.get(key) for m in performance_values], dtype=dtype)
+
+    # Minutes played, formatted like "90'", missing or malformed values count as 0
+    mp_str = np.array([(m.get("mp") or "0'").replace("'", "").strip() for m in performance_values], dtype=str)
+    minutes_played = np.where(np.char.isdigit(mp_str), mp_str, "0").astype(int)
+
+    # Points and points per minute
+    points = column("p")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ppm = np.where(minutes_played > 0, points / minutes_played, np.nan)
+
+    # Determine match result for player's team, NaN for draws, missing goals or other teams
+    t1 = np.array([m.get("t1") for m in performance_values], dtype=object)
+    t2 = np.array([m.get("t2") for m in performance_values], dtype=object)
+    t1g = column("t1g")
+    t2g = column("t2g")
+    goal_diff = np.where(t1 == player_team, t1g - t2g, np.where(t2 == player_team, t2g - t1g, np.nan))
+    won = np.select([goal_diff > 0, goal_diff < 0], [1.0, 0.0], default=np.nan)
+
+    k = np.empty(len(performance_values), dtype=object)
+    k[:] = [m.get("k") for m in performance_values]
+
+    return {
+        "md": dates,
+        "date": dates,
+        "p": points,
+        "mp": minutes_played,
+        "ppm": ppm,
+        "t1": t1,
+        "t2": t2,
+        "t1g": t1g,
+        "t2g": t2g,
+        "won": won,
+        "k": k
+    }
@@ -0,0 +1,238 @@
+from contextvars import ContextVar
+from datetime import datetime
+import functools
+import itertools
+import threading
+import cProfile
+import inspect
+import json
+import time
+import os
+
+# Lightweight tracing of a run
+# Stages (tracer.stage) record their time, the peak memory and the HTTP requests, bytes and retries made in
+# them, spans (tracer.span and the @traced kickbase_api functions) their time and parent span. At the end of a
+# run write_report writes everything as JSON, optionally with a cProfile of the run. While the tracer is not
+# started a traced function costs one attribute check.
+
+def read_rss():
+    """Current resident memory of the process in bytes, None if it can't be read (only Linux)"""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+class PeakMemory:
+    """Context manager measuring the peak resident memory above the start in bytes, None if it can't be read
+
+    The memory is sampled every interval seconds in a background thread.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = None
+
+    def __enter__(self):
+        self.start_rss = read_rss()
+        self.max_rss = self.start_rss
+        self.done = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, daemon=True) if self.start_rss is not None else None
+        if self.sampler:
+            self.sampler.start()
+        return self
+
+    def sample(self):
+        while not self.done.wait(self.interval):
+            self.max_rss = max(self.max_rss, read_rss())
+
+    def __exit__(self, *exc_info):
+        self.done.set()
+        if self.sampler:
+            self.sampler.join()
+            self.peak = max(self.max_rss, read_rss()) - self.start_rss
+
+
+class NoSpan:
+    """Span of a tracer that is not started, does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NO_SPAN = NoSpan()
+
+class Span:
+    """Timed block of a run, child of the span it is entered in"""
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.id = next(self.tracer.ids)
+        self.parent = self.tracer.current.get()
+        self.token = self.tracer.current.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        self.tracer.current.reset(self.token)
+        self.tracer.spans.append({
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "start": self.start - self.tracer.started,
+            "seconds": self.seconds,
+            "error": exc_type.__name__ if exc_type else None,
+        })
+        return False
+
+class Stage(Span):
+    """Span of a pipeline stage, also records the peak memory and the HTTP calls made in it"""
+
+    def __enter__(self):
+        self.http_before = self.tracer.http_totals()
+        self.memory = PeakMemory().__enter__()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, *exc_info):
+        super().__exit__(exc_type, *exc_info)
+        self.memory.__exit__(exc_type, *exc_info)
+        http_after = self.tracer.http_totals()
+
+        self.tracer.stages.append({
+            "name": self.name,
+            "seconds": self.seconds,
+            "peak_mb": self.memory.peak / 2**20 if self.memory.peak is not None else None,
+            **{name: http_after[name] - self.http_before[name] for name in http_after},
+        })
+        return False
+
+
+class Tracer:
+    """Collects the stages and spans of a run, off until start is called"""
+
+    def __init__(self):
+        self.enabled = False
+        self.current = ContextVar("span", default=None)
+        self.ids = itertools.count()
+        self.spans = []
+        self.stages = []
+        self.annotations = {}
+        self.http_stats = None
+        self.profiler = None
+        self.started = None
+        self.started_at = None
+
+    def start(self, http_stats=None, profile=False):
+        """Start tracing, http_stats is the EndpointStats of the client whose calls are counted per stage"""
+
+        self.spans, self.stages, self.annotations = [], [], {}
+        self.http_stats = http_stats
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.enabled = True
+
+        if profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop(self):
+        self.enabled = False
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def annotate(self, **fields):
+        """Add fields to the run report, e.g. the critical path of the stages"""
+
+        self.annotations.update(fields)
+
+    def span(self, name):
+        return Span(self, name) if self.enabled else NO_SPAN
+
+    def stage(self, name):
+        return Stage(self, name) if self.enabled else NO_SPAN
+
+    def http_totals(self):
+        """Requests, bytes, retries and errors of all endpoints so far"""
+
+        totals = dict.fromkeys(("requests", "bytes", "retries", "errors"), 0)
+        if self.http_stats is not None:
+            for entry in self.http_stats.snapshot().values():
+                for name in totals:
+                    totals[name] += entry[name]
+
+        return totals
+
+    def function_summary(self):
+        """Calls, total and max seconds per span name, slowest total first"""
+
+        summary = {}
+        for span in self.spans:
+            entry = summary.setdefault(span["name"], {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+            entry["calls"] += 1
+            entry["seconds"] += span["seconds"]
+            entry["max_seconds"] = max(entry["max_seconds"], span["seconds"])
+            entry["errors"] += span["error"] is not None
+
+        return dict(sorted(summary.items(), key=lambda item: item[1]["seconds"], reverse=True))
+
+    def write_report(self, path):
+        """Stop tracing and write the JSON run report, the cProfile of the run goes to <path>.prof"""
+
+        self.stop()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        report = {
+            "started_at": self.started_at,
+            "total_seconds": time.perf_counter() - self.started,
+            "stages": self.stages,
+            "functions": self.function_summary(),
+            "http": self.http_stats.snapshot() if self.http_stats is not None else {},
+            **self.annotations,
+            "spans": self.spans,
+        }
+
+        if self.profiler is not None:
+            report["profile"] = path + ".prof"
+            self.profiler.dump_stats(report["profile"])
+
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+
+        return report
+
+
+# Shared tracer, started by daily_predictions.py
+tracer = Tracer()
+
+def traced(func):
+    """Decorator timing every call of a function or coroutine function as a span named module.function"""
+
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return await func(*args, **kwargs)
+            with Span(tracer, name):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not tracer.enabled:
+            return func(*args, **kwargs)
+        with Span(tracer, name):
+            return func(*args, **kwargs)
+
+    return wrapper
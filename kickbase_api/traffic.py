@@ -0,0 +1,170 @@
+from urllib.parse import urlsplit
+from datetime import datetime
+import threading
+import requests
+import atexit
+import gzip
+import json
+import os
+
+# Record and replay of the Kickbase API traffic
+# In record mode (KICKBASE_RECORD=<archive>) every response the pipeline gets, including error statuses, is
+# written to a gzip compressed JSON archive when the process ends. In replay mode (KICKBASE_REPLAY=<archive>)
+# all responses are served from the archive without any network or response cache access, in the order they
+# were recorded per request. Archives can also be served by benchmarks/stand_in_api.py.
+
+ARCHIVE_VERSION = 1
+
+# Response fields that are not written to the archive, the login token is replaced
+SCRUBBED_FIELDS = {"tkn": "replay-token"}
+
+class ReplayedHTTPError(requests.HTTPError):
+    """Error status of a recorded response, raised again on replay"""
+
+    def __init__(self, status, key):
+        super().__init__(f"{status} Error (replayed) for {key}")
+        self.status = status
+
+def request_key(method, url):
+    """Key of a request in the archive, its method and path with query relative to the API version"""
+
+    parts = urlsplit(url)
+    path = parts.path[len("/v4"):] if parts.path.startswith("/v4") else parts.path
+
+    return f"{method} {path}?{parts.query}" if parts.query else f"{method} {path}"
+
+def error_status(error):
+    """HTTP status of a requests or aiohttp error, None for connection errors and others"""
+
+    response = getattr(error, "response", None)
+    if response is not None:
+        return response.status_code
+
+    return getattr(error, "status", None)
+
+def scrub(body):
+    """Copy of a response body without the fields of SCRUBBED_FIELDS"""
+
+    if isinstance(body, dict) and any(field in body for field in SCRUBBED_FIELDS):
+        return {key: SCRUBBED_FIELDS.get(key, value) for key, value in body.items()}
+
+    return body
+
+class TrafficArchive:
+    """Responses per request key, recorded in a run or loaded from an archive to replay it"""
+
+    def __init__(self, path, mode):
+        self.path = path
+        self.mode = mode
+        self.responses = {}
+        self.replayed = {}
+        self._lock = threading.Lock()
+
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                archive = json.load(f)
+            self.responses = archive["responses"]
+            print(f"Replaying the Kickbase API traffic recorded at {archive.get('recorded_at')} from {path}")
+
+    @classmethod
+    def from_env(cls):
+        """Archive of the KICKBASE_REPLAY or KICKBASE_RECORD env variable, None if neither is set"""
+
+        replay_path = os.getenv("KICKBASE_REPLAY")
+        record_path = os.getenv("KICKBASE_RECORD")
+
+        if replay_path:
+            if record_path:
+                print("Warning: KICKBASE_REPLAY and KICKBASE_RECORD are both set, only replaying.")
+            return cls(replay_path, "replay")
+
+        if record_path:
+            archive = cls(record_path, "record")
+            atexit.register(archive.save)
+            return archive
+
+        return None
+
+    @property
+    def replaying(self):
+        return self.mode == "replay"
+
+    def record(self, key, status, body=None):
+        entry = {"status": status} if body is None else {"status": status, "body": scrub(body)}
+        with self._lock:
+            self.responses.setdefault(key, []).append(entry)
+
+    def replay(self, key):
+        """Body of the next recorded response of a request, the last one is repeated"""
+
+        with self._lock:
+            entries = self.responses.get(key)
+            if not entries:
+                raise LookupError(f"No recorded response for {key} in {self.path}")
+            index = self.replayed.get(key, 0)
+            self.replayed[key] = index + 1
+
+        entry = entries[min(index, len(entries) - 1)]
+        if entry["status"] >= 400:
+            raise ReplayedHTTPError(entry["status"], key)
+
+        return entry["body"]
+
+    def call(self, method, url, fetch):
+        """Replay the response of a request or fetch it with fetch() and record it"""
+
+        key = request_key(method, url)
+        if self.replaying:
+            return self.replay(key)
+
+        try:
+            body = fetch()
+        except Exception as e:
+            status = error_status(e)
+            if status is not None:
+                self.record(key, status)
+            raise
+
+        self.record(key, 200, body)
+        return body
+
+    async def call_async(self, method, url, fetch):
+        """Same as call for a coroutine function fetch"""
+
+        key = request_key(method, url)
+        if self.replaying:
+            return self.replay(key)
+
+        try:
+            body = await fetch()
+        except Exception as e:
+            status = error_status(e)
+            if status is not None:
+                self.record(key, status)
+            raise
+
+        self.record(key, 200, body)
+        return body
+
+    def save(self):
+        """Write the recorded responses to the archive"""
+
+        if self.mode != "record":
+            return
+
+        with self._lock:
+            archive = {
+                "version": ARCHIVE_VERSION,
+                "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                "responses": self.responses,
+            }
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path + ".tmp", "wt", encoding="utf-8") as f:
+                json.dump(archive, f, separators=(",", ":"))
+            os.replace(self.path + ".tmp", self.path)
+
+        n_responses = sum(len(entries) for entries in self.responses.values())
+        print(f"Recorded {n_responses} Kickbase API responses to {self.path}")
@@ -1,8 +1,9 @@
-from kickbase_api.config import BASE_URL, get_json_with_token
-import requests
+from kickbase_api.config import BASE_URL, client, get_json_with_token
+from kickbase_api.tracing import traced
 
 # All functions related to the user itself
 
+@traced
 def login(username, password):
     """Logs in to Kickbase and returns the authentication token."""
 
@@ -13,13 +14,12 @@ def login(username, password):
         "loy": False,
         "rep": {}
     }
-    resp = requests.post(url, json=payload)
-    resp.raise_for_status()
-    data = resp.json()
+    data = client.post_json(url, payload)
     token = data.get("tkn")
 
     return token
 
+@traced
 def get_username(token):
     """Gets the username of the logged-in user."""
 
@@ -30,6 +30,7 @@ def get_username(token):
 
     return username
 
+@traced
 def get_players_in_squad(token, league_id):
     """Gets the players in the user's squad for a given league."""
 
@@ -38,6 +39,7 @@ def get_players_in_squad(token, league_id):
 
     return data
 
+@traced
 def get_budget(token, league_id):
     """Gets the user's budget for a given league."""
 
@@ -48,6 +50,7 @@ def get_budget(token, league_id):
 
     return data
 
+@traced
 def get_stats(token, league_id):
     """Gets the user's stats for a given league."""
 
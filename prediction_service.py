@@ -0,0 +1,68 @@
+from features.service import PredictionService, serve
+from features.daemon import ACCOUNT_DEFAULTS, Session
+from kickbase_api.config import client
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Local HTTP service with the recommendations of daily_predictions.py on demand, see features/service.py
+#   curl "http://127.0.0.1:8000/predict?player_id=123"
+#   curl "http://127.0.0.1:8000/market?league=My%20League"
+#   curl "http://127.0.0.1:8000/squad?league=My%20League"
+
+# ----------------- SYSTEM PARAMETERS -----------------
+# Should be left unchanged unless you know what you're doing
+
+last_mv_values = 365    # in days, max 365
+last_pfm_values = 50    # in matchdays, max idk
+incremental_ingestion = True    # only fetch new market values, full reload on schema changes or gaps
+max_in_flight = 32      # max amount of concurrent requests of the async ingestion
+bypass_cache = False    # ignore cached API responses and fetch everything fresh
+incremental_training = True # add trees fitted on recent rows to the stored model, full refit once a week
+model_engine = "random_forest"  # "random_forest" or "hist_gradient_boosting", see MODEL_ENGINES in modeling.py
+live_ttl = 60           # seconds the market and squad of a league are reused
+
+# which features to use for training and prediction
+features = [
+    "p", "mv", "days_to_next",
+    "mv_change_1d", "mv_trend_1d",
+    "mv_change_3d", "mv_vol_3d",
+    "mv_trend_7d", "market_divergence"
+]
+
+# what columns to learn and predict on, the market value change over the next 1, 3 and 7 days
+target = ["mv_target_clipped", "mv_target_3d_clipped", "mv_target_7d_clipped"]
+
+# ----------------- USER SETTINGS -----------------
+# Adjust these settings to your preferences
+
+competition_ids = [1]   # 1 = Bundesliga, 2 = 2. Bundesliga, 3 = La Liga
+host = "127.0.0.1"      # address to serve on, 127.0.0.1 = only this machine
+port = 8000
+
+# ---------------------------------------------------
+
+# Apply the cache setting, can also be set via the KICKBASE_CACHE_BYPASS env variable
+client.cache.bypass = client.cache.bypass or bypass_cache
+
+# Login with KICK_USER and KICK_PASS, again if the token expires
+session = Session({**ACCOUNT_DEFAULTS, "name": "service"})
+
+service = PredictionService(
+    session,
+    {
+        "competition_ids": competition_ids,
+        "features": features,
+        "target": target,
+        "last_mv_values": last_mv_values,
+        "last_pfm_values": last_pfm_values,
+        "incremental_ingestion": incremental_ingestion,
+        "incremental_training": incremental_training,
+        "model_engine": model_engine,
+        "max_in_flight": max_in_flight,
+    },
+    live_ttl=live_ttl,
+)
+service.refresh()
+serve(service, host, port)
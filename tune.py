@@ -0,0 +1,46 @@
+from features.predictions.tuning import tune
+from features.predictions.preprocessing import preprocess_player_data
+from features.predictions.data_handler import update_player_features, load_player_features_from_db
+from IPython.display import display
+import pandas as pd
+
+# Search the hyperparameters and the features of the model on the stored player data, run daily_predictions.py
+# first to fill the database. An interrupted search continues where it stopped when started again.
+
+# ----------------- PARAMETERS -----------------
+
+model_engine = "random_forest"  # see MODEL_ENGINES in modeling.py, the searched values are in PARAM_GRIDS in tuning.py
+metric = "rmse"         # metric to rank by, one of signs_percent, rmse, mae, r2
+eta = 3                 # keep the best 1/eta candidates per round
+n_rounds = 3            # rounds of successive halving, the first one uses 1/eta^(n_rounds-1) of the rows
+n_splits = 3            # time-series folds
+max_workers = None      # processes evaluating candidates, None for one per CPU
+
+# same features and target as in daily_predictions.py, every feature set is searched with every parameter set
+features = [
+    "p", "mv", "days_to_next",
+    "mv_change_1d", "mv_trend_1d",
+    "mv_change_3d", "mv_vol_3d",
+    "mv_trend_7d", "market_divergence"
+]
+target = ["mv_target_clipped", "mv_target_3d_clipped", "mv_target_7d_clipped"]
+
+# all features and all features but one
+feature_sets = [features] + [[f for f in features if f != left_out] for left_out in features]
+
+pd.set_option("display.max_columns", None)
+pd.set_option("display.max_colwidth", None)
+pd.set_option("display.width", 1000)
+
+# ----------------------------------------------
+
+if __name__ == "__main__":
+    update_player_features()
+    proc_player_df, _ = preprocess_player_data(load_player_features_from_db())
+
+    results_df = tune(
+        proc_player_df, feature_sets, target, engine=model_engine, metric=metric, eta=eta, n_rounds=n_rounds,
+        n_splits=n_splits, max_workers=max_workers,
+    )
+    print("\n=== Best Candidates ===")
+    display(results_df.head(10))